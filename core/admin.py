@@ -1,7 +1,63 @@
 import json
+from datetime import timedelta
+
+from django import forms
 from django.contrib import admin
+from django.db.models import Count
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Room, Bed, Guest, Reservation, Company, Meal
+from .models import (
+    Room, Bed, Guest, Reservation, Company, CompanyRate, StaySegment, Meal, MealReprint, ClosingSnapshot,
+    BackgroundJob
+)
+from .paginators import EstimatedCountPaginator
+from .tickets import find_issued
+from .utils import local_day_start, local_range
+
+
+# ==============================================================================
+# FILTROS
+# ==============================================================================
+
+class MealPeriodFilter(admin.SimpleListFilter):
+    """
+    Filtro de período para Refeições.
+    As opções são fixas (não consultam o banco) e viram um intervalo
+    created_at >= início AND created_at < fim, que usa o índice da coluna.
+    """
+    title = 'Período'
+    parameter_name = 'periodo'
+
+    def lookups(self, request, model_admin):
+        return [
+            ('hoje', 'Hoje'),
+            ('ontem', 'Ontem'),
+            ('7dias', 'Últimos 7 dias'),
+            ('mes', 'Este mês'),
+            ('mes_anterior', 'Mês anterior'),
+        ]
+
+    def queryset(self, request, queryset):
+        today = timezone.localdate()
+        value = self.value()
+
+        if value == 'hoje':
+            start, end = local_range(today, today)
+        elif value == 'ontem':
+            yesterday = today - timedelta(days=1)
+            start, end = local_range(yesterday, yesterday)
+        elif value == '7dias':
+            start, end = local_range(today - timedelta(days=6), today)
+        elif value == 'mes':
+            start, end = local_range(today.replace(day=1), today)
+        elif value == 'mes_anterior':
+            first_day = today.replace(day=1)
+            start = local_day_start((first_day - timedelta(days=1)).replace(day=1))
+            end = local_day_start(first_day)
+        else:
+            return queryset
+
+        return queryset.filter(created_at__gte=start, created_at__lt=end)
 
 
 # ==============================================================================
@@ -19,6 +75,65 @@ class BedInline(admin.TabularInline):
     classes = ['collapse']  # Permite minimizar essa seção se houver muitas camas.
 
 
+class CompanyRateInline(admin.TabularInline):
+    """
+    Tarifas do contrato (Relatório de Fechamento).
+    Alterar uma tarifa apaga os fechamentos gerados do período que ela cobre.
+    """
+    model = CompanyRate
+    extra = 0
+    fields = ('valid_from', 'valid_to', 'daily_ac', 'daily_vent', 'lunch', 'dinner')
+
+
+class StaySegmentInline(admin.TabularInline):
+    """
+    Trechos da estadia (cama e período), gravados automaticamente no
+    check-in, na troca de cama e no checkout. Somente leitura.
+    """
+    model = StaySegment
+    extra = 0
+    max_num = 0
+    can_delete = False
+    fields = ('bed', 'start', 'end')
+    readonly_fields = ('bed', 'start', 'end')
+    ordering = ('start',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('bed__room')
+
+
+class MealReprintInline(admin.TabularInline):
+    """ Reimpressões (2ª via) do ticket. Somente leitura. """
+    model = MealReprint
+    extra = 0
+    max_num = 0
+    can_delete = False
+    fields = ('created_at', 'user')
+    readonly_fields = ('created_at', 'user')
+
+
+# ==============================================================================
+# FORMULÁRIOS DO ADMIN
+# ==============================================================================
+
+class MealAdminForm(forms.ModelForm):
+    """
+    Confere a regra de um ticket por CPF/refeição/dia (tickets.py) antes de
+    gravar, para mostrar o aviso no formulário em vez de erro do banco.
+    """
+
+    def clean(self):
+        cleaned_data = super().clean()
+        day = self.instance.service_date or timezone.localdate()
+        existing = find_issued(cleaned_data.get('cpf'), cleaned_data.get('meal_type'), day)
+        if existing is not None and existing.pk != self.instance.pk:
+            raise forms.ValidationError(
+                f"{existing.name} já tem o ticket de {existing.get_meal_type_display()} deste dia "
+                f"(emitido às {timezone.localtime(existing.created_at):%H:%M})."
+            )
+        return cleaned_data
+
+
 # ==============================================================================
 # MODEL ADMINS
 # Configurações das telas de listagem e edição de cada modelo.
@@ -34,6 +149,7 @@ class CompanyAdmin(admin.ModelAdmin):
     search_fields = ('name', 'cnpj', 'contact')
     ordering = ('name',)
     list_per_page = 20
+    inlines = [CompanyRateInline]
 
 
 @admin.register(Room)
@@ -42,16 +158,23 @@ class RoomAdmin(admin.ModelAdmin):
     Gestão dos Quartos.
     Inclui a visualização das Camas (BedInline).
     """
-    list_display = ('number', 'climate', 'get_beds_count', 'is_maintenance_badge')
-    list_filter = ('climate', 'is_maintenance')
+    list_display = ('number', 'climate', 'get_beds_count', 'status', 'occupying_company', 'is_maintenance_badge')
+    list_select_related = ('occupying_company',)
+    list_filter = ('status', 'climate', 'is_maintenance')
     search_fields = ('number',)
+    readonly_fields = ('status', 'occupied_beds', 'pre_beds', 'occupying_company')  # mantidos pelas reservas
     inlines = [BedInline]
     ordering = ('number',)
 
+    def get_queryset(self, request):
+        # Conta as camas na mesma consulta da listagem (evita um COUNT por linha)
+        return super().get_queryset(request).annotate(beds_total=Count('beds'))
+
     def get_beds_count(self, obj):
-        return obj.beds.count()
+        return obj.beds_total
 
     get_beds_count.short_description = 'Camas'
+    get_beds_count.admin_order_field = 'beds_total'
 
     def is_maintenance_badge(self, obj):
         # Cria um indicador visual (ícone) para status de manutenção
@@ -69,6 +192,7 @@ class BedAdmin(admin.ModelAdmin):
     Gestão individual das Camas (caso seja necessário editar fora do quarto).
     """
     list_display = ('__str__', 'room', 'name')
+    list_select_related = ('room',)
     list_filter = ('room__climate',)
     search_fields = ('name', 'room__number')
     ordering = ('room', 'name')
@@ -81,6 +205,7 @@ class GuestAdmin(admin.ModelAdmin):
     Utiliza autocomplete_fields para selecionar a empresa, ideal se houver muitas cadastradas.
     """
     list_display = ('name', 'company', 'phone', 'cpf')
+    list_select_related = ('company',)
     list_filter = ('company',)
     search_fields = ('name', 'company__name', 'cpf', 'phone')
     autocomplete_fields = ['company']  # Requer que CompanyAdmin tenha search_fields configurado
@@ -94,9 +219,14 @@ class ReservationAdmin(admin.ModelAdmin):
     Exibe status, datas e histórico de ações.
     """
     list_display = ('guest', 'get_company', 'get_room_bed', 'start_date', 'end_date', 'status_colored', 'has_luggage')
+    # Traz hóspede, empresa, cama e quarto no mesmo JOIN (sem consultas por linha)
+    list_select_related = ('guest__company', 'bed__room')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_filter = ('status', 'has_luggage', 'start_date', 'guest__company')
     search_fields = ('guest__name', 'guest__company__name', 'bed__room__number', 'bed__name')
     readonly_fields = ('history_formatted', 'start_date')  # Protege o histórico contra edição manual
+    inlines = [StaySegmentInline]
 
     fieldsets = (
         ('Dados da Reserva', {
@@ -146,20 +276,66 @@ class MealAdmin(admin.ModelAdmin):
     """
     Controle de Refeições (Almoço/Janta).
     Permite filtrar por data para gerar relatórios visuais rápidos.
+    Preparado para tabelas com milhões de tickets: sem COUNT(*) exato e sem
+    date_hierarchy (que agrupa a tabela inteira por ano/mês a cada acesso).
     """
+    form = MealAdminForm
+    inlines = [MealReprintInline]
     list_display = ('name', 'meal_type_badge', 'company', 'created_at_formatted')
-    list_filter = ('meal_type', 'created_at', 'company')
+    list_select_related = ('company',)
+    list_filter = (MealPeriodFilter, 'meal_type', 'company')
     search_fields = ('name', 'company__name', 'cpf')
-    date_hierarchy = 'created_at'  # Cria uma navegação por data no topo da lista
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_per_page = 50
 
     def created_at_formatted(self, obj):
         return obj.created_at.strftime('%d/%m/%Y %H:%M')
 
     created_at_formatted.short_description = 'Data/Hora'
+    created_at_formatted.admin_order_field = 'created_at'
 
     def meal_type_badge(self, obj):
         icon = '☀️' if obj.meal_type == 'ALMOCO' else '🌙'
         return f"{icon} {obj.get_meal_type_display()}"
 
-    meal_type_badge.short_description = 'Tipo'
\ No newline at end of file
+    meal_type_badge.short_description = 'Tipo'
+
+
+@admin.register(ClosingSnapshot)
+class ClosingSnapshotAdmin(admin.ModelAdmin):
+    """
+    Fechamentos gerados (somente leitura). Apagar um registro força o
+    recálculo na próxima consulta do Relatório de Fechamento.
+    """
+    list_display = ('__str__', 'rows_count', 'short_hash', 'created_at')
+    list_select_related = ('company',)
+    list_filter = ('period_start',)
+    exclude = ('rows',)
+    readonly_fields = ('company', 'period_start', 'period_end', 'content_hash', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def rows_count(self, obj):
+        return len(obj.rows)
+
+    rows_count.short_description = 'Linhas'
+
+    def short_hash(self, obj):
+        return obj.content_hash[:12]
+
+    short_hash.short_description = 'Conferência'
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    """ Fila de relatórios em segundo plano (acompanhamento e limpeza). """
+    list_display = ('label', 'user', 'status', 'progress', 'created_at', 'finished_at')
+    list_select_related = ('user',)
+    list_filter = ('status', 'kind')
+    readonly_fields = ('user', 'kind', 'label', 'params', 'progress', 'message',
+                       'file_name', 'file_path', 'created_at', 'started_at', 'finished_at')
+
+    def has_add_permission(self, request):
+        return False
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Conecta os receivers de invalidação de cache
+        from . import signals  # noqa: F401
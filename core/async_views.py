@@ -0,0 +1,148 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import render
+
+from . import views
+from .caching import get_room_layout
+from .kitchen import get_board, version as board_version
+from .models import BackgroundJob, Room
+from .views import _active_reservations, _get_room_item, _index_by_bed, get_available_beds_query
+
+
+# ==============================================================================
+# VIEWS ASYNC (Modo ASGI - run_uvicorn.py)
+#
+# Versões async dos fragmentos HTMX só de leitura, que são a maior parte das
+# requisições com várias telas abertas (filtro do Dashboard, camas do modal,
+# andamento dos relatórios, painel da cozinha). Leem o banco pelo ORM async e
+# não prendem uma thread do servidor enquanto esperam. O restante (páginas
+# inteiras, gravações, impressão) continua nas views síncronas de views.py,
+# que o Django executa em threads. urls.py escolhe estas versões quando
+# settings.TYBIS_ASGI está ligado.
+# ==============================================================================
+
+_read_board_version = sync_to_async(board_version, thread_sensitive=False)
+
+
+@login_required
+async def dashboard(request):
+    if not request.htmx:
+        return await sync_to_async(views.dashboard)(request)
+
+    # Mesma montagem de views.dashboard (grade filtrada via HTMX)
+    filter_type = request.GET.get('filter')
+    rooms = await sync_to_async(get_room_layout)()
+    reservations = _active_reservations()
+    if filter_type and filter_type != 'ALL':
+        room_ids = {pk async for pk in Room.objects.filter(status=filter_type).values_list('pk', flat=True)}
+        rooms = [room for room in rooms if room.pk in room_ids]
+        reservations = _active_reservations(bed__room_id__in=room_ids)
+
+    reservations_by_bed = _index_by_bed([res async for res in reservations])
+    dashboard_data = [_get_room_item(room, room.layout_beds, reservations_by_bed) for room in rooms]
+    return render(request, 'core/partials/dashboard_grid.html', {'dashboard_data': dashboard_data})
+
+
+@login_required
+async def get_available_beds_htmx(request):
+    beds = [bed async for bed in get_available_beds_query(request.GET.get('company'))]
+    return render(request, 'core/partials/bed_options.html', {'beds': beds})
+
+
+@login_required
+async def job_detail(request, pk):
+    """ Cartão de andamento (polling de 1s); a página inteira fica com a view síncrona. """
+    if not request.headers.get('HX-Request'):
+        return await sync_to_async(views.job_detail)(request, pk)
+
+    user = await request.auser()
+    job = await BackgroundJob.objects.filter(pk=pk).afirst()
+    if job is None or (job.user_id != user.id and not user.is_staff):
+        raise Http404
+    return render(request, 'core/jobs/partials/job_status.html', {'job': job})
+
+
+async def kitchen_board_panel(request):
+    """ Como views.kitchen_board_panel: 204 sem sessão enquanto o carimbo não muda. """
+    if request.GET.get('v') == await _read_board_version():
+        return HttpResponse(status=204)
+    return await _kitchen_board_panel(request)
+
+
+@login_required
+async def _kitchen_board_panel(request):
+    version = await _read_board_version()
+    board = await sync_to_async(get_board)()
+    return render(request, 'core/partials/kitchen_board_panel.html', {
+        'version': version, 'live_updates': True, **board
+    })
+
+
+# ==============================================================================
+# QUADRO DA COZINHA AO VIVO (Server-Sent Events)
+#
+# Uma única tarefa por processo lê o carimbo do quadro (kitchen.version) a
+# cada BOARD_WATCH_INTERVAL e acorda as telas conectadas quando ele muda. Cada
+# tela aberta é só uma corrotina esperando um asyncio.Event: nenhuma thread
+# por cliente e uma leitura no cache por intervalo, qualquer que seja o
+# número de telas. A tarefa para sozinha quando a última tela desconecta.
+# ==============================================================================
+
+BOARD_WATCH_INTERVAL = 1  # segundos entre leituras do carimbo
+BOARD_KEEPALIVE = 25  # segundos sem mudança até mandar um comentário (proxies/firewall)
+
+
+class _BoardWatcher:
+    def __init__(self):
+        self.version = None
+        self.changed = asyncio.Event()
+        self.listeners = 0
+        self.task = None
+
+    async def _run(self):
+        while self.listeners:
+            version = await _read_board_version()
+            if version != self.version:
+                self.version = version
+                self.changed.set()
+                self.changed = asyncio.Event()
+            await asyncio.sleep(BOARD_WATCH_INTERVAL)
+        self.version, self.task = None, None
+
+    async def updates(self, known=None):
+        """ Gera cada carimbo diferente de 'known'; None a cada BOARD_KEEPALIVE sem mudança. """
+        self.listeners += 1
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        try:
+            while True:
+                if self.version is not None and self.version != known:
+                    known = self.version
+                    yield known
+                    continue
+                try:
+                    await asyncio.wait_for(self.changed.wait(), BOARD_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.listeners -= 1
+
+
+_board_watcher = _BoardWatcher()
+
+
+@login_required
+async def kitchen_board_events(request):
+    """ Avisa a tela (evento 'board') quando o quadro muda; a tela então busca o painel. """
+    async def stream():
+        yield 'retry: 3000\n\n'
+        async for version in _board_watcher.updates(request.GET.get('v')):
+            yield f'event: board\ndata: {version}\n\n' if version else ': ping\n\n'
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,73 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import constant_time_compare
+
+
+# ==============================================================================
+# USUÁRIO DA REQUISIÇÃO EM CACHE
+#
+# O AuthenticationMiddleware do Django busca o usuário no banco a cada
+# requisição, inclusive em cada clique e poll HTMX. Aqui os campos do usuário
+# logado usados nas telas ficam no cache compartilhado (arquivo ou Redis),
+# junto com o hash de conferência da sessão; a senha não vai para o cache.
+# O usuário da requisição é montado só com esses campos (os demais são lidos
+# do banco se alguém os acessar). Qualquer gravação no usuário
+# (senha, desativação, último login) apaga a cópia (signals.py); se o hash não
+# bater, vale a busca normal do Django, que também encerra a sessão.
+# Com a sessão em cache (TYBIS_SESSIONS), um clique autenticado não lê o banco
+# nem para a sessão nem para o usuário.
+# ==============================================================================
+
+USER_CACHE_TIMEOUT = 60 * 10  # também limita alterações feitas fora do ORM (update em lote)
+USER_FIELDS = ('username', 'first_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+def _user_key(user_id):
+    return f'auth:usuario:{user_id}'
+
+
+def _cache_entry(user):
+    return {
+        'pk': user.pk, 'session_hash': user.get_session_auth_hash(),
+        **{name: getattr(user, name) for name in USER_FIELDS},
+    }
+
+
+def _user_from_entry(entry):
+    """ Usuário só com os campos em cache: os demais ficam adiados e save() não os grava. """
+    model = get_user_model()
+    values = {model._meta.pk.attname: entry['pk'], **{name: entry[name] for name in USER_FIELDS}}
+    # from_db recebe os valores na ordem das colunas do modelo
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+def get_user(request):
+    """ Como django.contrib.auth.get_user, usando a cópia do usuário em cache. """
+    session = request.session
+    user_id, backend_path = session.get(SESSION_KEY), session.get(BACKEND_SESSION_KEY)
+    if user_id is not None and backend_path in settings.AUTHENTICATION_BACKENDS:
+        entry = cache.get(_user_key(user_id))
+        session_hash = session.get(HASH_SESSION_KEY)
+        if entry is not None and session_hash and constant_time_compare(session_hash, entry['session_hash']):
+            user = _user_from_entry(entry)
+            user.backend = backend_path
+            return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(_user_key(user.pk), _cache_entry(user), USER_CACHE_TIMEOUT)
+    return user
+
+
+async def aget_user(request):
+    return await sync_to_async(get_user)(request)
+
+
+def forget_user(user_id):
+    """ Apaga a cópia em cache (o próximo acesso lê o usuário do banco). """
+    cache.delete(_user_key(user_id))
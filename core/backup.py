@@ -0,0 +1,294 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# BACKUP DO BANCO SEM PARAR A RECEPÇÃO (SQLite)
+#
+# Copiar o db.sqlite3 com o Waitress gravando trava a recepção ou gera um
+# arquivo corrompido. Aqui a cópia usa a API de backup online do SQLite, em
+# passos de poucas páginas, por uma conexão própria que mantém uma leitura
+# aberta do começo ao fim. Com o banco em WAL (settings.py) essa leitura não
+# segura nenhuma gravação: a recepção continua gravando (no WAL) e a cópia
+# sai como o banco estava no início do backup. Entre um passo e outro o backup
+# descansa pelo menos o tempo que o passo levou, e mais quando o passo passou
+# do orçamento TYBIS_BACKUP_BUDGET_MS (disco ocupado).
+#
+# Cada cópia é conferida (quick_check), comprimida (gzip) e ganha um
+# manifesto .json com o SHA-256 do banco e do arquivo gravado; o manifesto é
+# o último a ser escrito, então cópia sem manifesto é cópia interrompida.
+# A incremental guarda só os blocos que mudaram desde a última completa
+# (restaurar = completa + incremental). Ficam as TYBIS_BACKUP_KEEP completas
+# mais recentes, cada uma com as suas incrementais.
+# ==============================================================================
+
+STEP_PAGES = 256  # páginas por passo (1 MB com páginas de 4 KB)
+MIN_PAUSE = 0.005  # segundos de descanso entre os passos
+BLOCK_SIZE = 64 * 1024  # bloco comparado nas cópias incrementais
+BLOCK_HASH_SIZE = 16
+_DELTA_HEADER = struct.Struct('<QI')  # (número do bloco, tamanho)
+_READ_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    """ Cópia inexistente, corrompida ou banco sem suporte. """
+
+
+def _backup_dir(directory=None):
+    path = Path(directory or getattr(settings, 'TYBIS_BACKUP_DIR', settings.BASE_DIR / 'backups'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def database_path():
+    """ Arquivo do banco em uso (só SQLite). """
+    database = connections['default'].settings_dict
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        raise BackupError('O backup online é só para SQLite (no PostgreSQL use pg_dump).')
+    return Path(database['NAME'])
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(_READ_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ==============================================================================
+# CÓPIA ONLINE
+# ==============================================================================
+
+def _pacer(budget, report):
+    """ Progresso do backup do sqlite3: descansa depois de cada passo. """
+    state = {'started': time.perf_counter()}
+
+    def progress(status, remaining, total):
+        if report:
+            report(total - remaining, total)
+        if remaining == 0:
+            return
+        elapsed = time.perf_counter() - state['started']
+        pause = max(MIN_PAUSE, elapsed)  # o backup fica no máximo com metade do disco
+        if elapsed > budget:
+            pause *= elapsed / budget
+        time.sleep(pause)
+        state['started'] = time.perf_counter()
+
+    return progress
+
+
+def backup_into(source, dst, step_pages=STEP_PAGES, budget_ms=None, report=None):
+    """
+    Copia o banco 'source' para a conexão sqlite3 'dst' (retrato do início da
+    cópia) em passos com pausas, sem travar quem grava em 'source'.
+    """
+    budget = (budget_ms or settings.TYBIS_BACKUP_BUDGET_MS) / 1000
+    src = sqlite3.connect(source, timeout=20)
+    try:
+        wal = src.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        if wal:
+            # Uma leitura só para a cópia toda: ela não recomeça a cada gravação da recepção
+            src.execute('BEGIN')
+            src.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        else:
+            logger.warning('Banco fora do modo WAL: o backup recomeça a cada gravação durante a cópia.')
+        src.backup(dst, pages=step_pages, progress=_pacer(budget, report) if step_pages > 0 else report)
+        if wal:
+            src.rollback()
+    finally:
+        src.close()
+
+
+def copy_database(source, target, step_pages=STEP_PAGES, budget_ms=None, report=None):
+    """
+    Copia o banco 'source' para o arquivo 'target' (retrato do início da
+    cópia), sem travar quem grava. step_pages=-1 copia tudo de uma vez, sem
+    pausas. report(páginas copiadas, total) é chamado a cada passo.
+    Retorna o número de páginas.
+    """
+    dst = sqlite3.connect(target)
+    try:
+        backup_into(source, dst, step_pages, budget_ms, report)
+
+        # A cópia fica em um arquivo só (sem -wal), pronta para comprimir e restaurar
+        dst.execute('PRAGMA journal_mode=DELETE')
+        check = dst.execute('PRAGMA quick_check').fetchone()[0]
+        if check != 'ok':
+            raise BackupError(f'Cópia com defeito: {check}')
+        return dst.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        dst.close()
+
+
+def _pack(path, target, base_blocks=None):
+    """
+    Lê a cópia uma vez e grava o .gz: o banco inteiro ou, com base_blocks, só
+    os blocos diferentes da cópia completa. Retorna (SHA-256 do banco, hashes dos blocos).
+    """
+    digest, blocks = hashlib.sha256(), bytearray()
+    with open(path, 'rb') as database, gzip.open(target, 'wb', compresslevel=6) as output:
+        index = 0
+        while block := database.read(BLOCK_SIZE):
+            digest.update(block)
+            block_hash = hashlib.blake2b(block, digest_size=BLOCK_HASH_SIZE).digest()
+            blocks += block_hash
+            if base_blocks is None:
+                output.write(block)
+            elif base_blocks[index * BLOCK_HASH_SIZE:(index + 1) * BLOCK_HASH_SIZE] != block_hash:
+                output.write(_DELTA_HEADER.pack(index, len(block)))
+                output.write(block)
+            index += 1
+    return digest.hexdigest(), bytes(blocks)
+
+
+# ==============================================================================
+# CÓPIAS (criar, listar, girar)
+# ==============================================================================
+
+def list_snapshots(directory=None):
+    """ Manifestos das cópias, da mais antiga para a mais recente. """
+    manifests = (json.loads(path.read_text()) for path in _backup_dir(directory).glob('tybis-*.json'))
+    return sorted(manifests, key=lambda manifest: manifest['name'])
+
+
+def create_snapshot(incremental=False, directory=None, step_pages=STEP_PAGES, report=None):
+    """
+    Faz uma cópia do banco em uso. Incremental sem nenhuma completa vira
+    completa. Retorna o manifesto (com 'seconds', o tempo gasto).
+    """
+    directory = _backup_dir(directory)
+    started = time.perf_counter()
+    stamp = name = f'tybis-{timezone.localtime():%Y%m%d-%H%M%S}'
+    number = 1
+    while (directory / f'{name}.json').exists():  # outra cópia no mesmo segundo
+        number += 1
+        name = f'{stamp}-{number}'
+    fulls = [manifest for manifest in list_snapshots(directory) if manifest['kind'] == 'full']
+    base = fulls[-1] if incremental and fulls else None
+
+    copy = directory / f'{name}.tmp'
+    try:
+        pages = copy_database(database_path(), copy, step_pages=step_pages, report=report)
+        manifest = {
+            'name': name,
+            'kind': 'incremental' if base else 'full',
+            'base': base['name'] if base else None,
+            'created': timezone.localtime().isoformat(),
+            'file': f'{name}.inc.gz' if base else f'{name}.db.gz',
+            'size': copy.stat().st_size,
+            'pages': pages,
+        }
+        base_blocks = (directory / f'{base["name"]}.blocos').read_bytes() if base else None
+        manifest['sha256'], blocks = _pack(copy, directory / manifest['file'], base_blocks)
+        if not base:
+            (directory / f'{name}.blocos').write_bytes(blocks)
+        manifest['file_sha256'] = _sha256(directory / manifest['file'])
+        manifest['file_size'] = (directory / manifest['file']).stat().st_size
+        (directory / f'{name}.json').write_text(json.dumps(manifest, indent=2))
+    finally:
+        copy.unlink(missing_ok=True)
+
+    rotate(directory=directory)
+    return {**manifest, 'seconds': time.perf_counter() - started}
+
+
+def _remove(directory, manifest):
+    # Manifesto primeiro: cópia pela metade não aparece na lista
+    for file_name in (f'{manifest["name"]}.json', manifest['file'], f'{manifest["name"]}.blocos'):
+        (directory / file_name).unlink(missing_ok=True)
+
+
+def rotate(keep=None, directory=None):
+    """ Mantém as 'keep' completas mais recentes (e as incrementais delas). Retorna as removidas. """
+    directory = _backup_dir(directory)
+    keep = keep or settings.TYBIS_BACKUP_KEEP
+    snapshots = list_snapshots(directory)
+    fulls = [manifest['name'] for manifest in snapshots if manifest['kind'] == 'full']
+    old = set(fulls[:-keep])
+    removed = [manifest for manifest in snapshots if manifest['name'] in old or manifest['base'] in old]
+    for manifest in removed:
+        _remove(directory, manifest)
+    return removed
+
+
+# ==============================================================================
+# RESTAURAÇÃO E CONFERÊNCIA
+# ==============================================================================
+
+def _find(name, directory):
+    snapshots = {manifest['name']: manifest for manifest in list_snapshots(directory)}
+    if not snapshots:
+        raise BackupError('Nenhuma cópia encontrada.')
+    manifest = snapshots.get(name or max(snapshots))
+    if manifest is None:
+        raise BackupError(f'Cópia {name} não encontrada.')
+    if manifest['base'] and manifest['base'] not in snapshots:
+        raise BackupError(f'A cópia completa {manifest["base"]} (base de {manifest["name"]}) não existe mais.')
+    return manifest, snapshots.get(manifest['base'])
+
+
+def restore_snapshot(name, target, directory=None):
+    """
+    Restaura a cópia 'name' (None = a mais recente) no arquivo target e confere
+    os SHA-256 e o integrity_check. Só substitui target se tudo bater.
+    Retorna o manifesto com 'tables' (tabelas do banco restaurado).
+    """
+    directory = _backup_dir(directory)
+    manifest, base = _find(name, directory)
+    for snapshot in filter(None, (base, manifest)):
+        if _sha256(directory / snapshot['file']) != snapshot['file_sha256']:
+            raise BackupError(f'Arquivo {snapshot["file"]} corrompido (SHA-256 não confere).')
+
+    target = Path(target)
+    restoring = target.with_name(f'{target.name}.restaurando')
+    try:
+        with gzip.open(directory / (base or manifest)['file'], 'rb') as source, open(restoring, 'wb') as output:
+            shutil.copyfileobj(source, output, _READ_SIZE)
+        if base:
+            with gzip.open(directory / manifest['file'], 'rb') as delta, open(restoring, 'r+b') as output:
+                while header := delta.read(_DELTA_HEADER.size):
+                    index, length = _DELTA_HEADER.unpack(header)
+                    output.seek(index * BLOCK_SIZE)
+                    output.write(delta.read(length))
+                output.truncate(manifest['size'])
+
+        if _sha256(restoring) != manifest['sha256']:
+            raise BackupError(f'Banco restaurado de {manifest["name"]} diferente do original (SHA-256).')
+        database = sqlite3.connect(restoring)
+        try:
+            check = database.execute('PRAGMA integrity_check').fetchone()[0]
+            tables = database.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        finally:
+            database.close()
+        if check != 'ok':
+            raise BackupError(f'Banco restaurado de {manifest["name"]} com defeito: {check}')
+
+        os.replace(restoring, target)
+        for suffix in ('-wal', '-shm'):  # restos do banco antigo não podem ser aplicados no novo
+            target.with_name(target.name + suffix).unlink(missing_ok=True)
+    finally:
+        restoring.unlink(missing_ok=True)
+    return {**manifest, 'tables': tables}
+
+
+def verify_snapshot(name=None, directory=None):
+    """ Restaura em uma pasta temporária, confere e apaga. Retorna o manifesto. """
+    with tempfile.TemporaryDirectory(prefix='tybis-verifica-') as scratch:
+        return restore_snapshot(name, Path(scratch) / 'db.sqlite3', directory=directory)
@@ -0,0 +1,415 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .billing_calc import CPF, COMPANY_ID, MealColumns, VECTORIZED, closing_rows, company_rows, meals_by_cpf
+from .caching import invalidate, version
+from .models import Company, CompanyRate, Reservation, Meal, ClosingSnapshot
+from .reporting import primary
+from .stays import climate_timelines
+from .utils import format_money, local_day_start, local_range
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# CÁLCULO DO FECHAMENTO (Diárias e Refeições por hóspede)
+# ==============================================================================
+
+def _load_meals(cpfs, filter_start, filter_end, chunk_size=400):
+    """
+    Refeições do período em colunas (MealColumns): cpf, timestamp UTC e tipo.
+    cpfs=None carrega todas as refeições do período em uma consulta (hotel
+    inteiro); senão, uma consulta por bloco de CPFs em vez de uma por hóspede.
+    A conversão para o dia local fica para o cálculo (uma vez por coluna).
+    """
+    start, end = local_range(filter_start, filter_end)
+    period = Meal.objects.filter(created_at__gte=start, created_at__lt=end)
+    if cpfs is None:
+        queries = [period.exclude(cpf=None).exclude(cpf='')]
+    else:
+        cpfs = list(cpfs)
+        queries = [period.filter(cpf__in=cpfs[i:i + chunk_size]) for i in range(0, len(cpfs), chunk_size)]
+
+    meals = MealColumns([], [], [])
+    for query in queries:
+        for cpf, meal_type, created_at in query.values_list('cpf', 'meal_type', 'created_at'):
+            meals.cpf.append(cpf)
+            meals.timestamp.append(created_at.timestamp())
+            meals.meal_type.append(meal_type)
+    return meals
+
+
+def load_closing_data(filter_start, filter_end, company_id=None):
+    """
+    Carga única do período: reservas como tuplas (ver billing_calc), com as
+    datas já no fuso local, e as refeições em colunas.
+    """
+    reservations = Reservation.objects.filter(
+        start_date__lt=local_day_start(filter_end + timedelta(days=1))
+    ).filter(
+        Q(end_date__gte=local_day_start(filter_start)) | Q(end_date__isnull=True)
+    ).order_by('pk')
+
+    if company_id:
+        reservations = reservations.filter(guest__company_id=company_id)
+
+    # Climatização de cada noite pelos trechos de estadia (trocas de quarto)
+    timelines = climate_timelines(reservations, filter_start, filter_end)
+
+    tz = timezone.get_current_timezone()  # localtime() consulta o fuso a cada chamada
+    data = []
+    for pk, cpf, name, company_name, guest_company_id, start_date, end_date, climate in reservations.values_list(
+        'pk', 'guest__cpf', 'guest__name', 'guest__company__name', 'guest__company_id', 'start_date', 'end_date',
+        'bed__room__climate'
+    ):
+        start_day = start_date.astimezone(tz).date()
+        stays = timelines.get(pk) or [(start_day, climate)]
+        data.append((
+            cpf, name, company_name, guest_company_id,
+            start_day, end_date.astimezone(tz).date() if end_date else None, stays
+        ))
+    cpfs = None if not company_id else {res[CPF] for res in data if res[CPF]}
+    return data, _load_meals(cpfs, filter_start, filter_end)
+
+
+def _cents(value):
+    return int(value * 100)
+
+
+def load_rates(filter_start, filter_end, company_id=None):
+    """ Tarifas vigentes em algum dia do período: {company_id: [tarifa, ...]} ordenadas pelo início. """
+    rates = CompanyRate.objects.filter(valid_from__lte=filter_end).filter(
+        Q(valid_to__gte=filter_start) | Q(valid_to__isnull=True)
+    ).order_by('company_id', 'valid_from')
+    if company_id:
+        rates = rates.filter(company_id=company_id)
+
+    by_company = defaultdict(list)
+    for rate_company_id, valid_from, valid_to, daily_ac, daily_vent, lunch, dinner in rates.values_list(
+        'company_id', 'valid_from', 'valid_to', 'daily_ac', 'daily_vent', 'lunch', 'dinner'
+    ):
+        by_company[rate_company_id].append(
+            (valid_from, valid_to, _cents(daily_ac), _cents(daily_vent), _cents(lunch), _cents(dinner))
+        )
+    return dict(by_company)
+
+
+def compute_closing_rows(filter_start, filter_end, company_id=None, progress=None):
+    """
+    Linhas do Relatório de Fechamento: uma por reserva que toca o período,
+    com diárias (por climatização), almoços e jantas contados dentro das
+    datas efetivas e valorizados pelas tarifas da empresa (em centavos).
+    progress(feitos, total) é chamado a cada bloco de reservas (tarefas em segundo plano).
+    """
+    reservations, meals = load_closing_data(filter_start, filter_end, company_id)
+    return closing_rows(
+        reservations, meals, timezone.get_current_timezone(), filter_start, filter_end,
+        load_rates(filter_start, filter_end, company_id), progress
+    )
+
+
+def closing_totals(rows):
+    """ Totais do fechamento (rodapé do relatório, última linha do CSV e resumo do ZIP). """
+    fields = ('days', 'days_ac', 'days_vent', 'lunch', 'dinner', 'amount_days', 'amount_lunch', 'amount_dinner', 'amount')
+    totals = {field: sum(row[field] for row in rows) for field in fields}
+    totals['guests'] = len(rows)
+    totals['unpriced'] = sum(1 for row in rows if row['unpriced'])
+    return totals
+
+
+def write_closing_csv(rows, fileobj):
+    """ Exportação do fechamento (';' como os demais relatórios), com a linha de TOTAL. """
+    writer = csv.writer(fileobj, delimiter=';')
+    writer.writerow([
+        'CPF', 'NOME', 'EMPRESA', 'DIARIAS', 'ALMOCO', 'JANTAR', 'ENTRADA', 'SAIDA',
+        'DIARIAS_AC', 'DIARIAS_VENT', 'VALOR_DIARIAS', 'VALOR_ALMOCO', 'VALOR_JANTAR', 'VALOR_TOTAL'
+    ])
+    for item in rows:
+        writer.writerow([
+            item['cpf'] or '',
+            item['name'],
+            item['company'],
+            item['days'],
+            item['lunch'],
+            item['dinner'],
+            item['entry'].strftime('%d/%m/%Y'),
+            item['exit'].strftime('%d/%m/%Y'),
+            item['days_ac'],
+            item['days_vent'],
+            format_money(item['amount_days'], grouping=False),
+            format_money(item['amount_lunch'], grouping=False),
+            format_money(item['amount_dinner'], grouping=False),
+            format_money(item['amount'], grouping=False) if not item['unpriced'] else 'SEM TARIFA',
+        ])
+
+    totals = closing_totals(rows)
+    writer.writerow([
+        'TOTAL', '', '', totals['days'], totals['lunch'], totals['dinner'], '', '',
+        totals['days_ac'], totals['days_vent'],
+        format_money(totals['amount_days'], grouping=False),
+        format_money(totals['amount_lunch'], grouping=False),
+        format_money(totals['amount_dinner'], grouping=False),
+        format_money(totals['amount'], grouping=False),
+    ])
+
+
+# ==============================================================================
+# FECHAMENTOS GERADOS (Períodos encerrados)
+# Um período está "fechado" quando termina antes de hoje. Suas linhas são
+# gravadas uma vez (ClosingSnapshot) com um hash SHA-256 do conteúdo, que
+# serve de código de conferência entre o HTML, o CSV e o financeiro.
+# ==============================================================================
+
+@dataclass
+class ClosingReport:
+    rows: list
+    content_hash: str
+    snapshot: ClosingSnapshot = None  # None = calculado na hora (período em aberto)
+
+
+def resolve_period(month=None, start=None, end=None):
+    """
+    Período de faturamento a partir de 'AAAA-MM' ou de 'AAAA-MM-DD' (início e fim).
+    Sem argumentos: o mês anterior. Lança ValueError se inválido.
+    """
+    if start or end:
+        if not (start and end):
+            raise ValueError('Informe a data inicial e a final.')
+        return datetime.strptime(start, '%Y-%m-%d').date(), datetime.strptime(end, '%Y-%m-%d').date()
+
+    if month:
+        first_day = datetime.strptime(month, '%Y-%m').date()
+    else:
+        first_day = (timezone.localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+    next_month = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first_day, next_month - timedelta(days=1)
+
+
+def is_closed_period(filter_end):
+    return filter_end < timezone.localdate()
+
+
+def _serialize(rows):
+    # is_active (hóspede ainda sem checkout) não entra: um checkout hoje não muda o fechamento do mês passado
+    return [
+        {**{key: value for key, value in row.items() if key != 'is_active'},
+         'entry': row['entry'].isoformat(), 'exit': row['exit'].isoformat()}
+        for row in rows
+    ]
+
+
+def _deserialize(rows):
+    return [
+        {**row, 'entry': date.fromisoformat(row['entry']), 'exit': date.fromisoformat(row['exit'])}
+        for row in rows
+    ]
+
+
+def content_hash(serialized_rows):
+    payload = json.dumps(serialized_rows, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _snapshot_filter(filter_start, filter_end, company_ids):
+    query = Q(company_id__in=[cid for cid in company_ids if cid is not None])
+    if None in company_ids:
+        query |= Q(company__isnull=True)
+    return ClosingSnapshot.objects.filter(query, period_start=filter_start, period_end=filter_end)
+
+
+def build_snapshots(filter_start, filter_end, company_ids=(None,)):
+    """
+    Calcula o período uma única vez e grava o fechamento de cada empresa
+    informada (None = todas as empresas), substituindo os existentes.
+    Retorna {company_id: ClosingSnapshot}; vazio se uma alteração retroativa
+    chegou durante o cálculo (o resultado pode estar desatualizado).
+    """
+    company_ids = list(company_ids)
+    stamp = version('closing')
+    single = company_ids[0] if len(company_ids) == 1 else None
+    with primary():  # o fechamento gravado vale até a próxima alteração: nunca da cópia dos relatórios
+        rows = compute_closing_rows(filter_start, filter_end, single)
+
+    snapshots = {}
+    for company_id in company_ids:
+        company_rows = _serialize([row for row in rows if company_id is None or row['company_id'] == company_id])
+        snapshots[company_id] = ClosingSnapshot(
+            company_id=company_id, period_start=filter_start, period_end=filter_end,
+            rows=company_rows, content_hash=content_hash(company_rows)
+        )
+
+    with transaction.atomic():
+        _snapshot_filter(filter_start, filter_end, company_ids).delete()
+        ClosingSnapshot.objects.bulk_create(snapshots.values(), ignore_conflicts=True)
+
+    # invalidate_closing() troca o carimbo antes de apagar: se ele mudou,
+    # o cálculo acima pode ter lido dados anteriores à alteração.
+    if version('closing') != stamp:
+        _snapshot_filter(filter_start, filter_end, company_ids).delete()
+        return {}
+    return snapshots
+
+
+def find_snapshot(filter_start, filter_end, company_id=None):
+    """ Fechamento já gerado para o período/empresa (None se não houver). """
+    with primary():  # como em build_snapshots: a cópia dos relatórios ainda teria fechamentos já apagados
+        snapshot = ClosingSnapshot.objects.filter(
+            company_id=company_id, period_start=filter_start, period_end=filter_end
+        ).first()
+    if snapshot and snapshot.rows and 'amount' not in snapshot.rows[0]:
+        snapshot.delete()  # Gerado antes das tarifas (sem valores): será calculado de novo
+        return None
+    return snapshot
+
+
+def get_closing_report(filter_start, filter_end, company_id=None):
+    """
+    Relatório de Fechamento pronto para exibir/exportar.
+    Períodos fechados vêm do fechamento gerado (ou o geram na primeira vez);
+    períodos em aberto são sempre calculados na hora.
+    """
+    snapshot = None
+    if is_closed_period(filter_end) and filter_start <= filter_end:
+        snapshot = find_snapshot(filter_start, filter_end, company_id)
+        if snapshot is None:
+            snapshot = build_snapshots(filter_start, filter_end, [company_id]).get(company_id)
+
+    if snapshot is None:
+        rows = compute_closing_rows(filter_start, filter_end, company_id)
+        return ClosingReport(rows, content_hash(_serialize(rows)))
+
+    return ClosingReport(_deserialize(snapshot.rows), snapshot.content_hash, snapshot)
+
+
+def invalidate_closing(first_day, last_day=None, company_ids=None):
+    """
+    Apaga os fechamentos gerados que cobrem algum dia de [first_day, last_day]
+    (last_day None = sem fim). company_ids: empresas afetadas (None = todas);
+    o fechamento de "todas as empresas" do período sempre é apagado.
+    """
+    yesterday = timezone.localdate() - timedelta(days=1)
+    if first_day > yesterday:
+        return  # Só existem fechamentos de períodos encerrados (até ontem)
+
+    invalidate('closing')
+    snapshots = ClosingSnapshot.objects.filter(period_end__gte=first_day)
+    if last_day is not None:
+        snapshots = snapshots.filter(period_start__lte=last_day)
+    if company_ids is not None:
+        snapshots = snapshots.filter(Q(company_id__in=company_ids) | Q(company__isnull=True))
+    snapshots.delete()
+
+
+# ==============================================================================
+# FATURAS DE TODAS AS EMPRESAS (Fechamento do mês em lote)
+# Uma única carga de reservas e refeições para o hotel inteiro. Com NumPy o
+# núcleo vetorizado calcula todas as empresas de uma vez; sem ele, o laço de
+# cada empresa é distribuído em um pool de processos (billing_calc não
+# depende do Django). Abaixo de PARALLEL_MIN_RESERVATIONS o custo de subir
+# os processos supera o ganho e o laço roda neste mesmo processo.
+# ==============================================================================
+
+PARALLEL_MIN_RESERVATIONS = 5000
+
+
+def compute_invoices(filter_start, filter_end, processes=None, progress=None):
+    """
+    Linhas do fechamento de cada empresa: {company_id: rows}.
+    processes: None = automático (NumPy, se instalado), 1 = laço sem pool.
+    Informar processes usa o laço por empresa mesmo com NumPy.
+    progress(empresas feitas, total) é chamado a cada empresa.
+    """
+    reservations, meals = load_closing_data(filter_start, filter_end)
+    rates = load_rates(filter_start, filter_end)
+    tz = timezone.get_current_timezone()
+
+    if VECTORIZED and processes is None:
+        logger.info('Faturas: núcleo NumPy (%s reservas)', len(reservations))
+        invoices = defaultdict(list)
+        for row in closing_rows(reservations, meals, tz, filter_start, filter_end, rates, progress):
+            invoices[row['company_id']].append(row)
+        return dict(invoices)
+
+    by_company = defaultdict(list)
+    for res in reservations:
+        by_company[res[COMPANY_ID]].append(res)
+
+    grouped_meals = meals_by_cpf(meals, tz)
+    tasks = []
+    for company_id, company_reservations in by_company.items():
+        cpfs = {res[CPF] for res in company_reservations if res[CPF]}
+        company_meals = {cpf: grouped_meals[cpf] for cpf in cpfs if cpf in grouped_meals}
+        tasks.append((
+            company_id, company_reservations, company_meals, filter_start, filter_end, {company_id: rates.get(company_id, [])}
+        ))
+
+    if processes is None:
+        processes = 1 if len(reservations) < PARALLEL_MIN_RESERVATIONS else os.cpu_count() or 1
+    processes = max(1, min(processes, len(tasks)))
+    logger.info('Faturas: laço por empresa em %s processo(s) (%s reservas)', processes, len(reservations))
+
+    invoices = {}
+    if processes == 1:
+        results = map(company_rows, tasks)
+        for done, (company_id, rows) in enumerate(results, 1):
+            invoices[company_id] = rows
+            if progress: progress(done, len(tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            chunksize = max(1, len(tasks) // (processes * 4))
+            for done, (company_id, rows) in enumerate(pool.map(company_rows, tasks, chunksize=chunksize), 1):
+                invoices[company_id] = rows
+                if progress: progress(done, len(tasks))
+    return invoices
+
+
+def write_invoices_zip(invoices, filter_start, filter_end, fileobj):
+    """
+    ZIP com um CSV por empresa (mesmo layout do Relatório de Fechamento)
+    e um resumo.csv com os totais de cada empresa. Retorna os totais gerais.
+    """
+    companies = {company.id: company for company in Company.objects.filter(pk__in=invoices)}
+    period = f"{filter_start:%Y%m%d}_{filter_end:%Y%m%d}"
+    summary = io.StringIO()
+    writer = csv.writer(summary, delimiter=';')
+    writer.writerow(['EMPRESA', 'CNPJ', 'HOSPEDES', 'DIARIAS', 'ALMOCO', 'JANTAR', 'VALOR_TOTAL', 'ARQUIVO'])
+    all_rows = []
+
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for company_id, rows in sorted(invoices.items(), key=lambda item: companies[item[0]].name.upper()):
+            if not rows:
+                continue
+            company = companies[company_id]
+            file_name = f"fatura_{slugify(company.name) or company.pk}_{period}.csv"
+            content = io.StringIO()
+            write_closing_csv(rows, content)
+            zf.writestr(file_name, content.getvalue().encode('utf-8-sig'))
+
+            all_rows.extend(rows)
+            writer.writerow([company.name.upper(), company.cnpj or ''] + _summary_line(closing_totals(rows)) + [file_name])
+
+        totals = closing_totals(all_rows)
+        writer.writerow(['TOTAL', ''] + _summary_line(totals) + [''])
+        zf.writestr(f"resumo_{period}.csv", summary.getvalue().encode('utf-8-sig'))
+    return totals
+
+
+def _summary_line(totals):
+    amount = format_money(totals['amount'], grouping=False)
+    if totals['unpriced']:
+        amount += f" ({totals['unpriced']} SEM TARIFA)"
+    return [totals['guests'], totals['days'], totals['lunch'], totals['dinner'], amount]
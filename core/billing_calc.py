@@ -0,0 +1,328 @@
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+from itertools import repeat
+from operator import itemgetter
+
+# NumPy é opcional: sem ele o cálculo usa o laço por reserva (mesmo resultado).
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VECTORIZED = np is not None
+
+
+# ==============================================================================
+# CÁLCULO PURO DO FECHAMENTO
+#
+# Sem Django e sem banco: recebe tuplas/colunas já carregadas e devolve as
+# linhas da fatura. Por isso pode rodar em outros processos
+# (ProcessPoolExecutor importa só este módulo) e é a única implementação
+# da regra, usada tanto pela tela quanto pela geração em lote (billing.py).
+# ==============================================================================
+
+# Índices da tupla de reserva montada por billing.load_closing_data().
+# STAYS: climatização ao longo da estadia, [(primeiro dia, 'AC'/'VENT'), ...]
+CPF, NAME, COMPANY, COMPANY_ID, START, END, STAYS = range(7)
+
+# Índices da tarifa (billing.load_rates): valores em centavos, fim None = sem término
+RATE_FROM, RATE_TO, RATE_AC, RATE_VENT, RATE_LUNCH, RATE_DINNER = range(6)
+
+# Refeições em colunas paralelas: cpf (str), timestamp (segundos UTC), meal_type
+MealColumns = namedtuple('MealColumns', ['cpf', 'timestamp', 'meal_type'])
+
+_ONE_DAY = timedelta(days=1)
+
+
+def closing_rows(reservations, meals, tz, filter_start, filter_end, rates=None, progress=None):
+    """
+    reservations: [(cpf, nome, empresa, company_id, entrada, saída, estadias)]
+    com datas locais (saída None = hóspede ainda sem checkout).
+    meals: MealColumns do período. rates: {company_id: [tarifa, ...]} ordenadas
+    pela data inicial (empresa sem tarifa: linhas sem valor). Usa NumPy se disponível.
+    """
+    if np is not None:
+        return closing_rows_vectorized(reservations, meals, tz, filter_start, filter_end, rates, progress)
+    return closing_rows_loop(reservations, meals_by_cpf(meals, tz), filter_start, filter_end, rates, progress)
+
+
+# ==============================================================================
+# TRECHOS E TARIFAS
+# Cada reserva é dividida em trechos com a mesma climatização e a mesma
+# tarifa. As fronteiras (trocas de quarto e vigências) são resolvidas uma vez
+# por trecho com busca binária nas listas ordenadas, não por diária/refeição.
+# ==============================================================================
+
+def _stay_climate(stays, day):
+    climate = stays[0][1]
+    for first_day, stay_climate in stays:
+        if first_day > day:
+            break
+        climate = stay_climate
+    return climate
+
+
+def _rate_on(company_rates, day):
+    index = bisect_right(company_rates, day, key=itemgetter(RATE_FROM)) - 1
+    if index >= 0 and (company_rates[index][RATE_TO] is None or day <= company_rates[index][RATE_TO]):
+        return company_rates[index]
+    return None
+
+
+def stay_pieces(reservations, rates, filter_start, filter_end):
+    """ [(índice da reserva, início, fim, climatização, tarifa ou None)], na ordem das reservas. """
+    rates = rates or {}
+    pieces = []
+    for index, res in enumerate(reservations):
+        first = max(res[START], filter_start)
+        last = min(res[END] or filter_end, filter_end)
+        if first > last:
+            continue
+
+        stays, company_rates = res[STAYS], rates.get(res[COMPANY_ID], ())
+        cuts = {day for day, _ in stays[1:] if first < day <= last}
+        for rate in company_rates:
+            if first < rate[RATE_FROM] <= last:
+                cuts.add(rate[RATE_FROM])
+            if rate[RATE_TO] is not None and first <= rate[RATE_TO] < last:
+                cuts.add(rate[RATE_TO] + _ONE_DAY)
+
+        bounds = [first] + sorted(cuts) + [last + _ONE_DAY]
+        for piece_start, next_start in zip(bounds, bounds[1:]):
+            pieces.append((
+                index, piece_start, next_start - _ONE_DAY,
+                _stay_climate(stays, piece_start), _rate_on(company_rates, piece_start)
+            ))
+    return pieces
+
+
+def priced_rows(reservations, pieces, counts):
+    """ Junta os trechos de cada reserva em uma linha, com diárias por climatização e valores (centavos). """
+    rows = []
+    last_index = None
+    for (index, piece_start, piece_end, climate, rate), (days, lunch, dinner) in zip(pieces, counts):
+        if index != last_index:
+            row = _row(reservations[index], 0, 0, 0, piece_start, piece_end)
+            row.update(days_ac=0, days_vent=0, amount_days=0, amount_lunch=0, amount_dinner=0, unpriced=False)
+            rows.append(row)
+            last_index = index
+
+        row['exit'] = piece_end
+        row['days'] += days
+        row['lunch'] += lunch
+        row['dinner'] += dinner
+        row['days_ac' if climate == 'AC' else 'days_vent'] += days
+        if rate is None:
+            row['unpriced'] = True
+            continue
+        row['amount_days'] += days * rate[RATE_AC if climate == 'AC' else RATE_VENT]
+        row['amount_lunch'] += lunch * rate[RATE_LUNCH]
+        row['amount_dinner'] += dinner * rate[RATE_DINNER]
+
+    for row in rows:
+        row['amount'] = row['amount_days'] + row['amount_lunch'] + row['amount_dinner']
+    return rows
+
+
+def _row(res, days, lunch, dinner, effective_start, effective_end):
+    return {
+        'cpf': res[CPF],
+        'name': res[NAME].upper(),
+        'company': res[COMPANY].upper(),
+        'company_id': res[COMPANY_ID],
+        'days': days,
+        'lunch': lunch,
+        'dinner': dinner,
+        'entry': effective_start,
+        'exit': effective_end,
+        'is_active': res[END] is None
+    }
+
+
+# ==============================================================================
+# LAÇO POR TRECHO (referência e alternativa sem NumPy)
+# ==============================================================================
+
+def meals_by_cpf(meals, tz):
+    """ Colunas -> {cpf: [(data local, tipo), ...]} """
+    grouped = defaultdict(list)
+    for cpf, timestamp, meal_type in zip(*meals):
+        grouped[cpf].append((datetime.fromtimestamp(timestamp, tz).date(), meal_type))
+    return grouped
+
+
+def closing_rows_loop(reservations, meals_by_cpf, filter_start, filter_end, rates=None, progress=None):
+    pieces = stay_pieces(reservations, rates, filter_start, filter_end)
+    counts = []
+    for done, (index, piece_start, piece_end, _, _) in enumerate(pieces, 1):
+        if progress and done % 500 == 0:
+            progress(done, len(pieces))
+
+        # Refeições
+        lunch_count = 0
+        dinner_count = 0
+        cpf = reservations[index][CPF]
+        if cpf:
+            for meal_date, meal_type in meals_by_cpf.get(cpf, ()):
+                if piece_start <= meal_date <= piece_end:
+                    if meal_type == 'ALMOCO':
+                        lunch_count += 1
+                    elif meal_type == 'JANTA':
+                        dinner_count += 1
+
+        counts.append(((piece_end - piece_start).days + 1, lunch_count, dinner_count))
+    return priced_rows(reservations, pieces, counts)
+
+
+def company_rows(task):
+    """ Unidade de trabalho do pool: (company_id, reservas, refeições por CPF, início, fim, tarifas). """
+    company_id, reservations, meals, filter_start, filter_end, rates = task
+    return company_id, closing_rows_loop(reservations, meals, filter_start, filter_end, rates)
+
+
+# ==============================================================================
+# NÚCLEO VETORIZADO (NumPy)
+# Datas viram números de dia (date.toordinal). O fuso é aplicado uma vez por
+# coluna e as refeições de cada trecho são contadas com searchsorted sobre
+# chaves ordenadas (código do CPF, dia), sem laço por refeição.
+# ==============================================================================
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Trocas de fuso horário acontecem em múltiplos de 15 minutos (UTC)
+_OFFSET_BUCKET = 900
+
+_MEAL_CODES = {'ALMOCO': 0, 'JANTA': 1}
+
+
+def local_days(timestamps, tz):
+    """
+    Timestamps UTC (segundos) -> dia local (ordinal), consultando o fuso
+    uma vez por bloco de 15 minutos presente na coluna (não por valor).
+    """
+    seconds = np.floor(np.asarray(timestamps, dtype=np.float64)).astype(np.int64)
+    if not len(seconds):
+        return seconds
+    buckets = seconds // _OFFSET_BUCKET
+    first, last = int(buckets.min()), int(buckets.max())
+    if last - first <= 2_000_000:
+        # Período contínuo (o caso normal): tabela direta de deslocamentos
+        table = np.array([
+            datetime.fromtimestamp(bucket * _OFFSET_BUCKET, tz).utcoffset().total_seconds()
+            for bucket in range(first, last + 1)
+        ], dtype=np.int64)
+        offsets = table[buckets - first]
+    else:
+        unique, inverse = np.unique(buckets, return_inverse=True)
+        table = np.array([
+            datetime.fromtimestamp(int(bucket) * _OFFSET_BUCKET, tz).utcoffset().total_seconds()
+            for bucket in unique
+        ], dtype=np.int64)
+        offsets = table[inverse]
+    return (seconds + offsets) // 86400 + _EPOCH_ORDINAL
+
+
+def closing_counts(res_start, res_end, res_cpf, meal_cpf, meal_day, meal_type, filter_start, filter_end):
+    """
+    Núcleo em arrays (dias como ordinais):
+      res_start, res_end (-1 = sem checkout), res_cpf (-1 = sem CPF)
+      meal_cpf (código do CPF, -1 = nenhuma reserva), meal_day, meal_type (0 almoço, 1 janta, -1 outro)
+    Retorna (mask, entrada, saída, diárias, almoços, jantas) por reserva;
+    mask marca as reservas que entram no relatório.
+    """
+    first, last = filter_start.toordinal(), filter_end.toordinal()
+    res_start = np.asarray(res_start, dtype=np.int64)
+    res_end = np.where(np.asarray(res_end, dtype=np.int64) < 0, last, res_end)
+    res_cpf = np.asarray(res_cpf, dtype=np.int64)
+
+    overlaps = (res_start <= last) & (res_end >= first)
+    effective_start = np.maximum(res_start, first)
+    effective_end = np.minimum(res_end, last)
+    days = np.maximum(effective_end - effective_start + 1, 0)
+
+    lunch, dinner = _meal_counts(
+        sorted_meal_keys(meal_cpf, meal_day, meal_type, filter_start, filter_end),
+        res_cpf, effective_start, effective_end, overlaps, first
+    )
+
+    mask = overlaps & ((days > 0) | (lunch > 0) | (dinner > 0))
+    return mask, effective_start, effective_end, days, lunch, dinner
+
+
+def sorted_meal_keys(meal_cpf, meal_day, meal_type, filter_start, filter_end):
+    """
+    Chave (cpf, dia) em um único inteiro: cpf * largura + dia relativo ao início.
+    Retorna (largura, [chaves dos almoços, chaves das jantas]) já ordenadas.
+    """
+    first, last = filter_start.toordinal(), filter_end.toordinal()
+    width = last - first + 2
+    meal_cpf = np.asarray(meal_cpf, dtype=np.int64)
+    meal_day = np.asarray(meal_day, dtype=np.int64)
+    meal_type = np.asarray(meal_type, dtype=np.int8)
+    valid = (meal_cpf >= 0) & (meal_day >= first) & (meal_day <= last)
+    meal_keys = meal_cpf * width + (meal_day - first)
+    return width, [np.sort(meal_keys[valid & (meal_type == code)]) for code in (0, 1)]
+
+
+def _meal_counts(sorted_keys, res_cpf, effective_start, effective_end, overlaps, first):
+    """ (almoços, jantas) de cada reserva entre as datas efetivas, por busca binária nas chaves. """
+    width, by_type = sorted_keys
+    counted = overlaps & (res_cpf >= 0)
+    low = res_cpf * width + (effective_start - first)
+    high = res_cpf * width + (effective_end - first)
+
+    counts = []
+    for keys in by_type:
+        found = np.searchsorted(keys, high, side='right') - np.searchsorted(keys, low, side='left')
+        counts.append(np.where(counted, np.maximum(found, 0), 0))
+    return counts
+
+
+def closing_rows_vectorized(reservations, meals, tz, filter_start, filter_end, rates=None, progress=None):
+    """
+    Com progress, os trechos são contados por empresa (as chaves das refeições
+    são ordenadas uma vez só) e progress(empresas feitas, total) é chamado a
+    cada empresa; sem ele, todos os trechos em uma única passada.
+    """
+    pieces = stay_pieces(reservations, rates, filter_start, filter_end)
+
+    codes = {}
+    res_cpf = [
+        codes.setdefault(res[CPF], len(codes)) if res[CPF] else -1 for res in reservations
+    ]
+    piece_cpf = np.fromiter((res_cpf[piece[0]] for piece in pieces), dtype=np.int64, count=len(pieces))
+    piece_start = np.fromiter((piece[1].toordinal() for piece in pieces), dtype=np.int64, count=len(pieces))
+    piece_end = np.fromiter((piece[2].toordinal() for piece in pieces), dtype=np.int64, count=len(pieces))
+
+    # map() com dict.get evita um laço Python por refeição
+    meal_cpf = np.fromiter(map(codes.get, meals.cpf, repeat(-1)), dtype=np.int64, count=len(meals.cpf))
+    meal_type = np.fromiter(
+        map(_MEAL_CODES.get, meals.meal_type, repeat(-1)), dtype=np.int8, count=len(meals.meal_type)
+    )
+    meal_day = local_days(meals.timestamp, tz)
+
+    if progress is None:
+        _, _, _, days, lunch, dinner = closing_counts(
+            piece_start, piece_end, piece_cpf, meal_cpf, meal_day, meal_type, filter_start, filter_end
+        )
+        return priced_rows(reservations, pieces, zip(days.tolist(), lunch.tolist(), dinner.tolist()))
+
+    # Trechos agrupados por empresa (ordenação estável); o resultado volta às posições originais
+    first = filter_start.toordinal()
+    sorted_keys = sorted_meal_keys(meal_cpf, meal_day, meal_type, filter_start, filter_end)
+    piece_company = np.fromiter(
+        (reservations[piece[0]][COMPANY_ID] or 0 for piece in pieces), dtype=np.int64, count=len(pieces)
+    )
+    order = np.argsort(piece_company, kind='stable')
+    bounds = np.flatnonzero(np.diff(piece_company[order])) + 1
+    blocks = np.split(order, bounds) if len(order) else []
+    lunch = np.zeros(len(pieces), dtype=np.int64)
+    dinner = np.zeros(len(pieces), dtype=np.int64)
+    for done, block in enumerate(blocks, 1):
+        lunch[block], dinner[block] = _meal_counts(
+            sorted_keys, piece_cpf[block], piece_start[block], piece_end[block], np.ones(len(block), dtype=bool), first
+        )
+        progress(done, len(blocks))
+    days = piece_end - piece_start + 1
+    return priced_rows(reservations, pieces, zip(days.tolist(), lunch.tolist(), dinner.tolist()))
@@ -0,0 +1,187 @@
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, Prefetch
+from django.db.models.functions import Cast
+
+from .models import Company, Room, Bed, Reservation
+from .reporting import primary
+
+
+# ==============================================================================
+# CACHE DE DADOS DE REFERÊNCIA (Empresas, Quartos/Camas, Camas Livres)
+#
+# Cada grupo tem um "carimbo de versão" guardado no cache compartilhado
+# (arquivo ou Redis, ver CACHES no settings). Toda gravação em Company, Room,
+# Bed, Reservation ou Guest troca o carimbo do grupo afetado (signals.py),
+# invalidando-o em todos os processos/threads do Waitress de uma só vez.
+#
+# Cada processo guarda em memória a última versão lida: enquanto o carimbo
+# não muda, a leitura custa apenas um acesso ao cache compartilhado.
+# ==============================================================================
+
+CACHE_TIMEOUT = 60 * 60 * 24
+GROUPS = ('companies', 'rooms', 'occupancy', 'closing')
+
+_local = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'local_hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _version_key(group):
+    return f'ref:{group}:version'
+
+
+def _current_version(group):
+    version = cache.get(_version_key(group))
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() não sobrescreve se outro processo gravou antes
+        cache.add(_version_key(group), version, CACHE_TIMEOUT)
+        version = cache.get(_version_key(group), version)
+    return version
+
+
+def _get(group, loader, name=None):
+    """ Dados do grupo (ou de um dos conjuntos do grupo, por nome) na versão atual. """
+    version = _current_version(group)
+    name = name or group
+
+    local = _local.get(name)
+    if local and local[0] == version:
+        _count('local_hits')
+        return local[1]
+
+    data_key = f'ref:{name}:{version}'
+    data = cache.get(data_key)
+    if data is None:
+        _count('misses')
+        with primary():  # vale para todas as telas: nunca da cópia dos relatórios
+            data = loader()
+        cache.set(data_key, data, CACHE_TIMEOUT)
+    else:
+        _count('hits')
+
+    _local[name] = (version, data)
+    return data
+
+
+def version(group):
+    """ Carimbo atual do grupo: muda a cada invalidate(). """
+    return _current_version(group)
+
+
+def invalidate(*groups):
+    """
+    Troca o carimbo de versão dos grupos informados (todos, se nenhum).
+    """
+    for group in groups or GROUPS:
+        cache.set(_version_key(group), uuid.uuid4().hex, CACHE_TIMEOUT)
+        _local.pop(group, None)
+        _count('invalidations')
+
+
+def stats():
+    """ Contadores deste processo (acertos locais, no cache compartilhado e faltas). """
+    with _lock:
+        data = dict(_stats)
+    total = data['hits'] + data['local_hits'] + data['misses']
+    data['hit_rate'] = round((data['hits'] + data['local_hits']) / total, 3) if total else None
+    return data
+
+
+# ==============================================================================
+# CARREGADORES
+# ==============================================================================
+
+def _load_companies():
+    return list(Company.objects.all())
+
+
+def _load_room_layout():
+    rooms = list(
+        Room.objects.annotate(numero_ordenado=Cast('number', IntegerField()))
+        .order_by('numero_ordenado')
+        .prefetch_related(Prefetch('beds', queryset=Bed.objects.order_by('name', 'id')))
+    )
+    for room in rooms:
+        room.layout_beds = list(room.beds.all())
+        for bed in room.layout_beds:
+            bed.room = room  # evita consulta ao acessar bed.room no template
+        # O prefetch não é necessário depois de copiado (e deixa o pickle menor)
+        room._prefetched_objects_cache = {}
+    return rooms
+
+
+# Formato compacto do inventário de camas livres (API do seletor de camas).
+# Cada quarto: [room_id, número, climatização, empresa, [[bed_id, cama], ...]]
+# empresa: null = quarto vazio; id = quarto parcialmente ocupado por essa empresa;
+#          0 = quarto com empresas misturadas (nenhuma outra pode entrar).
+BED_INVENTORY_FORMAT = 1
+
+
+def _load_bed_inventory():
+    occupied_beds = set()
+    room_company = {}
+    for bed_id, room_id, company_id in Reservation.objects.filter(
+        status__in=['ACTIVE', 'PRE']
+    ).values_list('bed_id', 'bed__room_id', 'guest__company_id'):
+        occupied_beds.add(bed_id)
+        if room_company.setdefault(room_id, company_id) != company_id:
+            room_company[room_id] = 0
+
+    rooms = []
+    for room in get_room_layout():
+        if room.is_maintenance:
+            continue
+        free = [[bed.id, bed.name] for bed in room.layout_beds if bed.id not in occupied_beds]
+        if free:
+            rooms.append([room.id, room.number, room.climate, room_company.get(room.id), free])
+
+    return {
+        'format': BED_INVENTORY_FORMAT,
+        'fields': ['room_id', 'room', 'climate', 'company_id', 'beds'],
+        'climates': dict(Room.CLIMATE_CHOICES),
+        'rooms': rooms,
+    }
+
+
+def get_bed_inventory():
+    """ Todas as camas livres em um único payload (ver BED_INVENTORY_FORMAT). """
+    return _get('occupancy', _load_bed_inventory)
+
+
+def bed_inventory_etag():
+    """ ETag do inventário: muda a cada alteração de ocupação ou de layout. """
+    return f'v{BED_INVENTORY_FORMAT}-{_current_version("occupancy")}'
+
+
+def _load_active_guests():
+    return dict(
+        Reservation.objects.filter(status='ACTIVE').order_by()
+        .values_list('guest__company_id').annotate(total=Count('pk'))
+    )
+
+
+def get_active_guests():
+    """ {company_id: hóspedes com check-in} (mesma versão do inventário de camas). """
+    return _get('occupancy', _load_active_guests, 'active_guests')
+
+
+def get_companies():
+    """ Lista de empresas (ordenada por nome), compartilhada entre requisições. """
+    return _get('companies', _load_companies)
+
+
+def get_room_layout():
+    """
+    Quartos ordenados numericamente, cada um com 'layout_beds' (camas já ligadas ao quarto).
+    Os objetos são compartilhados: não altere e salve instâncias vindas daqui.
+    """
+    return _get('rooms', _load_room_layout)
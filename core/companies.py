@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.core.paginator import Paginator
+from django.db.models import DateField, DurationField, F, Func, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate
+from django.utils import timezone
+
+from .models import Company, Meal, Reservation, Room
+from .utils import local_day_start
+
+
+# ==============================================================================
+# EMPRESAS COM OS NÚMEROS DO MÊS (lista de empresas)
+#
+# Cada número é uma subconsulta correlacionada (um COUNT ou SUM por empresa)
+# que usa um índice; não é um JOIN de quartos, reservas e refeições (o JOIN
+# multiplicaria as linhas antes de somar).
+#   no hotel   reservas com check-in (hóspedes hospedados agora)
+#   quartos    quartos só com hóspedes da empresa (Room.occupying_company,
+#              mantida em occupancy.py; a mesma regra das Camas Livres)
+#   refeições  refeições do mês até agora (índice empresa + data)
+#   diárias    diárias do mês até hoje, ainda sem fechamento: como no Relatório
+#              de Fechamento, o dia de entrada e o de saída contam
+# Ordenar e paginar ficam no banco: a ordenação calcula só a sua coluna para
+# todas as empresas e as demais colunas saem, na mesma consulta, só para as
+# empresas da página (WHERE id IN (... ORDER BY ... LIMIT)).
+# ==============================================================================
+
+SORTS = {'name': 'name', 'in_house': 'in_house', 'rooms': 'rooms', 'meals': 'month_meals', 'nights': 'month_nights'}
+PER_PAGE = 50
+
+
+def _subquery_total(queryset, expression, output_field, default=0):
+    """ COUNT/SUM de 'queryset' (filtrado por OuterRef) como uma coluna ('default' quando não há linhas). """
+    total = Subquery(queryset.order_by().annotate(total=expression).values('total')[:1], output_field=output_field)
+    return Coalesce(total, Value(default), output_field=output_field)
+
+
+def _count(queryset):
+    return _subquery_total(queryset, Func(F('pk'), function='COUNT'), IntegerField())
+
+
+def _metrics(today):
+    """ Colunas calculadas de cada empresa (ver acima); month_nights é um timedelta em dias. """
+    month_start = today.replace(day=1)
+    tz = timezone.get_current_timezone()
+    # Reservas que tocam o mês: hospedadas agora ou com saída neste mês
+    stays = Reservation.objects.filter(
+        guest__company=OuterRef('pk'), status__in=['ACTIVE', 'FINISHED'],
+        start_date__lt=local_day_start(today + timedelta(days=1)),
+    ).exclude(end_date__lt=local_day_start(month_start)).annotate(
+        first_day=Greatest(TruncDate('start_date', tzinfo=tz), Value(month_start), output_field=DateField()),
+        last_day=Least(Coalesce(TruncDate('end_date', tzinfo=tz), Value(today)), Value(today), output_field=DateField()),
+    )
+    nights = F('last_day') - F('first_day') + Value(timedelta(days=1))
+
+    return {
+        'in_house': _count(Reservation.objects.filter(guest__company=OuterRef('pk'), status='ACTIVE')),
+        'rooms': _count(Room.objects.filter(occupying_company=OuterRef('pk'))),
+        'month_meals': _count(Meal.objects.filter(company=OuterRef('pk'), created_at__gte=local_day_start(month_start))),
+        'month_nights': _subquery_total(
+            stays, Func(nights, function='SUM', output_field=DurationField()), DurationField(), timedelta(0)
+        ),
+    }
+
+
+def company_page(sort='name', number=1, today=None):
+    """
+    Página (django Paginator) das empresas com in_house, rooms, month_meals e
+    month_nights, ordenadas por uma das chaves de SORTS ('-' na frente: decrescente).
+    """
+    metrics = _metrics(today or timezone.localdate())
+    field = SORTS.get(sort.lstrip('-'), 'name')
+    ordering = (f'-{field}' if sort.startswith('-') else field, 'name')
+
+    ordered = Company.objects.all()
+    if field in metrics:
+        ordered = ordered.annotate(**{field: metrics[field]})
+    page = Paginator(ordered.order_by(*ordering).values('pk'), PER_PAGE).get_page(number)
+    page.object_list = list(
+        Company.objects.filter(pk__in=page.object_list).annotate(**metrics).order_by(*ordering)
+    )
+    return page
@@ -0,0 +1,116 @@
+import csv
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .caching import get_companies
+from .models import Meal
+from .utils import local_range
+
+
+# ==============================================================================
+# CONSUMO DE REFEIÇÕES (empresa x dia)
+#
+# Almoços e jantas de cada empresa em cada dia do período, somados no banco
+# em uma única consulta (GROUP BY dia, empresa). O dia é o dia local do
+# serviço (Meal.service_date, gravado na emissão), lido direto do índice
+# (dia, empresa, tipo) sem abrir as linhas. Tickets anteriores a essa coluna
+# (service_date nulo) entram pela data/hora convertida para o dia local, pelo
+# índice de created_at (UNION ALL na mesma consulta).
+# ==============================================================================
+
+MAX_DAYS = 366
+
+
+@dataclass
+class MealPivot:
+    days: list        # dias do período, em ordem
+    rows: list        # por empresa (nome): {'company', 'cells': [(almoço, janta) por dia], 'lunch', 'dinner'}
+    day_totals: list  # (almoço, janta) de cada dia, somando as empresas
+    lunch: int = 0
+    dinner: int = 0
+
+    @property
+    def total(self):
+        return self.lunch + self.dinner
+
+
+def _daily_counts(queryset, day):
+    return queryset.order_by().annotate(day=day).values('day', 'company_id').annotate(
+        lunch=Count('pk', filter=Q(meal_type='ALMOCO')),
+        dinner=Count('pk', filter=Q(meal_type='JANTA')),
+    )
+
+
+def meal_pivot(first_day, last_day, company_id=None):
+    """
+    Almoços e jantas por empresa e dia entre first_day e last_day (inclusive).
+    Só aparecem as empresas com refeições no período. Lança ValueError se o
+    período for invertido ou maior que MAX_DAYS.
+    """
+    if last_day < first_day:
+        raise ValueError('A data final é anterior à inicial.')
+    if (last_day - first_day).days >= MAX_DAYS:
+        raise ValueError(f'Período máximo de {MAX_DAYS} dias.')
+
+    start, end = local_range(first_day, last_day)
+    current = Meal.objects.filter(service_date__gte=first_day, service_date__lte=last_day)
+    legacy = Meal.objects.filter(service_date__isnull=True, created_at__gte=start, created_at__lt=end)
+    if company_id:
+        current = current.filter(company_id=company_id)
+        legacy = legacy.filter(company_id=company_id)
+
+    counts = _daily_counts(current, F('service_date')).union(
+        _daily_counts(legacy, TruncDate('created_at', tzinfo=timezone.get_current_timezone())), all=True
+    )
+
+    # {empresa: {dia: [almoço, janta]}} (um dia pode vir das duas partes da consulta)
+    grid = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for row in counts:
+        cell = grid[row['company_id']][row['day']]
+        cell[0] += row['lunch']
+        cell[1] += row['dinner']
+
+    days = [first_day + timedelta(days=n) for n in range((last_day - first_day).days + 1)]
+    pivot = MealPivot(days=days, rows=[], day_totals=[])
+    day_lunch = [0] * len(days)
+    day_dinner = [0] * len(days)
+    for company in get_companies():
+        if company.id not in grid:
+            continue
+        by_day = grid[company.id]
+        cells = [tuple(by_day[day]) if day in by_day else (0, 0) for day in days]
+        for n, (lunch, dinner) in enumerate(cells):
+            day_lunch[n] += lunch
+            day_dinner[n] += dinner
+        row = {'company': company, 'cells': cells,
+               'lunch': sum(cell[0] for cell in cells), 'dinner': sum(cell[1] for cell in cells)}
+        pivot.rows.append(row)
+        pivot.lunch += row['lunch']
+        pivot.dinner += row['dinner']
+    pivot.day_totals = list(zip(day_lunch, day_dinner))
+    return pivot
+
+
+def write_meal_pivot_csv(pivot, fileobj):
+    """ Uma linha por empresa; duas colunas por dia (ALMOCO e JANTA), totais no fim e a linha de TOTAL. """
+    writer = csv.writer(fileobj, delimiter=';')
+    header = ['EMPRESA']
+    for day in pivot.days:
+        label = day.strftime('%d/%m/%Y')
+        header += [f'{label} ALMOCO', f'{label} JANTA']
+    writer.writerow(header + ['ALMOCO', 'JANTA', 'TOTAL'])
+
+    for row in pivot.rows:
+        writer.writerow(
+            [row['company'].name.upper()] + [count for cell in row['cells'] for count in cell]
+            + [row['lunch'], row['dinner'], row['lunch'] + row['dinner']]
+        )
+    writer.writerow(
+        ['TOTAL'] + [count for cell in pivot.day_totals for count in cell]
+        + [pivot.lunch, pivot.dinner, pivot.total]
+    )
@@ -0,0 +1,205 @@
+import logging
+import re
+import select
+import socket
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# IMPRESSORA TÉRMICA ESC/POS (TCP ou USB, qualquer sistema)
+#
+# Com TYBIS_PRINTER definido (ex.: tcp://192.168.0.50:9100 ou /dev/usb/lp0),
+# o ticket vai em ESC/POS direto para a impressora, sem driver nem GDI: são
+# poucas centenas de bytes. O layout de cada refeição é montado uma única vez
+# em bytes, com espaços de largura fixa para nome, empresa e data/hora; cada
+# ticket só copia o modelo e preenche esses espaços.
+# A conexão TCP fica aberta entre tickets e é refeita se a impressora fechar.
+# Para testar sem impressora: python manage.py simular_impressora
+# ==============================================================================
+
+ENCODING = 'cp860'  # Português (página de código 3 da impressora)
+
+INIT = b'\x1b@' + b'\x1bt\x03'  # reinicia e seleciona a página CP860
+ALIGN_LEFT, ALIGN_CENTER = b'\x1ba\x00', b'\x1ba\x01'
+BOLD_ON, BOLD_OFF = b'\x1bE\x01', b'\x1bE\x00'
+SIZE_NORMAL, SIZE_DOUBLE = b'\x1d!\x00', b'\x1d!\x11'
+FEED_AND_CUT = b'\x1bd\x04' + b'\x1dVB\x00'  # avança o papel e corta
+
+# Comandos acima, para mostrar o ticket como texto (simular_impressora)
+COMMANDS = re.compile(rb'\x1b@|\x1b[taEd].|\x1d!.|\x1dVB.', re.S)
+
+NAME_WIDTH = 35  # mesmo limite do layout do Windows
+DATE_FORMAT = '%d/%m/%Y   %H:%M'
+DATE_WIDTH = 18  # '31/12/2025   23:59'
+
+
+class TicketTemplate:
+    """
+    Ticket de uma refeição em bytes, com os espaços de nome, empresa e
+    data/hora em branco. render() copia o modelo e preenche só esses espaços.
+    """
+
+    def __init__(self, title, columns, segunda_via=False):
+        self.slots = {}
+        data = bytearray()
+
+        def text(value):
+            data.extend(value.encode(ENCODING, 'replace'))
+
+        def slot(name, width):
+            self.slots[name] = (len(data), width)
+            data.extend(b' ' * width)
+
+        data += INIT + ALIGN_CENTER + BOLD_ON + SIZE_DOUBLE
+        text(title.upper() + '\n')
+        data += SIZE_NORMAL
+        if segunda_via:
+            text('*** 2ª VIA ***\n')
+        data += BOLD_OFF
+        text('-' * columns + '\n')
+
+        data += ALIGN_LEFT
+        for label, name, width in (
+            ('HÓSPEDE:', 'name', NAME_WIDTH),
+            ('EMPRESA:', 'company', NAME_WIDTH),
+            ('DATA/HORA:', 'date', DATE_WIDTH),
+        ):
+            data += BOLD_ON
+            text(label + '\n')
+            data += BOLD_OFF
+            text('  ')
+            slot(name, width)
+            text('\n')
+
+        text('-' * columns + '\n')
+        data += ALIGN_CENTER + BOLD_ON
+        text('HOTEL SOL NASCENTE\n')
+        data += BOLD_OFF + FEED_AND_CUT
+        self.data = bytes(data)
+
+    def render(self, **values):
+        ticket = bytearray(self.data)
+        for name, (offset, width) in self.slots.items():
+            # CP860 tem um byte por caractere: o texto ocupa exatamente o espaço
+            ticket[offset:offset + width] = values[name][:width].ljust(width).encode(ENCODING, 'replace')
+        return bytes(ticket)
+
+
+_templates = {}
+
+
+def ticket_bytes(meal, segunda_via=False):
+    """ Bytes ESC/POS do ticket (o modelo da refeição é montado na primeira vez). """
+    key = (meal.meal_type, segunda_via)
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = TicketTemplate(
+            meal.get_meal_type_display(), settings.TYBIS_PRINTER_COLUMNS, segunda_via
+        )
+    return template.render(
+        name=meal.name,
+        company=meal.company.name,
+        date=timezone.localtime(meal.created_at).strftime(DATE_FORMAT),
+    )
+
+
+# ==============================================================================
+# CONEXÕES
+# ==============================================================================
+
+class SocketPrinter:
+    """ Impressora de rede (porta RAW 9100). A conexão fica aberta entre tickets. """
+
+    def __init__(self, host, port, timeout=5):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.sock = None
+        self.lock = threading.Lock()
+
+    def _closed_by_printer(self):
+        # Conexão parada há muito tempo: a impressora pode ter fechado do lado dela
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            return bool(readable) and not self.sock.recv(1024)  # bytes de status são descartados
+        except OSError:
+            return True
+
+    def _socket(self):
+        if self.sock is not None and self._closed_by_printer():
+            self.close()
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return self.sock
+
+    def send(self, data):
+        with self.lock:
+            previous = self.sock
+            sock = self._socket()  # conexão nova que não abre: o erro sobe sem nova tentativa
+            sent = 0
+            try:
+                while sent < len(data):
+                    sent += sock.send(data[sent:])
+            except OSError:
+                self.close()
+                # Só a conexão reaproveitada que falhou antes do primeiro byte é refeita
+                # (impressora reiniciada, rede caiu); depois de um envio parcial, repetir
+                # imprimiria um ticket cortado e outro inteiro
+                if sock is not previous or sent:
+                    raise
+                self._socket().sendall(data)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+
+
+class DevicePrinter:
+    """ Impressora USB/serial pelo dispositivo do sistema (ex.: /dev/usb/lp0). """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def send(self, data):
+        with self.lock, open(self.path, 'wb') as device:
+            device.write(data)
+
+    def close(self):
+        pass
+
+
+_printer = None
+_printer_lock = threading.Lock()
+
+
+def get_printer():
+    """ Impressora de settings.TYBIS_PRINTER: 'tcp://host:porta' (ou 'host:porta') ou caminho do dispositivo. """
+    global _printer
+    with _printer_lock:
+        if _printer is None:
+            target = settings.TYBIS_PRINTER
+            if target.startswith('tcp://') or re.fullmatch(r'[\w.-]+:\d+', target):
+                host, _, port = target.removeprefix('tcp://').partition(':')
+                _printer = SocketPrinter(host, int(port or 9100))
+            else:
+                _printer = DevicePrinter(target)
+        return _printer
+
+
+def imprimir_ticket_refeicao(meal, segunda_via=False):
+    try:
+        get_printer().send(ticket_bytes(meal, segunda_via))
+        return True
+    except Exception:
+        logger.exception("❌ Erro ao imprimir o ticket %s em %s", meal.pk, settings.TYBIS_PRINTER)
+        return False
@@ -1,6 +1,35 @@
 from django import forms
+from django.forms.models import ModelChoiceIterator
+from .caching import get_companies
 from .models import Guest, Reservation, Company, Meal
 
+
+# ==============================================================================
+# CAMPOS AUXILIARES
+# ==============================================================================
+
+class CachedCompanyIterator(ModelChoiceIterator):
+    """
+    Monta as opções do <select> de empresas a partir do cache de referência,
+    sem consultar o banco a cada renderização. A validação do valor enviado
+    continua usando o queryset normal.
+    """
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for company in get_companies():
+            yield self.choice(company)
+
+    def __len__(self):
+        return len(get_companies()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(get_companies())
+
+
+class CachedCompanyField(forms.ModelChoiceField):
+    iterator = CachedCompanyIterator
+
 # ==============================================================================
 # FORMULÁRIOS ADMINISTRATIVOS
 # ==============================================================================
@@ -31,6 +60,7 @@ class GuestForm(forms.ModelForm):
     class Meta:
         model = Guest
         fields = ['name', 'company', 'phone', 'cpf', 'address']
+        field_classes = {'company': CachedCompanyField}
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nome Completo'}),
             'company': forms.Select(attrs={'class': 'form-select', 'id': 'company-select'}), # ID usado pelo HTMX
@@ -51,9 +81,41 @@ class MealForm(forms.ModelForm):
     class Meta:
         model = Meal
         fields = ['meal_type', 'name', 'cpf', 'company']
+        field_classes = {'company': CachedCompanyField}
         widgets = {
             'meal_type': forms.RadioSelect(attrs={'class': 'btn-check'}), # Renderizado como botões no template
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nome do Hóspede/Funcionário', 'autofocus': True}),
             'cpf': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '000.000.000-00'}),
             'company': forms.Select(attrs={'class': 'form-select'}),
-        }
\ No newline at end of file
+        }
+
+# ==============================================================================
+# IMPORTAÇÃO DE LISTAS (PLANILHA DA EMPRESA)
+# ==============================================================================
+
+class RosterImportForm(forms.Form):
+    """
+    Upload da lista de hóspedes enviada pela empresa contratante (CSV/XLSX).
+    """
+    STATUS_CHOICES = [('PRE', 'Pré-reserva'), ('ACTIVE', 'Check-in imediato')]
+
+    file = forms.FileField(
+        label="Planilha (CSV ou XLSX)",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+    company = CachedCompanyField(
+        label="Empresa (linhas sem a coluna Empresa)", queryset=Company.objects.all(), required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    status = forms.ChoiceField(
+        label="Criar como", choices=STATUS_CHOICES, initial='PRE',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    dry_run = forms.BooleanField(
+        label="Somente validar (não grava)", required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    download_report = forms.BooleanField(
+        label="Baixar relatório em CSV", required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
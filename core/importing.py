@@ -0,0 +1,380 @@
+import codecs
+import csv
+import io
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import IntegerField
+from django.db.models.functions import Cast
+
+from .caching import invalidate
+from .models import Room, Bed, Guest, Reservation, Company, StaySegment
+from .occupancy import refresh_rooms_of_beds
+from .search import index_reservations
+from .stays import new_stays
+from .utils import normalize_cpf, format_cpf
+
+# openpyxl é opcional: sem ele, apenas arquivos CSV são aceitos.
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+# ==============================================================================
+# LEITURA DA PLANILHA (CSV / XLSX)
+# As colunas são reconhecidas pelo nome, sem acento e sem diferenciar maiúsculas.
+# Obrigatórias: nome, cpf. Opcionais: empresa, telefone, endereco, quarto, cama.
+# ==============================================================================
+
+COLUMN_ALIASES = {
+    'nome': 'name', 'nome completo': 'name', 'name': 'name',
+    'cpf': 'cpf',
+    'empresa': 'company', 'company': 'company',
+    'telefone': 'phone', 'fone': 'phone', 'celular': 'phone', 'phone': 'phone',
+    'endereco': 'address', 'address': 'address',
+    'quarto': 'room', 'room': 'room',
+    'cama': 'bed', 'bed': 'bed',
+}
+
+
+class RosterError(ValueError):
+    """ Erro que impede a leitura do arquivo inteiro (formato, cabeçalho...). """
+
+
+ENCODING_ERROR = (
+    "Arquivo não está em UTF-8 nem em Windows-1252 (CSV do Excel). Salve como 'CSV UTF-8' e envie de novo."
+)
+
+
+def _normalize_text(value):
+    text = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode()
+    return ' '.join(text.lower().split())
+
+
+def _map_header(header):
+    columns = [COLUMN_ALIASES.get(_normalize_text(col)) for col in header]
+    if 'name' not in columns or 'cpf' not in columns:
+        raise RosterError("A planilha precisa das colunas 'Nome' e 'CPF'.")
+    return columns
+
+
+def _rows_from_table(rows):
+    """ Converte linhas (listas) em dicionários, a partir do cabeçalho. """
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        raise RosterError("Arquivo vazio.")
+    columns = _map_header(header)
+
+    for line_number, values in enumerate(rows, start=2):
+        if not any(str(v or '').strip() for v in values):
+            continue
+        row = {}
+        for key, value in zip(columns, values):
+            if key:
+                row[key] = str(value).strip() if value is not None else ''
+        yield line_number, row
+
+
+def read_roster(fileobj, filename):
+    """
+    Lê a lista de hóspedes linha a linha (sem carregar o arquivo inteiro).
+    Retorna um gerador de (número da linha, dicionário da linha).
+    """
+    if filename.lower().endswith('.xlsx'):
+        if openpyxl is None:
+            raise RosterError("openpyxl não instalado. Use 'pip install openpyxl' ou envie um CSV.")
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        return _rows_from_table(workbook.active.iter_rows(values_only=True))
+
+    if isinstance(fileobj, io.TextIOBase):
+        text = fileobj
+    else:
+        text = io.TextIOWrapper(fileobj, encoding=_detect_encoding(fileobj), newline='')
+
+    try:
+        sample = text.read(2048)
+        text.seek(0)
+    except UnicodeDecodeError:
+        raise RosterError(ENCODING_ERROR)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+    except csv.Error:
+        return _decoded_rows(_rows_from_table(csv.reader(text, delimiter=';')))
+    return _decoded_rows(_rows_from_table(csv.reader(text, dialect)))
+
+
+def _detect_encoding(fileobj, chunk_size=64 * 1024):
+    """
+    'utf-8-sig' se o arquivo inteiro for UTF-8; senão 'cp1252', o padrão do
+    Excel em português ao salvar CSV. Lê em blocos e volta ao início.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        while chunk := fileobj.read(chunk_size):
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'cp1252'
+    finally:
+        fileobj.seek(0)
+
+
+def _decoded_rows(rows):
+    """ Erro de codificação no meio do arquivo vira RosterError (mensagem no formulário). """
+    try:
+        yield from rows
+    except UnicodeDecodeError:
+        raise RosterError(ENCODING_ERROR)
+
+
+# ==============================================================================
+# ALOCAÇÃO DE CAMAS EM MEMÓRIA
+# Carrega o mapa uma única vez e aplica a regra "uma empresa por quarto",
+# preenchendo primeiro quartos que a empresa já ocupa parcialmente.
+# ==============================================================================
+
+class BedAllocator:
+
+    def __init__(self):
+        rooms = Room.objects.filter(is_maintenance=False).annotate(
+            numero_ordenado=Cast('number', IntegerField())
+        ).order_by('numero_ordenado', 'number')
+        self.room_numbers = {room.id: room.number for room in rooms}
+
+        occupied = {}
+        self.room_company = {}
+        for bed_id, room_id, company_id in Reservation.objects.filter(
+            status__in=['ACTIVE', 'PRE']
+        ).values_list('bed_id', 'bed__room_id', 'guest__company_id'):
+            occupied[bed_id] = True
+            self.room_company.setdefault(room_id, company_id)
+
+        self.free_beds = {room_id: [] for room_id in self.room_numbers}
+        self.bed_names = {}
+        self.bed_by_label = {}
+        for bed_id, room_id, name in Bed.objects.filter(
+            room__is_maintenance=False
+        ).order_by('name').values_list('id', 'room_id', 'name'):
+            self.bed_names[bed_id] = name
+            self.bed_by_label[(self.room_numbers[room_id], name.upper())] = (room_id, bed_id)
+            if bed_id not in occupied:
+                self.free_beds[room_id].append(bed_id)
+
+        # Quartos parcialmente ocupados por empresa e fila de quartos vazios
+        self.partial_rooms = {}
+        self.empty_rooms = deque()
+        for room_id in self.room_numbers:
+            if not self.free_beds[room_id]:
+                continue
+            company_id = self.room_company.get(room_id)
+            if company_id is None:
+                self.empty_rooms.append(room_id)
+            else:
+                self.partial_rooms.setdefault(company_id, deque()).append(room_id)
+
+    def label(self, bed_id, room_id):
+        return f"Quarto {self.room_numbers[room_id]} - Cama {self.bed_names[bed_id]}"
+
+    def _take(self, room_id, bed_id, company_id):
+        self.free_beds[room_id].remove(bed_id)
+        if self.room_company.get(room_id) is None:
+            self.room_company[room_id] = company_id
+            if room_id in self.empty_rooms:
+                self.empty_rooms.remove(room_id)
+            if self.free_beds[room_id]:
+                self.partial_rooms.setdefault(company_id, deque()).appendleft(room_id)
+        return room_id, bed_id
+
+    def allocate(self, company_id, room_number='', bed_name=''):
+        """
+        Reserva uma cama para a empresa. Retorna (room_id, bed_id) ou lança ValueError.
+        """
+        if room_number:
+            if bed_name:
+                candidates = [self.bed_by_label.get((room_number, bed_name.upper()))]
+            else:
+                candidates = [
+                    (room_id, bed_id) for room_id, number in self.room_numbers.items() if number == room_number
+                    for bed_id in self.free_beds[room_id][:1]
+                ]
+            candidates = [c for c in candidates if c]
+            if not candidates:
+                raise ValueError(f"Quarto/cama {room_number} {bed_name} inexistente, em manutenção ou sem vaga.")
+            room_id, bed_id = candidates[0]
+            if bed_id not in self.free_beds[room_id]:
+                raise ValueError(f"Cama {room_number}-{bed_name} já ocupada.")
+            if self.room_company.get(room_id) not in (None, company_id):
+                raise ValueError(f"Quarto {room_number} ocupado por outra empresa.")
+            return self._take(room_id, bed_id, company_id)
+
+        rooms = self.partial_rooms.get(company_id)
+        while rooms:
+            room_id = rooms[0]
+            if self.free_beds[room_id]:
+                bed_id = self.free_beds[room_id][0]
+                if len(self.free_beds[room_id]) == 1:
+                    rooms.popleft()
+                return self._take(room_id, bed_id, company_id)
+            rooms.popleft()
+
+        while self.empty_rooms:
+            room_id = self.empty_rooms[0]
+            if self.free_beds[room_id]:
+                return self._take(room_id, self.free_beds[room_id][0], company_id)
+            self.empty_rooms.popleft()
+
+        raise ValueError("Não há camas livres compatíveis com a empresa.")
+
+
+# ==============================================================================
+# IMPORTAÇÃO
+# ==============================================================================
+
+@dataclass
+class ImportResult:
+    created: list = field(default_factory=list)   # [{'line', 'name', 'cpf', 'bed'}]
+    errors: list = field(default_factory=list)    # [{'line', 'name', 'cpf', 'error'}]
+    dry_run: bool = False
+
+    @property
+    def total(self):
+        return len(self.created) + len(self.errors)
+
+
+def _find_existing_guests(cpfs, chunk_size=400):
+    """
+    Busca hóspedes já cadastrados pelo CPF (com e sem máscara), de qualquer empresa.
+    Retorna {cpf normalizado: [Guest, ...]} (mais recente primeiro; cadastros
+    antigos podem ter o mesmo CPF repetido).
+    """
+    found = {}
+    cpfs = list(cpfs)
+    for i in range(0, len(cpfs), chunk_size):
+        chunk = cpfs[i:i + chunk_size]
+        variants = chunk + [format_cpf(cpf) for cpf in chunk]
+        for guest in Guest.objects.filter(cpf__in=variants).select_related('company').order_by('-id'):
+            found.setdefault(normalize_cpf(guest.cpf), []).append(guest)
+    return found
+
+
+def _hosted_guest_ids(guest_ids, chunk_size=400):
+    guest_ids = list(guest_ids)
+    hosted = set()
+    for i in range(0, len(guest_ids), chunk_size):
+        hosted.update(Reservation.objects.filter(
+            guest_id__in=guest_ids[i:i + chunk_size], status__in=['ACTIVE', 'PRE']
+        ).values_list('guest_id', flat=True))
+    return hosted
+
+
+def import_roster(rows, user=None, default_company=None, status='PRE', dry_run=False):
+    """
+    Valida as linhas, deduplica hóspedes por CPF, aloca camas e grava
+    hóspedes e reservas com bulk_create em uma única transação.
+    Linhas com erro são ignoradas e listadas no relatório.
+
+    O CPF identifica a pessoa em qualquer empresa: quem já tem reserva ativa ou
+    pré-reserva (por qualquer cadastro com o CPF) não é importado de novo, e um
+    CPF cadastrado em outra empresa recusa a linha em vez de trocar a empresa
+    do hóspede (as estadias anteriores mudariam de empresa nos fechamentos).
+    """
+    result = ImportResult(dry_run=dry_run)
+    companies = {_normalize_text(c.name): c for c in Company.objects.all()}
+
+    # 1ª passada: validação de cada linha
+    valid = []
+    seen_cpfs = set()
+    for line_number, row in rows:
+        name = ' '.join(row.get('name', '').split())
+        cpf = normalize_cpf(row.get('cpf'))
+        info = {'line': line_number, 'name': name, 'cpf': format_cpf(cpf) or row.get('cpf', '')}
+
+        company = companies.get(_normalize_text(row.get('company'))) if row.get('company') else default_company
+        if not name:
+            error = "Nome em branco."
+        elif len(cpf) != 11:
+            error = "CPF inválido (precisa de 11 dígitos)."
+        elif cpf in seen_cpfs:
+            error = "CPF repetido na planilha."
+        elif company is None:
+            error = f"Empresa '{row.get('company', '')}' não cadastrada." if row.get('company') else "Empresa não informada."
+        else:
+            error = None
+
+        if error:
+            result.errors.append({**info, 'error': error})
+            continue
+
+        seen_cpfs.add(cpf)
+        valid.append((info, row, cpf, company))
+
+    if not valid:
+        return result
+
+    with transaction.atomic():
+        existing = _find_existing_guests({cpf for _, _, cpf, _ in valid})
+        hosted = _hosted_guest_ids(guest.id for guests in existing.values() for guest in guests)
+        allocator = BedAllocator()
+
+        # 2ª passada: alocação em memória
+        planned = []
+        for info, row, cpf, company in valid:
+            guests = existing.get(cpf, [])
+            if any(guest.id in hosted for guest in guests):
+                result.errors.append({**info, 'error': "Hóspede já possui reserva ativa ou pré-reserva."})
+                continue
+            guest = next((guest for guest in guests if guest.company_id == company.id), None)
+            if guests and guest is None:
+                result.errors.append({
+                    **info, 'error': f"CPF já cadastrado na empresa {guests[0].company.name}. "
+                                     f"Altere a empresa no cadastro do hóspede antes de importar."
+                })
+                continue
+            try:
+                room_id, bed_id = allocator.allocate(company.id, row.get('room', ''), row.get('bed', ''))
+            except ValueError as e:
+                result.errors.append({**info, 'error': str(e)})
+                continue
+
+            if guest is None:
+                guest = Guest(
+                    name=info['name'], company=company, cpf=format_cpf(cpf),
+                    phone=row.get('phone', ''), address=row.get('address') or None
+                )
+            planned.append((info, guest, bed_id, allocator.label(bed_id, room_id)))
+
+        result.created = [{**info, 'bed': label} for info, _, _, label in planned]
+
+        if not dry_run:
+            # 3ª passada: gravação em lote
+            Guest.objects.bulk_create([guest for _, guest, _, _ in planned if guest.pk is None])
+
+            reservations = []
+            for info, guest, bed_id, label in planned:
+                res = Reservation(guest=guest, bed_id=bed_id, status=status)
+                res.add_log(user, "Reserva Criada (Importação)", label)
+                reservations.append(res)
+            Reservation.objects.bulk_create(reservations)
+            StaySegment.objects.bulk_create(new_stays(reservations))
+            # bulk_create não dispara signals
+            refresh_rooms_of_beds(res.bed_id for res in reservations)
+            index_reservations(res.pk for res in reservations)
+            transaction.on_commit(lambda: invalidate('occupancy'))
+
+    result.errors.sort(key=lambda item: item['line'])
+    return result
+
+
+def write_report(result, fileobj):
+    """ Relatório por linha em CSV (mesmo padrão ';' dos demais relatórios). """
+    writer = csv.writer(fileobj, delimiter=';')
+    writer.writerow(['LINHA', 'NOME', 'CPF', 'RESULTADO', 'DETALHE'])
+    rows = [(item['line'], item['name'], item['cpf'], 'OK', item['bed']) for item in result.created]
+    rows += [(item['line'], item['name'], item['cpf'], 'ERRO', item['error']) for item in result.errors]
+    for row in sorted(rows):
+        writer.writerow(row)
@@ -0,0 +1,230 @@
+import csv
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.db import transaction
+
+from .caching import invalidate
+from .models import Room, Bed, Reservation
+from .occupancy import refresh_rooms
+
+# PyYAML é opcional: sem ele, apenas planilhas CSV são aceitas.
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+# ==============================================================================
+# ESPECIFICAÇÃO DO INVENTÁRIO
+# Formato YAML:
+#   rooms:
+#     - range: 1-96          # ou "numbers: [101, 102]"
+#       prefix: "B"          # opcional (ex: prédio B -> B101)
+#       padding: 3           # opcional (zeros à esquerda: 1 -> 001)
+#       beds: [A, B]
+#       climate: AC          # AC ou VENT
+#       maintenance: false
+#
+# Formato CSV (separador ';', mesma ordem do YAML):
+#   range;prefix;padding;beds;climate;maintenance
+#   1-96;;;A,B;VENT;0
+# ==============================================================================
+
+VALID_CLIMATES = {code for code, _ in Room.CLIMATE_CHOICES}
+TRUE_VALUES = {'1', 'true', 'sim', 's', 'yes', 'y', 'x'}
+
+
+class InventorySpecError(ValueError):
+    """ Erro de leitura/validação da especificação do inventário. """
+
+
+@dataclass
+class RoomSpec:
+    number: str
+    beds: list
+    climate: str = 'VENT'
+    is_maintenance: bool = False
+
+
+@dataclass
+class InventoryPlan:
+    """ Resultado da comparação entre a especificação e o banco. """
+    rooms_to_create: list = field(default_factory=list)
+    rooms_to_update: list = field(default_factory=list)
+    beds_to_create: list = field(default_factory=list)   # [(número do quarto, cama)]
+    extra_beds: list = field(default_factory=list)       # camas no banco que não estão na spec
+    skipped_maintenance: list = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def has_changes(self):
+        return bool(self.rooms_to_create or self.rooms_to_update or self.beds_to_create)
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def _parse_numbers(entry):
+    if entry.get('numbers'):
+        numbers = entry['numbers']
+        if isinstance(numbers, str):
+            numbers = numbers.split(',')
+        return [str(n).strip() for n in numbers if str(n).strip()]
+
+    raw_range = str(entry.get('range') or '').strip()
+    if not raw_range:
+        raise InventorySpecError("Cada linha precisa de 'range' ou 'numbers'.")
+
+    first, _, last = raw_range.partition('-')
+    try:
+        first, last = int(first), int(last or first)
+    except ValueError:
+        raise InventorySpecError(f"Intervalo inválido: '{raw_range}'")
+    if last < first:
+        raise InventorySpecError(f"Intervalo invertido: '{raw_range}'")
+    return [str(n) for n in range(first, last + 1)]
+
+
+def _expand_entry(entry):
+    prefix = str(entry.get('prefix') or '')
+    padding = int(entry.get('padding') or 0)
+
+    beds = entry.get('beds') or ['A', 'B']
+    if isinstance(beds, str):
+        beds = beds.split(',')
+    beds = [str(b).strip().upper() for b in beds if str(b).strip()]
+
+    climate = str(entry.get('climate') or 'VENT').strip().upper()
+    if climate not in VALID_CLIMATES:
+        raise InventorySpecError(f"Climatização inválida: '{climate}' (use {', '.join(sorted(VALID_CLIMATES))})")
+
+    is_maintenance = _parse_bool(entry.get('maintenance'))
+
+    for number in _parse_numbers(entry):
+        if padding and number.isdigit():
+            number = number.zfill(padding)
+        yield RoomSpec(f"{prefix}{number}", beds, climate, is_maintenance)
+
+
+def parse_spec(entries):
+    """
+    Expande as linhas da especificação em um dicionário {número: RoomSpec}.
+    Linhas posteriores sobrescrevem as anteriores (útil para exceções pontuais).
+    """
+    rooms = {}
+    for entry in entries:
+        for room_spec in _expand_entry(entry):
+            if len(room_spec.number) > Room._meta.get_field('number').max_length:
+                raise InventorySpecError(f"Número de quarto muito longo: '{room_spec.number}'")
+            rooms[room_spec.number] = room_spec
+    return rooms
+
+
+def load_spec(path):
+    """ Lê um arquivo YAML ou CSV e devolve a especificação expandida. """
+    path = Path(path)
+    if not path.exists():
+        raise InventorySpecError(f"Arquivo não encontrado: {path}")
+
+    if path.suffix.lower() in ('.yml', '.yaml'):
+        if yaml is None:
+            raise InventorySpecError("PyYAML não instalado. Use 'pip install pyyaml' ou um arquivo CSV.")
+        with path.open(encoding='utf-8') as fh:
+            data = yaml.safe_load(fh) or {}
+        entries = data.get('rooms', []) if isinstance(data, dict) else data
+    else:
+        with path.open(encoding='utf-8-sig', newline='') as fh:
+            entries = list(csv.DictReader(fh, delimiter=';'))
+
+    return parse_spec(entries)
+
+
+# ==============================================================================
+# DIFF E APLICAÇÃO
+# ==============================================================================
+
+def build_plan(spec, update_existing=True):
+    """
+    Compara a especificação com o banco usando 3 consultas no total
+    (quartos, camas e quartos ocupados), independente do tamanho do hotel.
+    Com update_existing=False, quartos já cadastrados só recebem camas faltantes.
+    """
+    plan = InventoryPlan()
+    existing_rooms = {room.number: room for room in Room.objects.all()}
+
+    existing_beds = {}
+    for room_number, bed_name in Bed.objects.values_list('room__number', 'name'):
+        existing_beds.setdefault(room_number, set()).add(bed_name)
+
+    occupied_rooms = set(
+        Reservation.objects.filter(status__in=['ACTIVE', 'PRE'])
+        .values_list('bed__room__number', flat=True)
+    )
+
+    for number, room_spec in spec.items():
+        room = existing_rooms.get(number)
+
+        if room is None:
+            plan.rooms_to_create.append(Room(
+                number=number, climate=room_spec.climate, is_maintenance=room_spec.is_maintenance
+            ))
+            plan.beds_to_create.extend((number, bed) for bed in room_spec.beds)
+            continue
+
+        changed = False
+        if update_existing and room.climate != room_spec.climate:
+            room.climate = room_spec.climate
+            changed = True
+        if update_existing and room.is_maintenance != room_spec.is_maintenance:
+            # Mesma regra do Mapa: não se coloca em manutenção um quarto ocupado.
+            if room_spec.is_maintenance and number in occupied_rooms:
+                plan.skipped_maintenance.append(number)
+            else:
+                room.is_maintenance = room_spec.is_maintenance
+                changed = True
+
+        if changed:
+            plan.rooms_to_update.append(room)
+
+        current_beds = existing_beds.get(number, set())
+        missing = [bed for bed in room_spec.beds if bed not in current_beds]
+        plan.beds_to_create.extend((number, bed) for bed in missing)
+        plan.extra_beds.extend((number, bed) for bed in sorted(current_beds - set(room_spec.beds)))
+
+        if not changed and not missing:
+            plan.unchanged += 1
+
+    return plan
+
+
+@transaction.atomic
+def apply_plan(plan, batch_size=500):
+    """
+    Grava o plano em uma única transação com bulk_create/bulk_update.
+    Camas excedentes nunca são removidas (podem ter histórico de reservas).
+    """
+    Room.objects.bulk_create(plan.rooms_to_create, batch_size=batch_size)
+    if plan.rooms_to_update:
+        Room.objects.bulk_update(plan.rooms_to_update, ['climate', 'is_maintenance'], batch_size=batch_size)
+
+    if plan.beds_to_create:
+        room_ids = dict(Room.objects.values_list('number', 'id'))
+        Bed.objects.bulk_create(
+            [Bed(room_id=room_ids[number], name=name) for number, name in plan.beds_to_create],
+            batch_size=batch_size
+        )
+
+    # bulk_create/bulk_update não disparam signals
+    numbers = [room.number for room in plan.rooms_to_create + plan.rooms_to_update]
+    if numbers:
+        refresh_rooms(Room.objects.filter(number__in=numbers))
+    transaction.on_commit(lambda: invalidate('rooms', 'occupancy'))
+
+
+def default_spec():
+    """ Layout padrão do Hotel: 96 quartos com ventilador e camas A e B. """
+    return parse_spec([{'range': '1-96', 'beds': ['A', 'B'], 'climate': 'VENT'}])
@@ -0,0 +1,264 @@
+import csv
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .billing import (
+    compute_closing_rows, compute_invoices, get_closing_report, is_closed_period, write_closing_csv,
+    write_invoices_zip
+)
+from .models import BackgroundJob, Meal
+from .reporting import primary, reading
+from .utils import local_day_start
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# EXECUTOR DE TAREFAS (sem broker externo)
+#
+# A fila é a própria tabela BackgroundJob. Por padrão as tarefas rodam em um
+# pool de threads dentro do processo do Waitress, separado das 4 threads que
+# atendem as telas: a recepção nunca espera por uma exportação.
+# Limites (settings): TYBIS_JOB_WORKERS tarefas simultâneas no processo e
+# TYBIS_JOB_MAX_PER_USER tarefas abertas por usuário.
+# Com TYBIS_JOB_WORKERS=0 o site só enfileira e quem executa é o comando
+# 'python manage.py processar_tarefas' (outro processo).
+# ==============================================================================
+
+TASKS = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobLimitError(Exception):
+    """ Usuário já tem o máximo de tarefas na fila/em execução. """
+
+
+def task(kind, label):
+    """
+    Registra uma função como tarefa. Ela recebe (job, **params), informa o
+    andamento com job.report(feitos, total) e grava a saída em job.output_path.
+    """
+    def decorator(func):
+        TASKS[kind] = (func, label)
+        return func
+    return decorator
+
+
+def _workers():
+    return getattr(settings, 'TYBIS_JOB_WORKERS', 1)
+
+
+def _jobs_dir():
+    path = Path(getattr(settings, 'TYBIS_JOBS_DIR', settings.BASE_DIR / 'jobs'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='tybis-job')
+            recover()
+    return _executor
+
+
+def start():
+    """ Inicia o pool deste processo e retoma a fila (chamado pelo run_waitress). """
+    if _workers() > 0:
+        _get_executor()
+
+
+def recover():
+    """
+    Tarefas 'Processando' de uma execução anterior (servidor reiniciado) viram
+    erro; as que estão na fila são reenviadas ao pool.
+    """
+    BackgroundJob.objects.filter(status='RUNNING').update(
+        status='ERROR', message='Interrompido: o servidor foi reiniciado.', finished_at=timezone.now()
+    )
+    for pk in BackgroundJob.objects.filter(status='PENDING').order_by('created_at').values_list('pk', flat=True):
+        _executor.submit(run_job, pk)
+
+
+def submit(kind, params, user, label=None):
+    """
+    Enfileira uma tarefa registrada e devolve o BackgroundJob.
+    Lança JobLimitError se o usuário já atingiu o limite de tarefas abertas.
+    """
+    label = label or TASKS[kind][1]
+    limit = getattr(settings, 'TYBIS_JOB_MAX_PER_USER', 2)
+    with primary():
+        open_jobs = BackgroundJob.objects.filter(user=user, status__in=['PENDING', 'RUNNING']).count()
+    if open_jobs >= limit:
+        raise JobLimitError(f"Você já tem {limit} relatórios em andamento. Aguarde a conclusão.")
+
+    job = BackgroundJob.objects.create(user=user, kind=kind, label=label, params=params)
+    if _workers() > 0:
+        transaction.on_commit(lambda: _get_executor().submit(run_job, job.pk))
+    return job
+
+
+# ==============================================================================
+# EXECUÇÃO
+# ==============================================================================
+
+class JobContext:
+    """ Visão da tarefa para a função registrada (andamento e arquivo de saída). """
+
+    # Intervalo mínimo entre gravações de andamento (evita travar o SQLite)
+    REPORT_INTERVAL = 0.5
+
+    def __init__(self, job):
+        self.job = job
+        self.output_path = None
+        self.output_name = None
+        self._last_report = 0
+        self._last_progress = 0
+
+    def output(self, file_name):
+        """ Define o nome do arquivo para download e devolve o caminho onde gravá-lo. """
+        self.output_name = file_name
+        self.output_path = _jobs_dir() / f"{self.job.pk}-{uuid.uuid4().hex[:8]}-{file_name}"
+        return self.output_path
+
+    def report(self, done, total):
+        # Libera o GIL para as threads das telas a cada bloco processado
+        time.sleep(0)
+        progress = min(99, int(done * 100 / total)) if total else 0
+        now = time.monotonic()
+        if progress > self._last_progress and now - self._last_report >= self.REPORT_INTERVAL:
+            try:
+                BackgroundJob.objects.filter(pk=self.job.pk).update(progress=progress)
+            except OperationalError:
+                return  # Banco ocupado: o andamento é só informativo, tenta no próximo bloco
+            self._last_progress, self._last_report = progress, now
+
+
+def run_job(pk):
+    """ Executa uma tarefa da fila (ignora se outro executor já a pegou). """
+    claimed = BackgroundJob.objects.filter(pk=pk, status='PENDING').update(
+        status='RUNNING', started_at=timezone.now()
+    )
+    if not claimed:
+        return
+
+    job = BackgroundJob.objects.get(pk=pk)
+    context = JobContext(job)
+    try:
+        func, _ = TASKS[job.kind]
+        with reading():  # exportações leem pela conexão dos relatórios (reporting.py)
+            func(context, **job.params)
+        BackgroundJob.objects.filter(pk=pk).update(
+            status='DONE', progress=100, finished_at=timezone.now(),
+            file_name=context.output_name or '', file_path=str(context.output_path or '')
+        )
+    except Exception as e:
+        logger.exception("Erro na tarefa %s (%s)", pk, job.kind)
+        BackgroundJob.objects.filter(pk=pk).update(status='ERROR', message=str(e), finished_at=timezone.now())
+    finally:
+        # Cada thread do pool abre a própria conexão com o banco
+        close_old_connections()
+
+
+def cleanup(days=None):
+    """ Apaga tarefas concluídas (e seus arquivos) com mais de N dias. """
+    days = days if days is not None else getattr(settings, 'TYBIS_JOB_KEEP_DAYS', 7)
+    old = BackgroundJob.objects.filter(
+        status__in=['DONE', 'ERROR'], created_at__lt=timezone.now() - timedelta(days=days)
+    )
+    for path in old.exclude(file_path='').values_list('file_path', flat=True):
+        Path(path).unlink(missing_ok=True)
+    return old.delete()[0]
+
+
+# ==============================================================================
+# TAREFAS REGISTRADAS (Exportações pesadas)
+# Os CSVs usam o mesmo padrão dos relatórios (';' e UTF-8 com BOM para o Excel).
+# ==============================================================================
+
+def _parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def _keyset_chunks(rows, chunk_size=2000):
+    """
+    Percorre (pk, created_at, ...) do mais recente para o mais antigo em blocos.
+    Cada bloco é uma consulta fechada: nenhum cursor fica aberto no SQLite
+    enquanto a tarefa grava o andamento (o que travaria as gravações das telas).
+    """
+    rows = rows.order_by('-created_at', '-pk')
+    last = None
+    while True:
+        query = rows
+        if last:
+            query = rows.filter(Q(created_at__lt=last[1]) | Q(created_at=last[1], pk__lt=last[0]))
+        chunk = list(query[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+@task('meal_csv', 'Refeições (CSV)')
+def export_meals(job, start_date=None, end_date=None, company_id=None):
+    meals = Meal.objects.all()
+    if start_date:
+        meals = meals.filter(created_at__gte=local_day_start(_parse_day(start_date)))
+    if end_date:
+        meals = meals.filter(created_at__lt=local_day_start(_parse_day(end_date) + timedelta(days=1)))
+    if company_id:
+        meals = meals.filter(company_id=company_id)
+
+    total = meals.count()
+    meal_types = dict(Meal.MEAL_CHOICES)
+
+    with open(job.output('refeicoes.csv'), 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['Data', 'Hora', 'Tipo', 'Nome', 'Empresa', 'CPF'])
+        done = 0
+        for chunk in _keyset_chunks(meals.values_list('pk', 'created_at', 'meal_type', 'name', 'company__name', 'cpf')):
+            for pk, created_at, meal_type, name, company_name, cpf in chunk:
+                local_dt = timezone.localtime(created_at)
+                writer.writerow([
+                    local_dt.strftime('%d/%m/%Y'),
+                    local_dt.strftime('%H:%M'),
+                    meal_types.get(meal_type, meal_type),
+                    name.upper(),
+                    company_name.upper(),
+                    cpf or ''
+                ])
+            done += len(chunk)
+            job.report(done, total)
+
+
+@task('closing_csv', 'Fechamento (CSV)')
+def export_closing(job, start_date, end_date, company_id=None):
+    filter_start, filter_end = _parse_day(start_date), _parse_day(end_date)
+    if is_closed_period(filter_end):
+        # Período fechado: aproveita (ou gera) o fechamento gravado
+        rows = get_closing_report(filter_start, filter_end, company_id).rows
+    else:
+        rows = compute_closing_rows(filter_start, filter_end, company_id, progress=job.report)
+    with open(job.output('fatura.csv'), 'w', encoding='utf-8-sig', newline='') as f:
+        write_closing_csv(rows, f)
+
+
+@task('invoices_zip', 'Faturas de todas as empresas (ZIP)')
+def export_invoices(job, start_date, end_date, processes=None):
+    filter_start, filter_end = _parse_day(start_date), _parse_day(end_date)
+    invoices = compute_invoices(filter_start, filter_end, processes, progress=job.report)
+    with open(job.output(f"faturas_{filter_start:%Y%m%d}_{filter_end:%Y%m%d}.zip"), 'wb') as f:
+        write_invoices_zip(invoices, filter_start, filter_end, f)
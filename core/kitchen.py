@@ -0,0 +1,111 @@
+import threading
+import uuid
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .caching import CACHE_TIMEOUT, get_active_guests, get_companies, version as occupancy_version
+from .models import Meal
+from .utils import local_range
+
+
+# ==============================================================================
+# QUADRO DA COZINHA (Tickets do dia x hóspedes com check-in)
+#
+# Os tickets de hoje ficam em contadores na memória do processo, por
+# (empresa, tipo). Cada ticket gravado soma 1 no contador (signals.py) e troca
+# o carimbo do quadro no cache compartilhado; as telas da cozinha consultam
+# só o carimbo e recebem 204 enquanto ele não muda.
+# O contador é recontado do banco (uma consulta agregada) apenas na virada do
+# dia, quando outro processo gravou o carimbo ou quando um ticket é alterado
+# ou apagado. Tickets criados em lote (bulk_create) não passam por aqui.
+# ==============================================================================
+
+_VERSION_KEY = 'kitchen:version'
+
+_lock = threading.Lock()
+_board = {'day': None, 'version': None, 'meals': Counter()}
+
+
+def _stamp():
+    stamp = cache.get(_VERSION_KEY)
+    if stamp is None:
+        cache.add(_VERSION_KEY, uuid.uuid4().hex, CACHE_TIMEOUT)
+        stamp = cache.get(_VERSION_KEY)
+    return stamp
+
+
+def version():
+    """ Carimbo do quadro: muda a cada ticket, check-in/checkout e na virada do dia. """
+    return f'{timezone.localdate():%Y%m%d}-{_stamp()}-{occupancy_version("occupancy")}'
+
+
+def _count_meals(day):
+    start, end = local_range(day, day)
+    return Counter({
+        (company_id, meal_type): total
+        for company_id, meal_type, total in Meal.objects.filter(created_at__gte=start, created_at__lt=end)
+        .order_by().values_list('company_id', 'meal_type').annotate(total=Count('pk'))
+    })
+
+
+def _current_meals():
+    """ Contadores de hoje (recontados se o dia ou o carimbo mudou). """
+    day, stamp = timezone.localdate(), _stamp()
+    with _lock:
+        if _board['day'] != day or _board['version'] != stamp:
+            _board.update(day=day, version=stamp, meals=_count_meals(day))
+        return Counter(_board['meals'])
+
+
+def record_meal(meal):
+    """ Soma o ticket recém-gravado ao contador de hoje (chamado após o COMMIT). """
+    day = timezone.localtime(meal.created_at).date()
+    with _lock:
+        seen = _stamp()
+        in_sync = _board['day'] == day and _board['version'] == seen
+        if in_sync:
+            _board['meals'][(meal.company_id, meal.meal_type)] += 1
+        # Outro processo pode ter trocado o carimbo desde a leitura (ticket
+        # alterado/apagado): aí o contador não vale mais e a próxima leitura reconta
+        unchanged = cache.get(_VERSION_KEY) == seen
+        stamp = uuid.uuid4().hex
+        cache.set(_VERSION_KEY, stamp, CACHE_TIMEOUT)
+        _board['version'] = stamp if in_sync and unchanged else None
+
+
+def invalidate_board():
+    """ Ticket alterado/apagado: o próximo acesso reconta o dia. """
+    with _lock:
+        cache.set(_VERSION_KEY, uuid.uuid4().hex, CACHE_TIMEOUT)
+        _board['version'] = None
+
+
+def get_board():
+    """
+    Linhas por empresa com tickets emitidos hoje e a previsão do que ainda
+    falta sair (hóspedes com check-in menos tickets já emitidos, por refeição).
+    """
+    meals = _current_meals()
+    guests = get_active_guests()
+    meal_types = [code for code, _ in Meal.MEAL_CHOICES]
+
+    rows = []
+    totals = {'guests': 0, **{code: {'issued': 0, 'expected': 0} for code in meal_types}}
+    for company in get_companies():
+        active = guests.get(company.pk, 0)
+        issued = {code: meals.get((company.pk, code), 0) for code in meal_types}
+        if not active and not any(issued.values()):
+            continue
+        row = {'company': company, 'guests': active}
+        totals['guests'] += active
+        for code in meal_types:
+            row[code] = {'issued': issued[code], 'expected': max(active - issued[code], 0)}
+            totals[code]['issued'] += issued[code]
+            totals[code]['expected'] += row[code]['expected']
+        rows.append(row)
+
+    rows.sort(key=lambda row: (-row['guests'], row['company'].name))
+    return {'rows': rows, 'totals': totals}
@@ -0,0 +1,400 @@
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from importlib import import_module
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.utils.crypto import get_random_string
+
+
+# ==============================================================================
+# TESTE DE CARGA (recepção, refeitório e financeiro ao mesmo tempo)
+#
+# Cada perfil é o roteiro de um posto de trabalho (PC da recepção, balcão do
+# refeitório, tela da cozinha, financeiro) escrito como corrotina: faz as
+# mesmas requisições que o navegador (HTMX incluído), com as pausas de quem
+# está usando. Centenas de postos cabem em um laço de eventos, sem threads.
+# O comando 'benchmark_carga' monta as etapas, sobe o servidor e mostra os
+# resultados.
+# ==============================================================================
+
+CLIENT_ERRORS = (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError)
+REQUEST_TIMEOUT = 60
+HTMX = 'HX-Request: true\r\n'
+
+
+class HttpClient:
+    """ Cliente HTTP/1.1 mínimo com keep-alive (uma tela do navegador). """
+
+    def __init__(self, port, headers, host='127.0.0.1'):
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self.reader = self.writer = None
+
+    async def request(self, method, path, data=None, headers=''):
+        """ Retorna (status, cabeçalhos em minúsculas, corpo). """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = urlencode(data).encode() if data is not None else b''
+        if data is not None:
+            headers += f'Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n'
+        self.writer.write(f'{method} {path} HTTP/1.1\r\n{self.headers}{headers}\r\n'.encode() + body)
+        await self.writer.drain()
+
+        head = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+        status_line, *lines = head.rstrip('\r\n').split('\r\n')
+        status = int(status_line.split(' ', 2)[1])
+        response_headers = {}
+        for line in lines:
+            name, _, value = line.partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = b''
+            while size := int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16):
+                content += await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+            await self.reader.readuntil(b'\r\n')
+        elif method == 'HEAD' or status in (204, 304):
+            content = b''
+        else:
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, response_headers, content
+
+    async def get(self, path):
+        return (await self.request('GET', path))[0]
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def login_headers(user, host='127.0.0.1'):
+    """
+    Cabeçalhos de um navegador logado como 'user' (sessão gravada direto no
+    banco, sem senha) e com o token CSRF para os POSTs.
+    """
+    # 'cached_db' grava só no banco: o servidor (outro processo) lê de lá.
+    # save() e não create(): em 'signed_cookies' a chave (o próprio cookie) só existe depois do save()
+    session = import_module(settings.SESSION_ENGINE.replace('cached_db', 'db')).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    csrf = get_random_string(32)
+    return (
+        f'Host: {host}\r\n'
+        f'Cookie: {settings.SESSION_COOKIE_NAME}={session.session_key}; {settings.CSRF_COOKIE_NAME}={csrf}\r\n'
+        f'X-CSRFToken: {csrf}\r\nConnection: keep-alive\r\n'
+    )
+
+
+class ServerError(Exception):
+    """ O servidor (ou a impressora simulada) não subiu. """
+
+
+def start_process(name, args, port, env=None, log=None):
+    """ Sobe um processo auxiliar (servidor, impressora simulada) e espera a porta abrir. """
+    log = log or tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        args, cwd=settings.BASE_DIR, env=env or os.environ.copy(), stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise ServerError(f'{name} não iniciou:\n{log.read().decode(errors="replace")[-1000:]}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.3)
+    process.kill()
+    raise ServerError(f'{name} não respondeu na porta {port}.')
+
+
+def percentile(timings, point):
+    """ Percentil (1-99) de uma lista de tempos. """
+    if len(timings) < 2:
+        return timings[0] if timings else 0
+    return statistics.quantiles(timings, n=100)[point - 1]
+
+
+# ==============================================================================
+# MEDIDAS
+# ==============================================================================
+
+class Recorder:
+    """ Tempos e erros por endpoint, e contadores de eventos de uma etapa. """
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.events = defaultdict(int)
+        self.elapsed = 0
+
+    def add(self, label, milliseconds=None, error=False):
+        if milliseconds is not None:
+            self.timings[label].append(milliseconds)
+        if error:
+            self.errors[label] += 1
+
+    def event(self, name):
+        self.events[name] += 1
+
+    @property
+    def labels(self):
+        return sorted(set(self.timings) | set(self.errors))
+
+    @property
+    def requests(self):
+        return sum(len(timings) for label, timings in self.timings.items() if not label.startswith('*'))
+
+    @property
+    def failures(self):
+        return sum(self.errors.values())
+
+    def all_timings(self):
+        return [ms for label, timings in self.timings.items() if not label.startswith('*') for ms in timings]
+
+
+class Station:
+    """ Um posto de trabalho: a conexão, o próprio sorteio e o fim da etapa. """
+
+    def __init__(self, number, client, recorder, data, deadline, pace):
+        self.rng = random.Random(number)
+        self.client = client
+        self.recorder = recorder
+        self.data = data
+        self.deadline = deadline
+        self.pace = pace
+
+    @property
+    def running(self):
+        return time.monotonic() < self.deadline
+
+    async def wait(self, seconds):
+        """ Espera fixa (atualização automática da tela), no máximo até o fim da etapa. """
+        await asyncio.sleep(max(0, min(seconds, self.deadline - time.monotonic())))
+
+    async def think(self, seconds):
+        """ Pausa de pessoa (±50%, vezes o ritmo da etapa). """
+        await self.wait(seconds * self.pace * self.rng.uniform(0.5, 1.5))
+
+    async def call(self, label, method, path, data=None, htmx=False):
+        """ Faz a requisição e registra o tempo. Retorna (status, cabeçalhos, corpo) ou None se a conexão falhou. """
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                self.client.request(method, path, data, HTMX if htmx else ''), REQUEST_TIMEOUT
+            )
+        except CLIENT_ERRORS:
+            await self.client.close()
+            self.recorder.add(label, error=True)
+            return None
+        self.recorder.add(label, (time.perf_counter() - start) * 1000, error=response[0] >= 400)
+        return response
+
+
+def _cpf(rng):
+    return f'{rng.randrange(10 ** 11):011d}'
+
+
+# ==============================================================================
+# PERFIS (um roteiro por posto de trabalho)
+# ==============================================================================
+
+FILTERS = ['FREE', 'OCCUPIED', 'PRE', 'MAINTENANCE']
+
+
+async def _new_reservation(station):
+    """ Modal de nova reserva: camas livres (API e HTMX), digitação e gravação como pré-reserva. """
+    company = station.rng.choice(station.data['companies'])
+    await station.call('nova reserva (modal)', 'GET', '/reserva/nova/', htmx=True)
+    response = await station.call('camas livres (API)', 'GET', '/api/v1/camas-livres/')
+    await station.think(2)
+    await station.call('camas livres (HTMX)', 'GET', f'/htmx/camas-disponiveis/?company={company}', htmx=True)
+    if response is None or response[0] != 200:
+        return
+    beds = [
+        bed_id for _, _, _, room_company, free in json.loads(response[2])['rooms']
+        if room_company in (None, company) for bed_id, _ in free
+    ]
+    if not beds:
+        station.recorder.event('reservas sem cama livre')
+        return
+
+    await station.think(4)  # digitando nome, CPF e telefone
+    response = await station.call('criar reserva', 'POST', '/reserva/criar/', {
+        'name': f'Hospede Carga {station.rng.randrange(10 ** 6)}', 'company': company,
+        'cpf': _cpf(station.rng), 'phone': '', 'bed_id': station.rng.choice(beds), 'is_pre': 'on',
+    }, htmx=True)
+    if response and response[0] == 204:
+        station.recorder.event('reservas criadas')
+        await station.call('dashboard (página)', 'GET', '/')  # HX-Refresh
+    elif response and response[0] == 200:
+        station.recorder.event('reservas recusadas (cama ocupada no meio tempo)')
+
+
+async def _checkout_burst(station):
+    """ Saída de uma turma: vários check-outs seguidos. """
+    pool = station.data['active']
+    for _ in range(station.rng.randint(3, 6)):
+        if not pool:
+            station.recorder.event('check-outs sem hóspede disponível')
+            return
+        await station.call('checkout', 'POST', f'/reserva/{pool.pop()}/checkout/', {}, htmx=True)
+        await station.think(0.5)
+
+
+async def reception(station):
+    await station.call('dashboard (página)', 'GET', '/')
+    while station.running:
+        roll = station.rng.random()
+        if roll < 0.5:
+            await station.call('dashboard (atualizar)', 'GET', '/?filter=ALL', htmx=True)
+        elif roll < 0.7:
+            await station.call('dashboard (filtro)', 'GET', f'/?filter={station.rng.choice(FILTERS)}', htmx=True)
+        elif roll < 0.85:
+            await _new_reservation(station)
+        elif roll < 0.95:
+            await _checkout_burst(station)
+        else:
+            await station.call('dashboard (página)', 'GET', '/')
+        await station.think(3)
+
+
+async def meal_counter(station):
+    cpfs = station.data['cpfs']
+    while station.running:
+        # 5% voltam na fila (ticket repetido: nada é gravado nem impresso)
+        cpf = station.rng.choice(cpfs) if cpfs and station.rng.random() < 0.05 else _cpf(station.rng)
+        cpfs.append(cpf)
+        response = await station.call('refeição (emitir)', 'POST', '/refeicoes/', {
+            'meal_type': 'ALMOCO', 'name': f'Comensal {cpf[-4:]}', 'cpf': cpf,
+            'company': station.rng.choice(station.data['companies']),
+        }, htmx=True)
+        if response and response[0] == 200:
+            body = response[2].decode('utf-8', 'replace')
+            if 'Impressão OK' in body:
+                station.recorder.event('tickets impressos')
+            elif 'Erro Impressão' in body:
+                station.recorder.event('tickets com erro de impressão')
+            elif 'já emitido' in body:
+                station.recorder.event('tickets repetidos barrados')
+        await station.think(3)
+
+
+async def kitchen_screen(station):
+    version = ''
+    while station.running:
+        response = await station.call('quadro da cozinha', 'GET', f'/cozinha/painel/?v={version}', htmx=True)
+        if response and response[0] == 200:
+            match = re.search(rb'\?v=([^"&]+)', response[2])
+            version = match.group(1).decode() if match else ''
+        await station.wait(5)
+
+
+async def _export(station, path):
+    """ Pede a exportação, acompanha o andamento (como a tela, a cada 1 s) e baixa o arquivo. """
+    started = time.perf_counter()
+    response = await station.call('exportação (pedido)', 'GET', path)
+    if response is None:
+        return
+    status, headers, body = response
+    if status == 200:
+        csv = headers.get('content-type', '').startswith('text/csv')
+        station.recorder.event('exportações prontas na hora' if csv else 'exportações recusadas (limite por usuário)')
+        return
+    match = re.search(r'/relatorios/arquivos/(\d+)/', headers.get('location', ''))
+    if not match:
+        return
+
+    pk = match.group(1)
+    while station.running:
+        await station.wait(1)
+        response = await station.call('exportação (andamento)', 'GET', f'/relatorios/arquivos/{pk}/', htmx=True)
+        if response is None:
+            return
+        if b'/baixar/' in response[2]:
+            await station.call('exportação (download)', 'GET', f'/relatorios/arquivos/{pk}/baixar/')
+            station.recorder.add('* exportação (até o arquivo)', (time.perf_counter() - started) * 1000)
+            return
+        if b'alert-danger' in response[2]:
+            station.recorder.add('* exportação (até o arquivo)', error=True)
+            return
+    station.recorder.event('exportações não concluídas até o fim da etapa')
+
+
+async def finance(station):
+    start, end = station.data['period']
+    while station.running:
+        await station.call('fechamento (tela)', 'GET', f'/relatorios/fechamento/?start_date={start}&end_date={end}')
+        await station.think(5)
+        if station.rng.random() < 0.5:
+            await _export(station, f'/relatorios/refeicoes/?export=csv&start_date={start}&end_date={end}')
+        else:
+            await _export(station, f'/relatorios/fechamento/?start_date={start}&end_date={end}&export=csv')
+        await station.think(10)
+
+
+# nome: (roteiro, descrição)
+PROFILES = {
+    'recepcao': (reception, 'PC da recepção: atualiza o Mapa, troca filtros, faz reservas e check-outs'),
+    'refeitorio': (meal_counter, 'balcão do refeitório no pico do almoço (ticket impresso)'),
+    'cozinha': (kitchen_screen, 'tela do quadro da cozinha (a cada 5 s)'),
+    'financeiro': (finance, 'fechamento na tela e exportações (fila de relatórios)'),
+}
+
+
+def parse_mix(text):
+    """ 'recepcao=4,refeitorio=2' -> {'recepcao': 4, 'refeitorio': 2} """
+    mix = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, count = item.partition('=')
+        if name not in PROFILES:
+            raise ValueError(f"Perfil '{name}' não existe (use {', '.join(PROFILES)}).")
+        mix[name] = int(count or 1)
+    return mix
+
+
+async def run_stage(port, headers, mix, seconds, data, pace=1.0, host='127.0.0.1'):
+    """ Roda os postos de 'mix' (perfil: quantidade) por 'seconds' segundos. Retorna o Recorder. """
+    recorder = Recorder()
+    deadline = time.monotonic() + seconds
+    clients = []
+
+    async def start(profile, station):
+        await asyncio.sleep(station.rng.random())  # os postos não começam todos no mesmo instante
+        await PROFILES[profile][0](station)
+
+    tasks = []
+    for profile, count in mix.items():
+        for _ in range(count):
+            client = HttpClient(port, headers, host)
+            clients.append(client)
+            tasks.append(start(profile, Station(len(tasks), client, recorder, data, deadline, pace)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    recorder.elapsed = time.perf_counter() - started
+    for client in clients:
+        await client.close()
+    return recorder
@@ -0,0 +1,65 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.backup import BackupError, create_snapshot, list_snapshots
+
+
+def _mb(size):
+    return f'{size / 1024 / 1024:,.1f} MB'
+
+
+class Command(BaseCommand):
+    help = (
+        'Cópia do banco com o sistema no ar (backup online do SQLite em pequenos passos), comprimida e '
+        'conferida, em TYBIS_BACKUP_DIR. Agende (Agendador de Tarefas/cron) ou deixe rodando com --intervalo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Guarda só os blocos que mudaram desde a última cópia completa')
+        parser.add_argument('--intervalo', type=float, default=0,
+                            help='Repete a cópia a cada N horas (0 = copia uma vez e encerra)')
+        parser.add_argument('--completa-a-cada', type=float, default=24,
+                            help='Com --incremental: faz uma completa quando a última tiver mais de N horas')
+        parser.add_argument('--listar', action='store_true', help='Só lista as cópias existentes')
+
+    def _list(self):
+        snapshots = list_snapshots()
+        if not snapshots:
+            self.stdout.write('Nenhuma cópia.')
+        for manifest in snapshots:
+            kind = f'incremental de {manifest["base"]}' if manifest['base'] else 'completa'
+            self.stdout.write(
+                f'{manifest["name"]}  {_mb(manifest["size"]):>12} -> {_mb(manifest["file_size"]):>12}  {kind}'
+            )
+
+    def _incremental_due(self, every):
+        """ Incremental, a não ser que a última completa seja mais velha que 'every'. """
+        fulls = [manifest for manifest in list_snapshots() if manifest['kind'] == 'full']
+        return bool(fulls) and timezone.now() - datetime.fromisoformat(fulls[-1]['created']) < every
+
+    def _backup(self, incremental):
+        try:
+            manifest = create_snapshot(incremental=incremental)
+        except BackupError as e:
+            raise CommandError(str(e))
+        kind = f'incremental (base {manifest["base"]})' if manifest['base'] else 'completa'
+        self.stdout.write(self.style.SUCCESS(
+            f'{timezone.localtime():%d/%m/%Y %H:%M} - {manifest["name"]} {kind}: '
+            f'{_mb(manifest["size"])} -> {_mb(manifest["file_size"])} em {manifest["seconds"]:.1f}s '
+            f'(sha256 {manifest["sha256"][:12]})'
+        ))
+
+    def handle(self, *args, **options):
+        if options['listar']:
+            self._list()
+            return
+
+        every = timedelta(hours=options['completa_a_cada'])
+        self._backup(options['incremental'] and self._incremental_due(every))
+        while options['intervalo'] > 0:
+            time.sleep(options['intervalo'] * 3600)
+            self._backup(options['incremental'] and self._incremental_due(every))
@@ -0,0 +1,176 @@
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.utils import timezone
+
+from core.backup import copy_database, create_snapshot, database_path, verify_snapshot
+
+# Lastro: 1 MB por comando (16 blobs de 64 KB, 1/4 aleatório), comprime como um banco de verdade
+BALLAST_SQL = (
+    'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 16) '
+    'INSERT INTO benchmark_lastro (dados) SELECT randomblob(16384) || zeroblob(49152) FROM n'
+)
+
+
+def _summary(timings):
+    if not timings:
+        return 'nenhuma'
+    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+    return f'{len(timings):5} | mediana {statistics.median(timings):7.1f} ms | p95 {p95:7.1f} ms | máx {max(timings):7.1f} ms'
+
+
+def _p95(timings):
+    return statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else (timings or [0])[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o Dashboard e as gravações enquanto o backup roda, em uma cópia do banco (use --lastro '
+        'para simular um banco de vários GB). Compara sem backup, backup em passos e backup de uma vez.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lastro', type=int, default=0, help='MB acrescentados à cópia de teste')
+        parser.add_argument('--clientes', type=int, default=4, help='Telas pedindo o Dashboard ao mesmo tempo')
+        parser.add_argument('--segundos', type=float, default=10, help='Duração da rodada sem backup')
+        parser.add_argument('--usuario', help='Usuário das telas (padrão: primeiro superusuário)')
+
+    # --------------------------------------------------------------------------
+    # Preparação
+    # --------------------------------------------------------------------------
+
+    def _prepare(self, source, copy, ballast_mb):
+        self.stdout.write(f'Copiando {source} para o teste...')
+        copy_database(source, copy, step_pages=-1)
+        database = sqlite3.connect(copy)
+        database.execute('PRAGMA journal_mode=WAL')
+        if ballast_mb:
+            self.stdout.write(f'Acrescentando {ballast_mb} MB de lastro...')
+            database.execute('CREATE TABLE benchmark_lastro (id INTEGER PRIMARY KEY, dados BLOB)')
+            for number in range(ballast_mb):
+                database.execute(BALLAST_SQL)
+                if number % 64 == 63:
+                    database.commit()
+            database.commit()
+            database.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        database.close()
+        self.stdout.write(f'Banco de teste: {copy.stat().st_size / 1024 / 1024:,.0f} MB')
+
+    # --------------------------------------------------------------------------
+    # Carga
+    # --------------------------------------------------------------------------
+
+    def _load(self, user, clients, work):
+        """
+        Telas pedindo o Dashboard sem pausa e uma gravação (sessão) a cada 50 ms
+        enquanto work() roda. Retorna (latências do Dashboard, das gravações, erros).
+        """
+        stop = threading.Event()
+        pages, writes, errors = [], [], []
+
+        def screen():
+            client = Client()
+            client.force_login(user)
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    status = client.get('/').status_code
+                    if status == 200:
+                        pages.append((time.perf_counter() - start) * 1000)
+                    else:
+                        errors.append(status)
+            finally:
+                connection.close()
+
+        def writer():
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    with transaction.atomic():
+                        session = Session.objects.create(
+                            session_key=uuid.uuid4().hex, session_data='',
+                            expire_date=timezone.now() + timedelta(minutes=1),
+                        )
+                        session.delete()
+                    writes.append((time.perf_counter() - start) * 1000)
+                    stop.wait(0.05)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=screen) for _ in range(clients)] + [threading.Thread(target=writer)]
+        for thread in threads:
+            thread.start()
+        try:
+            result = work()
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return pages, writes, errors, result
+
+    def _round(self, title, user, clients, work):
+        pages, writes, errors, result = self._load(user, clients, work)
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(f'  Dashboard  {_summary(pages)}' + (f' | erros {len(errors)}' if errors else ''))
+        self.stdout.write(f'  Gravações  {_summary(writes)}')
+        return pages, result
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(is_active=True)
+        username = options['usuario']
+        user = users.filter(username=username).first() if username else users.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('Usuário não encontrado (use --usuario).')
+
+        source = database_path()
+        budget = settings.TYBIS_BACKUP_BUDGET_MS
+        database = connections['default'].settings_dict
+        with tempfile.TemporaryDirectory(prefix='tybis-benchmark-', dir=source.parent) as scratch:
+            scratch = Path(scratch)
+            self._prepare(source, scratch / 'db.sqlite3', options['lastro'])
+            connections.close_all()
+            database['NAME'] = str(scratch / 'db.sqlite3')
+            try:
+                clients = options['clientes']
+                self.stdout.write(f'{clients} telas no Dashboard + 1 gravação a cada 50 ms | orçamento {budget} ms')
+                baseline, _ = self._round(
+                    'Sem backup:', user, clients, lambda: time.sleep(options['segundos'])
+                )
+                stepped, manifest = self._round(
+                    'Backup em passos (backup_banco):', user, clients,
+                    lambda: create_snapshot(directory=scratch / 'copias'),
+                )
+                self.stdout.write(
+                    f'  Cópia {manifest["size"] / 1024 / 1024:,.0f} MB -> {manifest["file_size"] / 1024 / 1024:,.0f} MB '
+                    f'em {manifest["seconds"]:.1f}s'
+                )
+                _, burst = self._round(
+                    'Backup de uma vez (sem passos nem pausas):', user, clients,
+                    lambda: create_snapshot(directory=scratch / 'copias', step_pages=-1),
+                )
+                self.stdout.write(f'  Cópia em {burst["seconds"]:.1f}s')
+
+                verify_snapshot(manifest['name'], directory=scratch / 'copias')
+                self.stdout.write(f'Restauração de {manifest["name"]} conferida (SHA-256 e integrity_check).')
+            finally:
+                connections.close_all()
+                database['NAME'] = str(source)
+
+        extra = _p95(stepped) - _p95(baseline)
+        message = f'p95 do Dashboard durante o backup: +{max(extra, 0):.1f} ms (orçamento {budget} ms).'
+        if extra <= budget:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(self.style.WARNING(f'{message} Diminua TYBIS_BACKUP_BUDGET_MS para o backup descansar mais.'))
@@ -0,0 +1,275 @@
+import asyncio
+import os
+import re
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from core.backup import copy_database, database_path
+from core.loadtest import PROFILES, ServerError, login_headers, parse_mix, percentile, run_stage, start_process
+from core.models import Company, Reservation
+
+# Banco, cache e arquivos de relatório da cópia: nada do teste toca o sistema em uso
+TEST_SETTINGS = '''from {module} import *  # noqa
+DATABASES['default']['NAME'] = {database!r}
+DATABASES['reporting']['NAME'] = {reporting!r}
+CACHES['default'] = {{
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': {cache!r}, 'OPTIONS': {{'MAX_ENTRIES': 5000}},
+}}
+TYBIS_JOBS_DIR = {jobs!r}
+TYBIS_PRINTER = {printer!r}
+'''
+
+# O mesmo que o run_waitress.py faz, com o log de avisos (fila do Waitress, erros 500) em arquivo
+WAITRESS = '''import logging, sys
+logging.basicConfig(level=logging.WARNING, stream=sys.stdout, format='%(name)s: %(message)s')
+from waitress import serve
+from setup.wsgi import application
+from core import jobs, reporting
+jobs.start()
+reporting.start()
+serve(application, host='127.0.0.1', port={port}, threads={threads})
+'''
+
+QUEUE_DEPTH = re.compile(r'Task queue depth is (\d+)')
+SATURATION_QUEUED = 0.10  # fração das requisições que esperaram na fila
+SATURATION_P95 = 2.0  # p95 em relação à primeira etapa
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga: postos da recepção, do refeitório, da cozinha e do financeiro ao mesmo tempo, em '
+        'etapas cada vez maiores, contra o Waitress (como no run_waitress.py) sobre uma cópia do banco e com '
+        'a impressora simulada. Mostra vazão, p50/p95/p99 por endpoint, erros, travas do SQLite e a partir '
+        'de quantos postos as requisições começam a esperar por uma thread.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--postos', default='recepcao=4,refeitorio=2,cozinha=1,financeiro=1',
+                            help=f'Postos por perfil na etapa 1 ({", ".join(PROFILES)})')
+        parser.add_argument('--etapas', default='1,2,4,8',
+                            help='Multiplicador dos postos em cada etapa, separados por vírgula')
+        parser.add_argument('--segundos', type=float, default=30, help='Duração de cada etapa')
+        parser.add_argument('--ritmo', type=float, default=1.0,
+                            help='Multiplica as pausas entre as ações (0 = sem pausa, só estresse)')
+        parser.add_argument('--threads', type=int, default=4, help='Threads do Waitress (run_waitress.py usa 4)')
+        parser.add_argument('--porta', type=int, default=8702, help='Porta local do servidor de teste')
+        parser.add_argument('--usuario', help='Usuário dos postos (padrão: primeiro superusuário)')
+        parser.add_argument('--url', help='Servidor já rodando (ex.: http://127.0.0.1:8000 do run_waitress.py)')
+        parser.add_argument('--confirmar', action='store_true',
+                            help='Com --url: aceita gravar no banco desse servidor (check-outs, reservas e tickets)')
+
+    # --------------------------------------------------------------------------
+    # Preparação
+    # --------------------------------------------------------------------------
+
+    def _user(self, username):
+        users = get_user_model().objects.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('Usuário não encontrado (use --usuario).')
+        return user
+
+    def _data(self):
+        """ O que os roteiros sorteiam: empresas, hóspedes para check-out e o mês anterior. """
+        companies = list(Company.objects.values_list('pk', flat=True))
+        if not companies:
+            raise CommandError('Nenhuma empresa cadastrada (rode popular_hotel em um banco de teste).')
+        first_day = timezone.localdate().replace(day=1)
+        last_month = first_day - timedelta(days=1)
+        return {
+            'companies': companies,
+            'active': list(Reservation.objects.filter(status='ACTIVE').order_by('?').values_list('pk', flat=True)),
+            'cpfs': [],
+            'period': (last_month.replace(day=1).isoformat(), last_month.isoformat()),
+        }
+
+    def _start_test_server(self, scratch, options):
+        """ Impressora simulada + Waitress sobre uma cópia do banco. Retorna (processos, log do servidor, log da impressora). """
+        if not (settings.STATIC_ROOT / 'staticfiles.json').exists():
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+        self.stdout.write('Copiando o banco para o teste...')
+        copy_database(database_path(), scratch / 'db.sqlite3', step_pages=-1)
+        printer_port = options['porta'] + 1
+        (scratch / 'carga_settings.py').write_text(TEST_SETTINGS.format(
+            module=settings.SETTINGS_MODULE, database=str(scratch / 'db.sqlite3'), cache=str(scratch / 'cache'),
+            reporting=str(scratch / ('relatorios.sqlite3' if settings.TYBIS_REPORTING_LAG else 'db.sqlite3')),
+            jobs=str(scratch / 'jobs'), printer=f'tcp://127.0.0.1:{printer_port}',
+        ))
+        env = {
+            **os.environ, 'DJANGO_SETTINGS_MODULE': 'carga_settings', 'TYBIS_DEBUG': '0', 'PYTHONUNBUFFERED': '1',
+            'PYTHONPATH': os.pathsep.join(filter(None, [str(scratch), str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+        }
+
+        processes = []
+        printer_log = open(scratch / 'impressora.log', 'w+b')
+        server_log = open(scratch / 'servidor.log', 'w+b')
+        try:
+            processes.append(start_process(
+                'Impressora simulada',
+                [sys.executable, 'manage.py', 'simular_impressora', '--porta', str(printer_port)],
+                printer_port, env, printer_log,
+            ))
+            processes.append(start_process(
+                'Waitress', [sys.executable, '-c', WAITRESS.format(port=options['porta'], threads=options['threads'])],
+                options['porta'], env, server_log,
+            ))
+        except ServerError as e:
+            for process in processes:
+                process.terminate()
+            raise CommandError(str(e))
+
+        # Os postos entram com sessões gravadas na cópia
+        connections.close_all()
+        connections['default'].settings_dict['NAME'] = str(scratch / 'db.sqlite3')
+        return processes, server_log, printer_log
+
+    # --------------------------------------------------------------------------
+    # Etapas
+    # --------------------------------------------------------------------------
+
+    def _server_warnings(self, log, offset):
+        """ Avisos do servidor desde 'offset': (requisições que esperaram, maior fila, travas, erros 500, novo offset). """
+        if log is None:
+            return None, None, None, None, offset
+        log.seek(offset)
+        content = log.read()
+        text = content.decode('utf-8', 'replace')
+        depths = [int(depth) for depth in QUEUE_DEPTH.findall(text)]
+        return (
+            len(depths), max(depths, default=0), text.count('database is locked'),
+            text.count('Internal Server Error'), offset + len(content),
+        )
+
+    def _report(self, recorder, queued, max_depth, locks, server_errors):
+        self.stdout.write(f'  {"endpoint":<34} {"req":>6} {"req/s":>7} {"p50":>8} {"p95":>8} {"p99":>8} {"erros":>6}')
+        for label in recorder.labels:
+            timings = recorder.timings[label]
+            rate = '' if label.startswith('*') else f'{len(timings) / recorder.elapsed:.1f}'
+            self.stdout.write(
+                f'  {label:<34} {len(timings):>6} {rate:>7} {percentile(timings, 50):>6.0f}ms '
+                f'{percentile(timings, 95):>6.0f}ms {percentile(timings, 99):>6.0f}ms {recorder.errors[label]:>6}'
+            )
+
+        timings = recorder.all_timings()
+        total = recorder.requests + recorder.failures
+        self.stdout.write(self.style.MIGRATE_LABEL(
+            f'  {"Total":<34} {recorder.requests:>6} {recorder.requests / recorder.elapsed:>7.1f} '
+            f'{percentile(timings, 50):>6.0f}ms {percentile(timings, 95):>6.0f}ms {percentile(timings, 99):>6.0f}ms '
+            f'{recorder.failures:>6} ({100 * recorder.failures / max(total, 1):.1f}%)'
+        ))
+        if queued is not None:
+            self.stdout.write(
+                f'  Fila do Waitress: {queued} requisições esperaram por uma thread (até {max_depth} na fila) | '
+                f'travas do SQLite: {locks} | erros 500: {server_errors}'
+            )
+        if recorder.events:
+            self.stdout.write('  ' + ' | '.join(f'{name}: {count}' for name, count in sorted(recorder.events.items())))
+
+    def _run(self, port, host, headers, mix, stages, options, data, server_log):
+        summary, offset = [], 0
+        if server_log is not None:
+            offset = server_log.seek(0, 2)  # ignora a subida do servidor
+        for number, factor in enumerate(stages, 1):
+            stage_mix = {profile: count * factor for profile, count in mix.items()}
+            stations = sum(stage_mix.values())
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'Etapa {number}/{len(stages)}: {stations} postos '
+                f'({", ".join(f"{profile} {count}" for profile, count in stage_mix.items())}) | {options["segundos"]:.0f}s'
+            ))
+            recorder = asyncio.run(run_stage(
+                port, headers, stage_mix, options['segundos'], data, options['ritmo'], host,
+            ))
+            queued, max_depth, locks, server_errors, offset = self._server_warnings(server_log, offset)
+            self._report(recorder, queued, max_depth, locks, server_errors)
+            summary.append((stations, recorder, queued))
+        return summary
+
+    def _saturation(self, summary):
+        self.stdout.write(self.style.MIGRATE_HEADING('Resumo:'))
+        self.stdout.write(f'  {"postos":>6} {"req/s":>7} {"p95":>8} {"p99":>8} {"erros":>6} {"na fila":>8}')
+        baseline = None
+        saturated = None
+        for stations, recorder, queued in summary:
+            timings = recorder.all_timings()
+            p95 = percentile(timings, 95)
+            baseline = baseline or p95
+            queued_share = (queued or 0) / max(recorder.requests, 1)
+            self.stdout.write(
+                f'  {stations:>6} {recorder.requests / recorder.elapsed:>7.1f} {p95:>6.0f}ms '
+                f'{percentile(timings, 99):>6.0f}ms {recorder.failures:>6} '
+                f'{"" if queued is None else f"{100 * queued_share:.0f}%":>8}'
+            )
+            if saturated is None and (queued_share >= SATURATION_QUEUED or p95 >= SATURATION_P95 * baseline):
+                saturated = (stations, queued_share, p95 / baseline)
+
+        if saturated is None:
+            self.stdout.write(self.style.SUCCESS(
+                f'Sem saturação até {summary[-1][0]} postos: aumente --etapas para achar o limite.'
+            ))
+        else:
+            stations, queued_share, growth = saturated
+            growth = f' e o p95 ficou {growth:.1f}x o da primeira etapa' if stations != summary[0][0] else ''
+            self.stdout.write(self.style.WARNING(
+                f'Saturação a partir de {stations} postos: {100 * queued_share:.0f}% das requisições esperaram '
+                f'por uma thread{growth}.'
+            ))
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['postos'])
+            stages = [int(value) for value in options['etapas'].split(',') if value.strip()]
+        except ValueError as e:
+            raise CommandError(str(e))
+        user = self._user(options['usuario'])
+
+        if options['url']:
+            if not options['confirmar']:
+                raise CommandError(
+                    'Com --url o teste grava no banco desse servidor (check-outs, reservas e tickets). '
+                    'Use um banco de teste e repita com --confirmar.'
+                )
+            url = urlsplit(options['url'])
+            data = self._data()
+            summary = self._run(
+                url.port or 80, url.hostname, login_headers(user, url.hostname), mix, stages, options, data, None,
+            )
+            self._saturation(summary)
+            return
+
+        source = database_path()
+        database = connections['default'].settings_dict
+        with tempfile.TemporaryDirectory(prefix='tybis-carga-', dir=source.parent) as scratch:
+            processes, server_log, printer_log = self._start_test_server(Path(scratch), options)
+            try:
+                data = self._data()
+                self.stdout.write(
+                    f'Waitress com {options["threads"]} threads na porta {options["porta"]} | '
+                    f'{len(data["active"])} hóspedes para check-out | ritmo {options["ritmo"]}'
+                )
+                summary = self._run(
+                    options['porta'], '127.0.0.1', login_headers(user), mix, stages, options, data, server_log,
+                )
+            finally:
+                for process in processes:
+                    process.terminate()
+                    process.wait(10)
+                connections.close_all()
+                database['NAME'] = str(source)
+                printer_log.seek(0)
+                tickets = printer_log.read().count(b'--- ticket')
+                server_log.close()
+                printer_log.close()
+            self.stdout.write(f'Impressora simulada: {tickets} tickets recebidos.')
+            self._saturation(summary)
@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from core.caching import get_room_layout
+from core.views import _active_reservations_by_bed, _get_room_item
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo de renderização da grade do Dashboard com e sem o cache de fragmentos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rodadas', type=int, default=20, help='Quantidade de renderizações por cenário')
+
+    def _measure(self, rounds, clear_before_each):
+        fragments = caches['fragments']
+        timings = []
+        for _ in range(rounds):
+            if clear_before_each:
+                fragments.clear()
+            inicio = time.perf_counter()
+            reservations_by_bed = _active_reservations_by_bed()
+            data = [
+                _get_room_item(room, room.layout_beds, reservations_by_bed)
+                for room in get_room_layout()
+            ]
+            render_to_string('core/partials/dashboard_grid.html', {'dashboard_data': data})
+            timings.append((time.perf_counter() - inicio) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        rounds = options['rodadas']
+        layout = get_room_layout()
+        total_beds = sum(len(room.layout_beds) for room in layout)
+        self.stdout.write(f'Quartos: {len(layout)} | Camas: {total_beds} | Rodadas: {rounds}')
+
+        frio = self._measure(rounds, clear_before_each=True)
+        self._measure(1, clear_before_each=False)  # aquece o cache
+        quente = self._measure(rounds, clear_before_each=False)
+
+        for nome, timings in (('Sem cache (frio)', frio), ('Com cache (quente)', quente)):
+            self.stdout.write(
+                f'{nome:<20} mediana {statistics.median(timings):7.1f} ms | '
+                f'mín {min(timings):7.1f} ms | máx {max(timings):7.1f} ms'
+            )
+
+        ganho = statistics.median(frio) / max(statistics.median(quente), 0.001)
+        self.stdout.write(self.style.SUCCESS(f'Renderização {ganho:.1f}x mais rápida com o cache de fragmentos.'))
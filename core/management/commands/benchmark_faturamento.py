@@ -0,0 +1,99 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.billing_calc import (
+    MealColumns, VECTORIZED, closing_rows_loop, closing_rows_vectorized, meals_by_cpf
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o laço por reserva com o núcleo vetorizado (NumPy) do fechamento, '
+        'com dados sintéticos em memória (não usa o banco).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservas', type=int, default=100_000)
+        parser.add_argument('--refeicoes', type=int, default=10_000_000)
+        parser.add_argument('--mes', default='2025-01', help='Período do fechamento (AAAA-MM)')
+        parser.add_argument('--semente', type=int, default=1)
+        parser.add_argument('--sem-laco', action='store_true', help='Mede só o núcleo vetorizado')
+
+    def _synthetic_data(self, total_reservations, total_meals, filter_start, filter_end, seed):
+        rng = random.Random(seed)
+        tz = timezone.get_current_timezone()
+        first = filter_start - timedelta(days=60)
+        span = (filter_end - first).days + 30
+
+        reservations = []
+        for i in range(total_reservations):
+            start = first + timedelta(days=rng.randrange(span))
+            end = None if i % 5 == 0 else start + timedelta(days=rng.randrange(45))
+            cpf = '' if i % 50 == 0 else f'{i % (total_reservations * 9 // 10 or 1):011d}'
+            stays = [(start, rng.choice(('AC', 'VENT')))]
+            if i % 10 == 0:  # troca de quarto no meio da estadia
+                stays.append((start + timedelta(days=rng.randrange(1, 20)), 'AC' if stays[0][1] == 'VENT' else 'VENT'))
+            reservations.append((cpf, f'hospede {i}', f'empresa {i % 40}', i % 40, start, end, stays))
+
+        # Tarifas: metade das empresas com reajuste no meio do mês, uma sem tarifa
+        middle = filter_start + timedelta(days=14)
+        rates = {}
+        for company_id in range(1, 40):
+            rates[company_id] = [(date(2000, 1, 1), None, 12000, 9000, 2500, 2200)]
+            if company_id % 2:
+                rates[company_id] = [
+                    (date(2000, 1, 1), middle - timedelta(days=1), 12000, 9000, 2500, 2200),
+                    (middle, None, 13000, 9500, 2700, 2400),
+                ]
+
+        cpfs = [res[0] for res in reservations if res[0]] + ['99999999999']
+        day_start = datetime.combine(filter_start - timedelta(days=3), datetime.min.time(), tz).timestamp()
+        seconds = ((filter_end - filter_start).days + 7) * 86400
+        meals = MealColumns(
+            [rng.choice(cpfs) for _ in range(total_meals)],
+            [day_start + rng.random() * seconds for _ in range(total_meals)],
+            [rng.choice(('ALMOCO', 'JANTA')) for _ in range(total_meals)],
+        )
+        return reservations, meals, rates, tz
+
+    def _timed(self, label, func):
+        inicio = time.perf_counter()
+        result = func()
+        self.stdout.write(f'{label:<32} {time.perf_counter() - inicio:8.2f} s')
+        return result
+
+    def handle(self, *args, **options):
+        if not VECTORIZED:
+            raise CommandError('NumPy não instalado. Use: pip install numpy')
+
+        year, month = map(int, options['mes'].split('-'))
+        filter_start = date(year, month, 1)
+        filter_end = (filter_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+        self.stdout.write(
+            f"Gerando {options['reservas']} reservas e {options['refeicoes']} refeições "
+            f"({filter_start:%d/%m/%Y} a {filter_end:%d/%m/%Y})..."
+        )
+        reservations, meals, rates, tz = self._synthetic_data(
+            options['reservas'], options['refeicoes'], filter_start, filter_end, options['semente']
+        )
+
+        vectorized = self._timed(
+            'Vetorizado (NumPy)',
+            lambda: closing_rows_vectorized(reservations, meals, tz, filter_start, filter_end, rates)
+        )
+        if options['sem_laco']:
+            return
+
+        grouped = self._timed('Laço: agrupar refeições', lambda: meals_by_cpf(meals, tz))
+        loop = self._timed(
+            'Laço: reservas', lambda: closing_rows_loop(reservations, grouped, filter_start, filter_end, rates)
+        )
+
+        if loop != vectorized:
+            raise CommandError('Resultados diferentes entre o laço e o núcleo vetorizado!')
+        self.stdout.write(self.style.SUCCESS(f'{len(loop)} linhas idênticas nos dois cálculos.'))
@@ -0,0 +1,165 @@
+import asyncio
+import importlib.util
+import os
+import statistics
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.kitchen import version as board_version
+from core.loadtest import CLIENT_ERRORS, HTMX, HttpClient, ServerError, login_headers, start_process
+from core.models import Company
+
+# Servidores comparados: (módulo, argumentos, variáveis de ambiente extras)
+SERVERS = {
+    'waitress': ('waitress', ['--host=127.0.0.1', '--port={port}', '--threads=4', 'setup.wsgi:application'], {}),
+    'uvicorn': ('uvicorn', [
+        'setup.asgi:application', '--host', '127.0.0.1', '--port', '{port}',
+        '--http', 'h11', '--loop', 'asyncio', '--lifespan', 'off', '--log-level', 'warning',
+    ], {'TYBIS_ASGI': '1'}),
+}
+
+class Command(BaseCommand):
+    help = (
+        'Compara Waitress e Uvicorn (modo ASGI) com vários clientes simultâneos pedindo '
+        'os fragmentos HTMX, e quantas telas do quadro ao vivo o Uvicorn mantém abertas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', default='10,50,200',
+                            help='Clientes simultâneos por rodada, separados por vírgula')
+        parser.add_argument('--segundos', type=float, default=10, help='Duração de cada rodada')
+        parser.add_argument('--telas', type=int, default=200,
+                            help='Telas do quadro da cozinha conectadas ao vivo (só Uvicorn)')
+        parser.add_argument('--servidor', choices=['ambos', *SERVERS], default='ambos')
+        parser.add_argument('--porta', type=int, default=8701, help='Porta local usada pelos servidores')
+        parser.add_argument('--usuario', help='Usuário das requisições (padrão: primeiro superusuário)')
+
+    # --------------------------------------------------------------------------
+    # Preparação
+    # --------------------------------------------------------------------------
+
+    def _session_headers(self, username):
+        users = get_user_model().objects.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('Usuário não encontrado (use --usuario).')
+        return login_headers(user) + HTMX
+
+    def _start(self, name, port):
+        module, args, extra_env = SERVERS[name]
+        try:
+            return start_process(
+                name, [sys.executable, '-m', module, *(arg.format(port=port) for arg in args)], port,
+                env={**os.environ, **extra_env},
+            )
+        except ServerError as e:
+            raise CommandError(str(e))
+
+    # --------------------------------------------------------------------------
+    # Rodadas
+    # --------------------------------------------------------------------------
+
+    async def _load(self, port, headers, paths, clients, seconds):
+        """ 'clients' telas pedindo fragmentos sem pausa. Retorna (latências em ms, erros). """
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + seconds
+
+        async def screen(number):
+            nonlocal errors
+            client = HttpClient(port, headers)
+            while time.perf_counter() < deadline:
+                path = paths[number % len(paths)]
+                number += 1
+                start = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(client.get(path), 30)
+                except CLIENT_ERRORS:
+                    errors += 1
+                    await client.close()
+                    continue
+                if status >= 400:
+                    errors += 1
+                else:
+                    latencies.append((time.perf_counter() - start) * 1000)
+            await client.close()
+
+        await asyncio.gather(*(screen(number) for number in range(clients)))
+        return latencies, errors
+
+    async def _open_streams(self, port, headers, total):
+        """ Abre 'total' conexões no fluxo ao vivo do quadro. Retorna (conexões, quantas responderam 200). """
+        path = f'/cozinha/eventos/?v={board_version()}'
+        streams, accepted = [], 0
+        for _ in range(total):
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            except OSError:
+                break
+            writer.write(f'GET {path} HTTP/1.1\r\n{headers}\r\n'.encode())
+            streams.append((reader, writer))
+        for reader, _ in streams:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            except CLIENT_ERRORS:
+                continue
+            accepted += head.startswith(b'HTTP/1.1 200')
+        return streams, accepted
+
+    async def _run(self, name, port, headers, paths, rounds, seconds, screens):
+        client = HttpClient(port, headers)
+        for path in paths:  # aquece caches e templates do processo
+            await client.get(path)
+        await client.close()
+
+        streams = []
+        if name == 'uvicorn' and screens:
+            streams, accepted = await self._open_streams(port, headers, screens)
+            self.stdout.write(f'  Quadro ao vivo: {accepted}/{screens} telas conectadas durante as rodadas')
+
+        for clients in rounds:
+            latencies, errors = await self._load(port, headers, paths, clients, seconds)
+            if latencies:
+                p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+                self.stdout.write(
+                    f'  {clients:>4} clientes | {len(latencies) / seconds:7.1f} req/s | '
+                    f'mediana {statistics.median(latencies):7.1f} ms | p95 {p95:7.1f} ms | erros {errors}'
+                )
+            else:
+                self.stdout.write(self.style.ERROR(f'  {clients:>4} clientes | nenhuma resposta | erros {errors}'))
+
+        if streams:
+            alive = sum(1 for reader, _ in streams if not reader.at_eof())
+            self.stdout.write(f'  Quadro ao vivo: {alive} telas ainda conectadas ao final')
+            for _, writer in streams:
+                writer.close()
+
+    def handle(self, *args, **options):
+        rounds = [int(value) for value in options['clientes'].split(',') if value.strip()]
+        names = list(SERVERS) if options['servidor'] == 'ambos' else [options['servidor']]
+        headers = self._session_headers(options['usuario'])
+        company = Company.objects.order_by('pk').values_list('pk', flat=True).first() or ''
+        paths = [
+            '/?filter=OCCUPIED',
+            f'/htmx/camas-disponiveis/?company={company}',
+            f'/cozinha/painel/?v={board_version()}',
+        ]
+        self.stdout.write(f'Fragmentos: {", ".join(paths)} | {options["segundos"]:.0f}s por rodada')
+
+        for name in names:
+            if importlib.util.find_spec(SERVERS[name][0]) is None:
+                self.stdout.write(self.style.WARNING(f'{name}: não instalado, ignorado.'))
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}:'))
+            process = self._start(name, options['porta'])
+            try:
+                asyncio.run(self._run(
+                    name, options['porta'], headers, paths, rounds, options['segundos'], options['telas']
+                ))
+            finally:
+                process.terminate()
+                process.wait(10)
+
+        self.stdout.write(self.style.SUCCESS('Concluído.'))
@@ -0,0 +1,79 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Company
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+DJANGO_AUTH = 'django.contrib.auth.middleware.AuthenticationMiddleware'
+CACHED_AUTH = 'core.middleware.CachedAuthenticationMiddleware'
+
+
+class Command(BaseCommand):
+    help = (
+        'Conta as consultas de sessão e de usuário por requisição HTMX autenticada '
+        'em cada backend de sessão, com e sem o usuário em cache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=50, help='Requisições por cenário')
+        parser.add_argument('--usuario', help='Usuário logado (padrão: primeiro superusuário)')
+
+    def _middleware(self, auth_middleware):
+        return [
+            auth_middleware if name in (DJANGO_AUTH, CACHED_AUTH) else name
+            for name in settings.MIDDLEWARE
+        ]
+
+    def _measure(self, user, url, requests):
+        client = Client()
+        client.force_login(user)
+        client.get(url, HTTP_HX_REQUEST='true')  # aquece caches (sessão, usuário, layout)
+
+        session = users = total = 0
+        timings = []
+        for _ in range(requests):
+            inicio = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url, HTTP_HX_REQUEST='true')
+            timings.append((time.perf_counter() - inicio) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url} respondeu {response.status_code}')
+            total += len(queries)
+            session += sum('django_session' in query['sql'] for query in queries.captured_queries)
+            users += sum('auth_user' in query['sql'] for query in queries.captured_queries)
+        return session / requests, users / requests, total / requests, statistics.median(timings)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(is_active=True)
+        user = users.filter(username=options['usuario']).first() if options['usuario'] else (
+            users.filter(is_superuser=True).first()
+        )
+        if user is None:
+            raise CommandError('Usuário não encontrado (use --usuario).')
+
+        company = Company.objects.order_by('pk').values_list('pk', flat=True).first() or ''
+        url = f'/htmx/camas-disponiveis/?company={company}'
+        requests = options['requisicoes']
+        self.stdout.write(f'GET {url} (HTMX) | {requests} requisições por cenário | consultas por requisição:')
+
+        for engine_name, engine in ENGINES.items():
+            for auth_name, auth_middleware in (('usuário no banco', DJANGO_AUTH), ('usuário em cache', CACHED_AUTH)):
+                with override_settings(SESSION_ENGINE=engine, MIDDLEWARE=self._middleware(auth_middleware)):
+                    session, user_queries, total, median = self._measure(user, url, requests)
+                self.stdout.write(
+                    f'  {engine_name:<10} {auth_name:<17} | sessão {session:4.1f} | usuário {user_queries:4.1f} | '
+                    f'total {total:4.1f} | mediana {median:6.1f} ms'
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'Configuração atual: {settings.SESSION_ENGINE}'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.stays import backfill
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera os trechos de estadia (cama e período) das reservas hospedadas/finalizadas que ainda não '
+        'os têm, a partir do histórico de cada reserva. Rodar uma vez após a atualização.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refazer', action='store_true',
+            help='Apaga todos os trechos e refaz a partir do histórico (perde a hora exata das trocas recentes)'
+        )
+        parser.add_argument('--lote', type=int, default=500, help='Reservas gravadas por vez')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        reservas, trechos = backfill(rebuild=options['refazer'], batch_size=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{reservas} reservas, {trechos} trechos gravados em {time.perf_counter() - inicio:.2f}s'
+        ))
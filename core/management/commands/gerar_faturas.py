@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.billing import compute_invoices, resolve_period, write_invoices_zip
+from core.billing_calc import VECTORIZED
+from core.utils import format_money
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera as faturas (Relatório de Fechamento) de todas as empresas de um período em um único ZIP: '
+        'um CSV por empresa e um resumo. Padrão: mês anterior.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mês no formato AAAA-MM (padrão: mês anterior)')
+        parser.add_argument('--inicio', help='Data inicial AAAA-MM-DD (usar junto com --fim)')
+        parser.add_argument('--fim', help='Data final AAAA-MM-DD')
+        parser.add_argument('--saida', help='Arquivo ZIP de saída (padrão: faturas_AAAAMMDD_AAAAMMDD.zip)')
+        parser.add_argument('--processos', type=int,
+                            help='Processos para o laço por empresa (padrão: automático, NumPy se instalado; '
+                                 '1 = sem paralelismo)')
+
+    def handle(self, *args, **options):
+        try:
+            filter_start, filter_end = resolve_period(options['mes'], options['inicio'], options['fim'])
+        except ValueError as e:
+            raise CommandError(f'Período inválido: {e}')
+        if filter_start > filter_end:
+            raise CommandError('A data inicial é maior que a final.')
+
+        if options['processos'] is None:
+            caminho = 'núcleo NumPy' if VECTORIZED else 'laço por empresa'
+        else:
+            caminho = f"laço por empresa, --processos {options['processos']}"
+            if VECTORIZED:
+                self.stdout.write('--processos informado: o cálculo usa o laço por empresa, não o núcleo NumPy.')
+
+        inicio = time.perf_counter()
+        invoices = compute_invoices(filter_start, filter_end, processes=options['processos'])
+        calculo = time.perf_counter() - inicio
+
+        saida = options['saida'] or f"faturas_{filter_start:%Y%m%d}_{filter_end:%Y%m%d}.zip"
+        with open(saida, 'wb') as f:
+            totais = write_invoices_zip(invoices, filter_start, filter_end, f)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{saida}: {sum(1 for rows in invoices.values() if rows)} empresas, {totais["guests"]} linhas, '
+            f'{totais["days"]} diárias, {totais["lunch"]} almoços, {totais["dinner"]} jantares, '
+            f'R$ {format_money(totais["amount"])} '
+            f'(cálculo {calculo:.2f}s pelo {caminho}, total {time.perf_counter() - inicio:.2f}s)'
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.billing import build_snapshots, is_closed_period, resolve_period
+from core.models import Company
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera os fechamentos (Relatório de Fechamento) de todas as empresas para um período encerrado. '
+        'Padrão: mês anterior. Feito para rodar de madrugada (Agendador de Tarefas / cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mês no formato AAAA-MM (padrão: mês anterior)')
+        parser.add_argument('--inicio', help='Data inicial AAAA-MM-DD (usar junto com --fim)')
+        parser.add_argument('--fim', help='Data final AAAA-MM-DD')
+
+    def handle(self, *args, **options):
+        try:
+            filter_start, filter_end = resolve_period(options['mes'], options['inicio'], options['fim'])
+        except ValueError as e:
+            raise CommandError(f'Período inválido: {e}')
+        if filter_start > filter_end:
+            raise CommandError('A data inicial é maior que a final.')
+        if not is_closed_period(filter_end):
+            raise CommandError(f'O período termina em {filter_end:%d/%m/%Y} e ainda não está fechado.')
+
+        inicio = time.perf_counter()
+        company_ids = [None] + list(Company.objects.values_list('id', flat=True))
+        snapshots = build_snapshots(filter_start, filter_end, company_ids)
+        if not snapshots:
+            raise CommandError('Houve alterações durante a geração. Rode o comando novamente.')
+
+        linhas = len(snapshots[None].rows)
+        self.stdout.write(self.style.SUCCESS(
+            f'{filter_start:%d/%m/%Y} a {filter_end:%d/%m/%Y}: {len(snapshots) - 1} empresas, '
+            f'{linhas} linhas, {time.perf_counter() - inicio:.2f}s '
+            f'(conferência geral: {snapshots[None].content_hash[:12]})'
+        ))
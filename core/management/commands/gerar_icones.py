@@ -0,0 +1,103 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# fontTools é necessário apenas para gerar o subconjunto (não em produção).
+try:
+    from fontTools import subset as font_subset
+except ImportError:
+    font_subset = None
+
+
+APP_DIR = Path(__file__).resolve().parents[2]
+OUTPUT_DIR = APP_DIR / 'static' / 'vendor' / 'bootstrap-icons'
+ICON_PATTERN = re.compile(r'\bbi-[a-z0-9]+(?:-[a-z0-9]+)*')
+
+# Ícones mantidos mesmo sem uso atual, para pequenas mudanças de tela
+# não exigirem gerar a fonte de novo.
+EXTRA_ICONS = {
+    'bi-arrow-clockwise', 'bi-arrow-repeat', 'bi-arrow-down', 'bi-arrow-up', 'bi-building',
+    'bi-calendar3', 'bi-chevron-down', 'bi-chevron-left', 'bi-chevron-right', 'bi-chevron-up',
+    'bi-clock', 'bi-cloud-arrow-down', 'bi-database', 'bi-download', 'bi-eye', 'bi-file-earmark-zip',
+    'bi-funnel', 'bi-graph-up', 'bi-hourglass-split', 'bi-journal-text', 'bi-lightning-charge',
+    'bi-list-ul', 'bi-lock', 'bi-person', 'bi-person-badge', 'bi-plus', 'bi-question-circle',
+    'bi-shield-check', 'bi-sort-down', 'bi-sort-up', 'bi-speedometer2', 'bi-table', 'bi-x-circle',
+    # Montados no template a partir de partes (a busca por ICON_PATTERN não os encontra)
+    'bi-caret-down-fill', 'bi-caret-up-fill',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera o subconjunto da fonte Bootstrap Icons (CSS + woff2/woff) apenas com os ícones '
+        'usados nos templates e no código. Requer fonttools e brotli (somente para desenvolvimento).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'origem',
+            help='Pasta do pacote bootstrap-icons com font/bootstrap-icons.min.css e font/fonts/*.woff2'
+        )
+
+    def _used_icons(self):
+        icons = set(EXTRA_ICONS)
+        sources = list((APP_DIR / 'templates').rglob('*.html')) + list(APP_DIR.glob('*.py'))
+        for template_dir in settings.TEMPLATES[0].get('DIRS', []):
+            sources += list(Path(template_dir).rglob('*.html'))
+        for path in sources:
+            icons.update(ICON_PATTERN.findall(path.read_text(encoding='utf-8')))
+        return icons
+
+    def handle(self, *args, **options):
+        if font_subset is None:
+            raise CommandError("fonttools não instalado. Use: pip install fonttools brotli")
+
+        origem = Path(options['origem'])
+        css_candidates = [origem / 'font' / 'bootstrap-icons.min.css', origem / 'bootstrap-icons.min.css']
+        css_path = next((p for p in css_candidates if p.exists()), None)
+        if css_path is None:
+            raise CommandError(f'bootstrap-icons.min.css não encontrado em {origem}')
+        font_path = css_path.parent / 'fonts' / 'bootstrap-icons.woff2'
+
+        css = css_path.read_text(encoding='utf-8')
+        version = re.search(r'Bootstrap Icons v([\d.]+)', css)
+        codepoints = dict(re.findall(r'\.(bi-[a-z0-9-]+)::before\{content:"\\([0-9a-f]+)"\}', css))
+
+        used = self._used_icons()
+        missing = sorted(icon for icon in used if icon not in codepoints)
+        selected = sorted(icon for icon in used if icon in codepoints)
+        if missing:
+            self.stdout.write(self.style.WARNING('Ignorados (não existem na fonte): ' + ', '.join(missing)))
+
+        OUTPUT_DIR.joinpath('fonts').mkdir(parents=True, exist_ok=True)
+        unicodes = [int(codepoints[icon], 16) for icon in selected]
+        for flavor in ('woff2', 'woff'):
+            font_subset.main([
+                str(font_path),
+                '--unicodes=' + ','.join(f'U+{cp:04X}' for cp in unicodes),
+                f'--flavor={flavor}',
+                '--layout-features=',
+                f'--output-file={OUTPUT_DIR / "fonts" / f"bootstrap-icons.{flavor}"}',
+            ])
+
+        rules = ''.join(f'.{icon}::before{{content:"\\{codepoints[icon]}"}}' for icon in selected)
+        OUTPUT_DIR.joinpath('bootstrap-icons.min.css').write_text(
+            f'/*!\n'
+            f' * Bootstrap Icons v{version.group(1) if version else "?"} - subconjunto com {len(selected)} ícones\n'
+            f' * Copyright 2019-2024 The Bootstrap Authors\n'
+            f' * Licensed under MIT (https://github.com/twbs/icons/blob/main/LICENSE)\n'
+            f' * Gerado por: python manage.py gerar_icones <pasta do bootstrap-icons>\n'
+            f' */'
+            '@font-face{font-display:block;font-family:bootstrap-icons;'
+            'src:url("fonts/bootstrap-icons.woff2") format("woff2"),url("fonts/bootstrap-icons.woff") format("woff")}'
+            '.bi::before,[class*=" bi-"]::before,[class^=bi-]::before{display:inline-block;'
+            'font-family:bootstrap-icons!important;font-style:normal;font-weight:400!important;'
+            'font-variant:normal;text-transform:none;line-height:1;vertical-align:-.125em;'
+            '-webkit-font-smoothing:antialiased;-moz-osx-font-smoothing:grayscale}'
+            + rules + '\n',
+            encoding='utf-8'
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'{len(selected)} ícones gravados em {OUTPUT_DIR}'))
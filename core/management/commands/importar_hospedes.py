@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importing import RosterError, read_roster, import_roster, write_report
+from core.models import Company
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa uma lista de hóspedes (CSV ou XLSX) enviada pela empresa contratante, '
+        'criando hóspedes e reservas com alocação automática de camas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Planilha .csv ou .xlsx (colunas: Nome, CPF, Empresa, Telefone, Quarto, Cama)')
+        parser.add_argument('--empresa', help='Empresa usada nas linhas sem a coluna "Empresa"')
+        parser.add_argument('--status', choices=['PRE', 'ACTIVE'], default='PRE',
+                            help='PRE (pré-reserva, padrão) ou ACTIVE (check-in imediato)')
+        parser.add_argument('--dry-run', action='store_true', help='Valida e aloca sem gravar nada')
+        parser.add_argument('--relatorio', help='Grava o resultado linha a linha neste CSV')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+
+        default_company = None
+        if options['empresa']:
+            default_company = Company.objects.filter(name__iexact=options['empresa']).first()
+            if default_company is None:
+                raise CommandError(f"Empresa '{options['empresa']}' não cadastrada.")
+
+        try:
+            with open(options['arquivo'], 'rb') as fh:
+                rows = read_roster(fh, options['arquivo'])
+                result = import_roster(
+                    rows, default_company=default_company,
+                    status=options['status'], dry_run=options['dry_run']
+                )
+        except (RosterError, OSError) as e:
+            raise CommandError(str(e))
+
+        for item in result.errors:
+            self.stdout.write(self.style.ERROR(f"Linha {item['line']}: {item['name']} ({item['cpf']}) - {item['error']}"))
+
+        if options['relatorio']:
+            with open(options['relatorio'], 'w', encoding='utf-8-sig', newline='') as fh:
+                write_report(result, fh)
+
+        prefixo = 'Dry-run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixo}{len(result.created)} reservas criadas, {len(result.errors)} linhas com erro "
+            f"({time.perf_counter() - inicio:.2f}s)."
+        ))
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Apaga as sessões expiradas do banco. Agende uma vez por dia (Agendador de Tarefas/cron) '
+        'ou deixe rodando com --intervalo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=0,
+                            help='Repete a limpeza a cada N horas (0 = limpa uma vez e encerra)')
+
+    def _clear(self):
+        # Mesmo filtro do clear_expired() do Django, contando o que saiu. Nas sessões
+        # 'cached_db' a cópia em cache expira sozinha junto com a sessão.
+        removed = Session.objects.filter(expire_date__lt=timezone.now()).delete()[0]
+        self.stdout.write(f'{timezone.localtime():%d/%m/%Y %H:%M} - {removed} sessões expiradas removidas.')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE.endswith('signed_cookies'):
+            self.stdout.write('Sessões em cookies assinados: nada guardado no banco.')
+            return
+
+        self._clear()
+        while options['intervalo'] > 0:
+            time.sleep(options['intervalo'] * 3600)
+            self._clear()
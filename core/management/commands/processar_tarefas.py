@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import cleanup, run_job
+from core.models import BackgroundJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa os relatórios em segundo plano em um processo separado do site '
+        '(use com TYBIS_JOB_WORKERS=0 no Waitress). Também apaga arquivos antigos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Tarefas simultâneas (padrão: 1)')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre consultas à fila')
+        parser.add_argument('--uma-vez', action='store_true', help='Processa a fila atual e encerra')
+
+    def handle(self, *args, **options):
+        removidas = cleanup()
+        if removidas:
+            self.stdout.write(f'{removidas} tarefas antigas removidas.')
+
+        workers = max(1, options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Processando tarefas ({workers} simultâneas). Ctrl+C para sair.'))
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tybis-job') as pool:
+            while True:
+                pending = list(
+                    BackgroundJob.objects.filter(status='PENDING').order_by('created_at')
+                    .values_list('pk', flat=True)[:workers]
+                )
+                # run_job só executa se conseguir marcar a tarefa como 'Processando'
+                for _ in pool.map(run_job, pending):
+                    pass
+                if options['uma_vez'] and not pending:
+                    break
+                if not pending:
+                    time.sleep(options['intervalo'])
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.inventory import InventorySpecError, load_spec, build_plan, apply_plan
+
+
+class Command(BaseCommand):
+    help = (
+        'Sincroniza quartos e camas com uma especificação declarativa (YAML ou CSV). '
+        'Cria o que falta e atualiza climatização/manutenção em uma única transação.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('spec', help='Arquivo .yaml/.yml ou .csv (separador ";") com o inventário')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas mostra o que seria alterado')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+
+        try:
+            spec = load_spec(options['spec'])
+        except InventorySpecError as e:
+            raise CommandError(str(e))
+
+        plan = build_plan(spec)
+
+        self.stdout.write(f'Quartos na especificação: {len(spec)}')
+        self.stdout.write(f'Quartos a criar: {len(plan.rooms_to_create)}')
+        self.stdout.write(f'Quartos a atualizar: {len(plan.rooms_to_update)}')
+        self.stdout.write(f'Camas a criar: {len(plan.beds_to_create)}')
+        self.stdout.write(f'Quartos sem alteração: {plan.unchanged}')
+
+        if plan.skipped_maintenance:
+            self.stdout.write(self.style.WARNING(
+                'Ocupados (manutenção ignorada): ' + ', '.join(plan.skipped_maintenance)
+            ))
+        if plan.extra_beds:
+            extras = ', '.join(f'{room}-{bed}' for room, bed in plan.extra_beds)
+            self.stdout.write(self.style.WARNING(f'Camas fora da especificação (mantidas): {extras}'))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry-run: nenhuma alteração gravada.'))
+            return
+
+        if not plan.has_changes:
+            self.stdout.write(self.style.SUCCESS('Inventário já está sincronizado.'))
+            return
+
+        apply_plan(plan)
+        self.stdout.write(self.style.SUCCESS(
+            f'Inventário sincronizado em {time.perf_counter() - inicio:.2f}s.'
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recria o índice da busca geral (hóspedes, CPF, telefone, empresa, quartos e histórico das reservas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Reservas lidas por vez')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = rebuild(batch_size=options['lote'])
+        if total is None:
+            self.stdout.write(self.style.WARNING(
+                'Este banco não tem FTS5 (SQLite) nem pg_trgm (PostgreSQL): a busca usa LIKE, sem índice.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} reservas indexadas em {time.perf_counter() - inicio:.1f}s.'
+        ))
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.backup import BackupError, database_path, list_snapshots, restore_snapshot, verify_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Confere ou restaura uma cópia do banco (backup_banco): descomprime, aplica a incremental sobre a '
+        'completa, confere os SHA-256 e o integrity_check. Sem --destino só confere.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('copia', nargs='?', help='Nome da cópia (padrão: a mais recente)')
+        parser.add_argument('--destino', help='Arquivo onde gravar o banco restaurado')
+        parser.add_argument('--substituir', action='store_true',
+                            help='Permite restaurar sobre o banco em uso (pare o servidor antes!)')
+        parser.add_argument('--todas', action='store_true', help='Confere todas as cópias')
+
+    def _done(self, manifest, action):
+        self.stdout.write(self.style.SUCCESS(
+            f'{manifest["name"]}: {action} ({manifest["pages"]} páginas, {manifest["tables"]} tabelas, '
+            f'sha256 {manifest["sha256"][:12]}).'
+        ))
+
+    def handle(self, *args, **options):
+        try:
+            if options['todas']:
+                failures = 0
+                for manifest in list_snapshots():
+                    try:
+                        self._done(verify_snapshot(manifest['name']), 'conferida')
+                    except BackupError as e:
+                        failures += 1
+                        self.stdout.write(self.style.ERROR(f'{manifest["name"]}: {e}'))
+                if failures:
+                    raise CommandError(f'{failures} cópias com problema.')
+                return
+
+            if not options['destino']:
+                self._done(verify_snapshot(options['copia']), 'conferida')
+                return
+
+            target = Path(options['destino']).resolve()
+            if target == database_path().resolve() and not options['substituir']:
+                raise CommandError(
+                    'Este é o banco em uso. Pare o servidor e repita com --substituir '
+                    '(ou restaure em outro arquivo e troque depois).'
+                )
+            self._done(restore_snapshot(options['copia'], target), f'restaurada em {target}')
+        except BackupError as e:
+            raise CommandError(str(e))
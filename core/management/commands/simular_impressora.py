@@ -0,0 +1,53 @@
+import socketserver
+import threading
+
+from django.core.management.base import BaseCommand
+
+from core.escpos import COMMANDS, ENCODING, FEED_AND_CUT
+
+
+class Command(BaseCommand):
+    help = (
+        'Impressora ESC/POS de mentira na rede: recebe os tickets (TYBIS_PRINTER=tcp://127.0.0.1:9100), '
+        'grava os bytes recebidos e mostra cada ticket como texto.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--porta', type=int, default=9100)
+        parser.add_argument('--saida', help='Arquivo onde os bytes recebidos são acrescentados')
+        parser.add_argument('--fechar-apos', type=int, default=0,
+                            help='Fecha a conexão a cada N tickets (testa a reconexão)')
+
+    def handle(self, *args, **options):
+        command = self
+        write_lock = threading.Lock()
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                command.stdout.write(f'Conexão de {self.client_address[0]}:{self.client_address[1]}')
+                buffer, tickets = b'', 0
+                while chunk := self.request.recv(4096):
+                    with write_lock:
+                        if options['saida']:
+                            with open(options['saida'], 'ab') as output:
+                                output.write(chunk)
+                        buffer += chunk
+                        while FEED_AND_CUT in buffer:
+                            ticket, buffer = buffer.split(FEED_AND_CUT, 1)
+                            tickets += 1
+                            command.stdout.write(f'--- ticket ({len(ticket) + len(FEED_AND_CUT)} bytes) ---')
+                            command.stdout.write(COMMANDS.sub(b'', ticket).decode(ENCODING, 'replace').rstrip())
+                    if options['fechar_apos'] and tickets >= options['fechar_apos']:
+                        break
+                command.stdout.write(f'Conexão encerrada ({tickets} tickets)')
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        with Server(('0.0.0.0', options['porta']), Handler) as server:
+            self.stdout.write(self.style.SUCCESS(f'🖨️  Impressora simulada na porta {options["porta"]} (Ctrl+C para sair)'))
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
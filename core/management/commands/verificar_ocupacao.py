@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.caching import invalidate
+from core.occupancy import check_rooms
+
+LABELS = {
+    'occupied_beds': 'check-in', 'pre_beds': 'pré', 'occupying_company_id': 'empresa', 'status': 'situação',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Confere as colunas de ocupação dos quartos (camas com check-in, pré-reservas, empresa e '
+        'situação) com as reservas. Use --corrigir para gravar os valores certos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corrigir', action='store_true', help='Corrige os quartos com diferença')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = check_rooms(repair=options['corrigir'])
+        if not report:
+            self.stdout.write(self.style.SUCCESS('Todos os quartos conferem com as reservas.'))
+            return
+
+        for room, saved, expected in report:
+            changes = ', '.join(
+                f'{LABELS[name]} {saved[name]} → {expected[name]}' for name in saved if saved[name] != expected[name]
+            )
+            self.stdout.write(f'{room}: {changes}')
+
+        if options['corrigir']:
+            invalidate('occupancy')
+            self.stdout.write(self.style.SUCCESS(f'{len(report)} quarto(s) corrigido(s).'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{len(report)} quarto(s) com diferença. Rode com --corrigir para gravar.'
+            ))
@@ -0,0 +1,56 @@
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .auth import aget_user, get_user
+
+
+# ==============================================================================
+# ARQUIVOS ESTÁTICOS NO MODO ASGI
+#
+# O middleware do WhiteNoise só tem a versão síncrona: no Uvicorn o Django
+# passaria cada requisição (inclusive as views async e os fluxos ao vivo) por
+# uma thread só por causa dele. Esta versão atende os dois modos: no Waitress
+# continua igual; no ASGI a busca do arquivo é em memória e só a montagem da
+# resposta do arquivo vai para uma thread.
+# ==============================================================================
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+# ==============================================================================
+# USUÁRIO DA REQUISIÇÃO (ver core/auth.py)
+# ==============================================================================
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """ AuthenticationMiddleware lendo o usuário do cache em vez do banco. """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(aget_user, request)
@@ -1,13 +1,44 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from datetime import datetime
 
+from .utils import normalize_cpf
+
+
+class LoadedValuesMixin:
+    """
+    Guarda os valores lidos do banco em '_loaded_values', para comparar na
+    gravação o que realmente mudou (ver signals.py) sem consulta extra.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Os sinais post_save já compararam; a partir daqui o "lido" é o gravado
+        self._loaded_values = {
+            f.attname: self.__dict__[f.attname] for f in self._meta.concrete_fields if f.attname in self.__dict__
+        }
+
+    def changed_fields(self, *names):
+        """ Campos (attname) alterados desde a leitura. Instância nova: todos. """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return set(names)
+        return {name for name in names if name in loaded and loaded[name] != getattr(self, name)}
+
 
 # ==============================================================================
 # CADASTROS BÁSICOS (Empresa, Quarto, Cama)
 # ==============================================================================
 
-class Company(models.Model):
+class Company(LoadedValuesMixin, models.Model):
     """
     Representa as empresas parceiras ou 'Particular'.
     Usado para agrupar hóspedes e validar regras de negócio (uma empresa por quarto).
@@ -31,19 +62,54 @@ class Room(models.Model):
     Possui status de climatização e manutenção.
     """
     CLIMATE_CHOICES = [('AC', 'Ar Condicionado'), ('VENT', 'Ventilador')]
+    STATUS_CHOICES = [
+        ('FREE', 'Livre'),
+        ('OCCUPIED', 'Ocupado'),
+        ('PRE', 'Pré-reserva'),
+        ('MAINTENANCE', 'Manutenção'),
+    ]
 
     number = models.CharField("Número", max_length=10, unique=True)
     climate = models.CharField("Climatização", max_length=10, choices=CLIMATE_CHOICES, default='VENT')
     is_maintenance = models.BooleanField("Em Manutenção", default=False)
 
+    # Ocupação mantida a cada gravação de reserva, na mesma transação (ver occupancy.py).
+    # Empresa nula com camas ocupadas = empresas misturadas (nenhuma outra pode entrar).
+    occupied_beds = models.PositiveSmallIntegerField("Camas com Check-in", default=0, editable=False)
+    pre_beds = models.PositiveSmallIntegerField("Camas Pré-reservadas", default=0, editable=False)
+    occupying_company = models.ForeignKey(
+        'Company', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='occupied_rooms', verbose_name="Empresa no Quarto"
+    )
+    status = models.CharField("Situação", max_length=12, choices=STATUS_CHOICES, default='FREE', editable=False)
+
     class Meta:
         verbose_name = "Quarto"
         verbose_name_plural = "Quartos"
         ordering = ['number']
+        indexes = [
+            models.Index(fields=['status'], name='room_status_idx'),
+            models.Index(fields=['occupying_company', 'status'], name='room_company_status_idx'),
+        ]
 
     def __str__(self):
         return f"Quarto {self.number}"
 
+    @staticmethod
+    def derive_status(is_maintenance, occupied_beds, pre_beds):
+        """ Mesma precedência dos cards do Dashboard: manutenção, ocupado, pré-reserva, livre. """
+        if is_maintenance:
+            return 'MAINTENANCE'
+        if occupied_beds:
+            return 'OCCUPIED'
+        if pre_beds:
+            return 'PRE'
+        return 'FREE'
+
+    def save(self, *args, **kwargs):
+        self.status = self.derive_status(self.is_maintenance, self.occupied_beds, self.pre_beds)
+        super().save(*args, **kwargs)
+
 
 class Bed(models.Model):
     """
@@ -65,7 +131,7 @@ class Bed(models.Model):
 # HÓSPEDES E RESERVAS
 # ==============================================================================
 
-class Guest(models.Model):
+class Guest(LoadedValuesMixin, models.Model):
     """
     Dados pessoais do hóspede.
     Vinculado a uma empresa para validação de regras de convivência.
@@ -84,7 +150,7 @@ class Guest(models.Model):
         return f"{self.name} ({self.company.name})"
 
 
-class Reservation(models.Model):
+class Reservation(LoadedValuesMixin, models.Model):
     """
     Core do sistema. Liga um Hóspede a uma Cama por um período.
     Gerencia o status (Pré-reserva vs Hospedado) e o histórico de ações.
@@ -110,6 +176,12 @@ class Reservation(models.Model):
     class Meta:
         verbose_name = "Reserva"
         verbose_name_plural = "Reservas"
+        indexes = [
+            models.Index(fields=['status'], name='reservation_status_idx'),
+            models.Index(fields=['start_date'], name='reservation_start_idx'),
+            # Números de cada empresa (companies.py): hospedados e diárias do mês só pelo índice
+            models.Index(fields=['guest', 'status', 'start_date', 'end_date'], name='reservation_guest_stay_idx'),
+        ]
 
     def add_log(self, user, action, details=""):
         """
@@ -130,6 +202,39 @@ class Reservation(models.Model):
         return f"{self.guest.name} - {self.get_status_display()}"
 
 
+class StaySegment(models.Model):
+    """
+    Trecho da estadia de uma reserva em uma cama: [início, fim).
+    Aberto por check-in, fechado por checkout; a troca de quarto fecha um
+    trecho e abre outro (ver stays.py). O trecho aberto (fim vazio) é a cama atual.
+    """
+    reservation = models.ForeignKey(
+        Reservation, on_delete=models.CASCADE, related_name='stays', verbose_name="Reserva"
+    )
+    bed = models.ForeignKey(Bed, on_delete=models.CASCADE, related_name='stays', verbose_name="Cama")
+    start = models.DateTimeField("Início")
+    end = models.DateTimeField("Fim", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Trecho de Estadia"
+        verbose_name_plural = "Trechos de Estadia"
+        ordering = ['start']
+        indexes = [
+            models.Index(fields=['bed', 'start'], name='stay_bed_start_idx'),
+            models.Index(fields=['reservation', 'start'], name='stay_reservation_idx'),
+            models.Index(fields=['start'], name='stay_start_idx'),
+        ]
+        constraints = [
+            # No máximo um trecho aberto por reserva
+            models.UniqueConstraint(
+                fields=['reservation'], condition=models.Q(end__isnull=True), name='stay_one_open'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.reservation_id}: {self.bed} desde {self.start:%d/%m/%Y %H:%M}"
+
+
 # ==============================================================================
 # REFEIÇÕES (Ticket)
 # ==============================================================================
@@ -149,10 +254,183 @@ class Meal(models.Model):
     meal_type = models.CharField("Tipo", max_length=10, choices=MEAL_CHOICES, default='ALMOCO')
     created_at = models.DateTimeField("Data/Hora", auto_now_add=True)
 
+    # Chave da emissão (ver tickets.py): só dígitos do CPF + dia local do serviço.
+    # Sem CPF a chave fica nula e o ticket não é conferido.
+    cpf_key = models.CharField("CPF (dígitos)", max_length=14, null=True, blank=True, editable=False)
+    service_date = models.DateField("Dia do Serviço", null=True, blank=True, editable=False)
+
     class Meta:
         verbose_name = "Refeição"
         verbose_name_plural = "Refeições"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='meal_created_idx'),
+            models.Index(fields=['company', 'created_at'], name='meal_company_created_idx'),
+            models.Index(fields=['cpf'], name='meal_cpf_idx'),
+            # Consumo por empresa e dia (consumption.py): o índice cobre a consulta inteira
+            models.Index(fields=['service_date', 'company', 'meal_type'], name='meal_service_company_idx'),
+        ]
+        constraints = [
+            # Um ticket de cada refeição por CPF e dia (reimpressão não cria outro)
+            models.UniqueConstraint(fields=['cpf_key', 'meal_type', 'service_date'], name='meal_one_per_service'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.get_meal_type_display()}"
+
+    def save(self, *args, **kwargs):
+        self.cpf_key = normalize_cpf(self.cpf) or None
+        self.service_date = timezone.localdate(self.created_at) if self.created_at else timezone.localdate()
+        super().save(*args, **kwargs)
+
+
+class MealReprint(models.Model):
+    """
+    Reimpressão (2ª via) de um ticket: registrada com usuário e horário,
+    em vez de emitir um ticket novo.
+    """
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='reprints', verbose_name="Ticket")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Usuário")
+    created_at = models.DateTimeField("Data/Hora", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Reimpressão de Ticket"
+        verbose_name_plural = "Reimpressões de Tickets"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"2ª via: {self.meal}"
+
+
+# ==============================================================================
+# FECHAMENTO (Fatura)
+# ==============================================================================
+
+class CompanyRate(LoadedValuesMixin, models.Model):
+    """
+    Tarifas do contrato de uma empresa, válidas de/até (inclusive).
+    Valorizam o Relatório de Fechamento: diária conforme a climatização do
+    quarto em cada noite, almoço e janta (ver billing_calc.stay_pieces).
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='rates', verbose_name="Empresa")
+    valid_from = models.DateField("Válida de")
+    valid_to = models.DateField("Válida até", null=True, blank=True, help_text="Vazio = sem data de término")
+    daily_ac = models.DecimalField("Diária (Ar Condicionado)", max_digits=10, decimal_places=2)
+    daily_vent = models.DecimalField("Diária (Ventilador)", max_digits=10, decimal_places=2)
+    lunch = models.DecimalField("Almoço", max_digits=10, decimal_places=2)
+    dinner = models.DecimalField("Janta", max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Tarifa"
+        verbose_name_plural = "Tarifas"
+        ordering = ['company', 'valid_from']
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'valid_from'], name='company_rate_unique'),
+            models.CheckConstraint(
+                condition=models.Q(valid_to__isnull=True) | models.Q(valid_to__gte=models.F('valid_from')),
+                name='company_rate_valid_range'
+            ),
+        ]
+
+    def clean(self):
+        if self.valid_to and self.valid_from and self.valid_to < self.valid_from:
+            raise ValidationError({'valid_to': "A data final deve ser igual ou posterior à inicial."})
+        if not self.company_id or not self.valid_from:
+            return
+        overlapping = CompanyRate.objects.filter(company_id=self.company_id).exclude(pk=self.pk).filter(
+            models.Q(valid_to__isnull=True) | models.Q(valid_to__gte=self.valid_from)
+        )
+        if self.valid_to:
+            overlapping = overlapping.filter(valid_from__lte=self.valid_to)
+        if overlapping.exists():
+            raise ValidationError("Já existe uma tarifa desta empresa vigente nesse período.")
+
+    def __str__(self):
+        fim = f"{self.valid_to:%d/%m/%Y}" if self.valid_to else "sem término"
+        return f"{self.company.name}: {self.valid_from:%d/%m/%Y} a {fim}"
+
+
+class ClosingSnapshot(models.Model):
+    """
+    Linhas já calculadas do Relatório de Fechamento de um período encerrado.
+    Servido direto no HTML e no CSV; apagado quando uma alteração retroativa
+    (reserva, hóspede, refeição ou empresa) atinge o período (ver billing.py).
+    """
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='closing_snapshots', verbose_name="Empresa", help_text="Vazio = todas as empresas"
+    )
+    period_start = models.DateField("Início")
+    period_end = models.DateField("Fim")
+    rows = models.JSONField("Linhas", default=list)
+    content_hash = models.CharField("Hash do Conteúdo", max_length=64)
+    created_at = models.DateTimeField("Gerado em", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Fechamento Gerado"
+        verbose_name_plural = "Fechamentos Gerados"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'period_start', 'period_end'], name='closing_snapshot_unique'
+            ),
+            models.UniqueConstraint(
+                fields=['period_start', 'period_end'], condition=models.Q(company__isnull=True),
+                name='closing_snapshot_all_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['period_start', 'period_end'], name='closing_snapshot_period_idx'),
+        ]
+
+    def __str__(self):
+        empresa = self.company.name if self.company_id else "Todas"
+        return f"{empresa}: {self.period_start:%d/%m/%Y} a {self.period_end:%d/%m/%Y}"
+
+
+# ==============================================================================
+# TAREFAS EM SEGUNDO PLANO (Relatórios pesados / Exportações)
+# ==============================================================================
+
+class BackgroundJob(models.Model):
+    """
+    Fila de tarefas executadas fora da requisição (ver jobs.py).
+    O arquivo gerado fica em TYBIS_JOBS_DIR e é baixado pela tela da tarefa.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Na fila'),
+        ('RUNNING', 'Processando'),
+        ('DONE', 'Concluído'),
+        ('ERROR', 'Erro'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='background_jobs', verbose_name="Usuário")
+    kind = models.CharField("Tipo", max_length=50)
+    label = models.CharField("Descrição", max_length=200)
+    params = models.JSONField("Parâmetros", default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    progress = models.PositiveSmallIntegerField("Progresso (%)", default=0)
+    message = models.TextField("Mensagem", blank=True)
+
+    file_name = models.CharField("Arquivo", max_length=200, blank=True)
+    file_path = models.CharField("Caminho", max_length=500, blank=True)
+
+    created_at = models.DateTimeField("Criado em", auto_now_add=True)
+    started_at = models.DateTimeField("Início", null=True, blank=True)
+    finished_at = models.DateTimeField("Fim", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa em Segundo Plano"
+        verbose_name_plural = "Tarefas em Segundo Plano"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_status_idx'),
+            models.Index(fields=['user', 'created_at'], name='job_user_idx'),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in ('DONE', 'ERROR')
 
     def __str__(self):
-        return f"{self.name} - {self.get_meal_type_display()}"
\ No newline at end of file
+        return f"{self.label} ({self.get_status_display()})"
@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.db.models import Count
+
+from .models import Reservation, Room
+
+
+# ==============================================================================
+# OCUPAÇÃO DOS QUARTOS (Colunas mantidas em Room)
+#
+# Room guarda camas com check-in, camas pré-reservadas, a empresa do quarto e
+# a situação (livre/ocupado/pré/manutenção). São recalculadas a partir das
+# reservas do quarto sempre que uma reserva muda de cama, situação ou hóspede
+# (signals.py) e nas gravações em lote (importação, inventário), dentro da
+# mesma transação. Assim o filtro do Dashboard e a regra de empresas viram
+# consultas diretas em Room, pelos índices de situação/empresa.
+# O comando 'verificar_ocupacao' compara tudo com as reservas e corrige.
+# ==============================================================================
+
+STATE_FIELDS = ('occupied_beds', 'pre_beds', 'occupying_company_id', 'status')
+
+
+def _drift(rooms):
+    """
+    {room_id: colunas corretas} dos quartos cujas colunas diferem das reservas.
+    Duas consultas, qualquer que seja o número de quartos.
+    """
+    counts = defaultdict(lambda: {'ACTIVE': 0, 'PRE': 0, 'companies': set()})
+    for room_id, status, company_id in Reservation.objects.filter(
+        status__in=['ACTIVE', 'PRE'], bed__room__in=rooms.values('pk')
+    ).values_list('bed__room_id', 'status', 'guest__company_id'):
+        item = counts[room_id]
+        item[status] += 1
+        item['companies'].add(company_id)
+
+    drift = {}
+    for room_id, is_maintenance, *current in rooms.values_list('pk', 'is_maintenance', *STATE_FIELDS):
+        item = counts.get(room_id)
+        occupied, pre = (item['ACTIVE'], item['PRE']) if item else (0, 0)
+        companies = item['companies'] if item else ()
+        expected = (
+            occupied, pre,
+            next(iter(companies)) if len(companies) == 1 else None,
+            Room.derive_status(is_maintenance, occupied, pre),
+        )
+        if tuple(current) != expected:
+            drift[room_id] = dict(zip(STATE_FIELDS, expected))
+    return drift
+
+
+def _apply(drift):
+    for room_id, state in drift.items():
+        # update(): não dispara os sinais de Room (o layout em cache não muda)
+        Room.objects.filter(pk=room_id).update(**state)
+
+
+def refresh_rooms(rooms):
+    """ Recalcula as colunas dos quartos (queryset) na transação atual. """
+    _apply(_drift(rooms))
+
+
+def refresh_rooms_of_beds(bed_ids):
+    """ Recalcula os quartos das camas informadas. """
+    bed_ids = {bed_id for bed_id in bed_ids if bed_id}
+    if bed_ids:
+        refresh_rooms(Room.objects.filter(beds__in=bed_ids).distinct())
+
+
+def check_rooms(repair=False):
+    """
+    Confere todos os quartos com as reservas. Retorna a lista de
+    (quarto, colunas gravadas, colunas corretas) e corrige se repair=True.
+    """
+    rooms = Room.objects.all()
+    drift = _drift(rooms)
+    report = []
+    if drift:
+        for room in Room.objects.filter(pk__in=drift).order_by('number'):
+            report.append((room, {name: getattr(room, name) for name in STATE_FIELDS}, drift[room.pk]))
+    if repair:
+        _apply(drift)
+    return report
+
+
+def status_counts():
+    """ Quartos por situação para os botões do Dashboard (uma consulta agrupada). """
+    counts = dict.fromkeys(['FREE', 'OCCUPIED', 'PRE', 'MAINTENANCE'], 0)
+    counts.update(Room.objects.order_by().values_list('status').annotate(total=Count('pk')))
+    return {
+        'total': sum(counts.values()),
+        'free': counts['FREE'],
+        'occupied': counts['OCCUPIED'],
+        'pre': counts['PRE'],
+        'maintenance': counts['MAINTENANCE'],
+    }
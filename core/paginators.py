@@ -0,0 +1,51 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginador para tabelas grandes (Refeições, Reservas).
+    Evita o COUNT(*) exato sobre a tabela inteira:
+      - Sem filtros: usa uma estimativa barata (estatística do Postgres ou MAX(id) no SQLite).
+      - Com filtros: conta no máximo 'exact_count_limit' registros.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate is not None:
+                return estimate
+
+        # COUNT limitado: SELECT COUNT(*) FROM (SELECT ... LIMIT n)
+        return queryset.order_by()[:self.exact_count_limit].count()
+
+
+def estimate_table_rows(model, using='default'):
+    """
+    Estimativa de linhas de uma tabela sem varrê-la.
+    Retorna None quando o banco não oferece um atalho (usa-se então a contagem exata).
+    """
+    connection = connections[using]
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+        return None
+
+    if connection.vendor == 'sqlite':
+        # MAX(id) lê só a ponta da chave primária. Exclusões fazem o valor
+        # ficar um pouco acima do real, o que é aceitável para paginação.
+        return model._default_manager.using(using).aggregate(total=Max('pk'))['total'] or 0
+
+    return None
@@ -1,5 +1,6 @@
 import os
 import traceback
+from django.conf import settings
 from django.utils import timezone
 
 # Tenta importar bibliotecas do Windows. Se der erro (Linux), vai para o 'except'
@@ -40,7 +41,7 @@ try:
         return size[1]
 
 
-    def imprimir_ticket_refeicao(meal):
+    def imprimir_ticket_refeicao(meal, segunda_via=False):
         try:
             hDC = inicializar_impressora()
 
@@ -56,6 +57,11 @@ try:
             altura = centralizar_texto(hDC, tipo_refeicao, Y_CURSOR, PAGE_WIDTH)
             Y_CURSOR += altura + 20
 
+            if segunda_via:
+                hDC.SelectObject(criar_fonte("Arial", 35, 700))
+                altura = centralizar_texto(hDC, "*** 2ª VIA ***", Y_CURSOR, PAGE_WIDTH)
+                Y_CURSOR += altura + 10
+
             # Linha
             hDC.MoveTo(0, Y_CURSOR)
             hDC.LineTo(PAGE_WIDTH, Y_CURSOR)
@@ -113,10 +119,17 @@ try:
 
 except ImportError:
     # --- VERSÃO LINUX/DEV (SIMULADA) ---
-    def imprimir_ticket_refeicao(meal):
+    def imprimir_ticket_refeicao(meal, segunda_via=False):
         print("\n" + "=" * 40)
         print("🖨️  [SIMULAÇÃO DE IMPRESSÃO - MODO DEV]")
-        print(f"🎫 TICKET: {meal.get_meal_type_display()}")
+        print(f"🎫 TICKET: {meal.get_meal_type_display()}" + (" (2ª VIA)" if segunda_via else ""))
         print(f"👤 NOME:   {meal.name}")
         print("=" * 40 + "\n")
-        return True
\ No newline at end of file
+        return True
+
+
+# --- IMPRESSORA TÉRMICA ESC/POS (QUALQUER SISTEMA) ---
+# Com TYBIS_PRINTER definido, o ticket vai em ESC/POS direto para a impressora
+# (rede ou USB) no lugar do GDI do Windows ou da simulação (ver core/escpos.py).
+if settings.TYBIS_PRINTER:
+    from .escpos import imprimir_ticket_refeicao  # noqa: F811
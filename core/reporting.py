@@ -0,0 +1,178 @@
+import functools
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from .backup import backup_into, database_path
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# CONEXÃO DOS RELATÓRIOS (só leitura)
+#
+# Relatórios e exportações fazem leituras longas; no mesmo arquivo que a
+# recepção grava elas seguram o checkpoint do WAL (o -wal cresce e as
+# gravações ficam mais lentas). As views marcadas com @reporting_view e as
+# tarefas de exportação (jobs.py) leem pelo alias 'reporting', aberto com
+# query_only: nenhum relatório consegue gravar por engano.
+#
+#   TYBIS_REPORTING_LAG=0  'reporting' é o próprio banco (WAL): dados na hora.
+#   TYBIS_REPORTING_LAG=N  'reporting' é uma cópia refeita a cada N segundos
+#                          pela API de backup (em passos, como o backup_banco),
+#                          sobre ela mesma: quem está lendo termina no retrato
+#                          anterior. As telas mostram de quando são os dados.
+#
+# As telas da recepção continuam no 'default' (leem o que acabaram de gravar).
+# Dentro de uma transação do 'default', e nas leituras que viram dados
+# gravados (fechamentos, cache de referência), a leitura também fica nele.
+# ==============================================================================
+
+REPORTING = 'reporting'
+SNAPSHOT_TABLE = 'tybis_retrato'
+CHECK_INTERVAL = 1.0  # segundos entre as consultas à data do retrato (por processo)
+
+_reading = ContextVar('tybis_reporting', default=False)
+_snapshot = {'taken': None, 'checked': None}
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def lag():
+    """ Intervalo (segundos) entre as cópias dos relatórios; 0 = banco ao vivo. """
+    return getattr(settings, 'TYBIS_REPORTING_LAG', 0) if REPORTING in settings.DATABASES else 0
+
+
+def describe_lag(seconds):
+    """ 300 -> '5 min', 90 -> '90 s' """
+    return f'{seconds // 60} min' if seconds % 60 == 0 else f'{seconds} s'
+
+
+def _copy_path():
+    return Path(settings.DATABASES[REPORTING]['NAME'])
+
+
+# ==============================================================================
+# QUEM LÊ DE ONDE
+# ==============================================================================
+
+@contextmanager
+def reading(enabled=True):
+    """ Leituras do bloco vão para 'reporting' (enabled=False: voltam ao 'default'). """
+    token = _reading.set(enabled)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def primary():
+    """ Bloco que precisa ler o que acabou de ser gravado (ou que grava o que leu). """
+    return reading(False)
+
+
+def reporting_view(view):
+    """ View de relatório: as consultas (inclusive as do template) leem de 'reporting'. """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reading():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _read_taken():
+    try:
+        database = sqlite3.connect(f'{_copy_path().as_uri()}?mode=ro', uri=True, timeout=5)
+    except sqlite3.Error:
+        return None
+    try:
+        row = database.execute(f'SELECT feito_em FROM {SNAPSHOT_TABLE}').fetchone()
+    except sqlite3.Error:
+        return None  # cópia ainda sendo feita pela primeira vez
+    finally:
+        database.close()
+    return datetime.fromisoformat(row[0]) if row else None
+
+
+def snapshot_time():
+    """ Momento do retrato lido pelos relatórios (None: banco ao vivo ou cópia ainda não feita). """
+    if not lag():
+        return None
+    now = time.monotonic()
+    if _snapshot['checked'] is None or now - _snapshot['checked'] >= CHECK_INTERVAL:
+        _snapshot.update(taken=_read_taken(), checked=now)
+    return _snapshot['taken']
+
+
+class ReportingRouter:
+    """ settings.DATABASE_ROUTERS: leituras marcadas vão para 'reporting'; gravações, sempre 'default'. """
+
+    def db_for_read(self, model, **hints):
+        if not _reading.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        if lag() and snapshot_time() is None:
+            return None  # sem cópia pronta, o relatório lê o banco ao vivo
+        return REPORTING
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # os dois aliases têm as mesmas tabelas
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPORTING
+
+
+# ==============================================================================
+# CÓPIA PERIÓDICA (TYBIS_REPORTING_LAG > 0)
+# ==============================================================================
+
+def refresh():
+    """ Refaz a cópia dos relatórios a partir do banco, sem travar a recepção. Retorna o momento do retrato. """
+    taken = timezone.now()
+    target = sqlite3.connect(_copy_path(), timeout=20)
+    try:
+        target.execute('PRAGMA journal_mode=WAL')  # leitores da cópia não esperam a próxima cópia
+        backup_into(database_path(), target)
+        # O backup substitui o arquivo inteiro: a data do retrato é gravada de novo a cada cópia
+        target.execute(f'CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (feito_em TEXT NOT NULL)')
+        target.execute(f'INSERT INTO {SNAPSHOT_TABLE} (feito_em) VALUES (?)', [taken.isoformat()])
+        target.commit()
+        target.execute('PRAGMA wal_checkpoint(PASSIVE)')
+    finally:
+        target.close()
+    _snapshot.update(taken=taken, checked=time.monotonic())
+    return taken
+
+
+def _refresh_loop(interval):
+    while True:
+        started = time.monotonic()
+        try:
+            taken = refresh()
+            logger.debug('Cópia dos relatórios atualizada (%s) em %.1fs', taken, time.monotonic() - started)
+        except Exception:
+            logger.exception('Falha ao atualizar a cópia dos relatórios')
+        time.sleep(max(interval - (time.monotonic() - started), 1))
+
+
+def start():
+    """ Inicia a atualização periódica da cópia neste processo (chamado pelo run_waitress). """
+    global _refresher
+    interval = lag()
+    with _refresher_lock:
+        if interval and _refresher is None:
+            _refresher = threading.Thread(
+                target=_refresh_loop, args=(interval,), name='tybis-reporting', daemon=True
+            )
+            _refresher.start()
@@ -0,0 +1,366 @@
+import logging
+import re
+import time
+import unicodedata
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Prefetch, Q
+
+from .models import Reservation, StaySegment
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+# BUSCA GERAL (Hóspede, CPF, telefone, empresa, quartos e histórico)
+#
+# Um documento por reserva em uma tabela de texto indexada: no SQLite, uma
+# tabela virtual FTS5 (sem acentos, com índice de prefixos); no PostgreSQL,
+# uma tabela comum com índice de trigramas (pg_trgm). A tabela é mantida
+# pelos sinais de Reserva, Hóspede e Empresa (signals.py) na mesma transação
+# da gravação; a importação em lote chama index_reservations(). Em um banco
+# atualizado de uma versão sem busca, todas as reservas são indexadas ao
+# iniciar o servidor (startup.py) ou na primeira busca, nunca durante uma
+# gravação da recepção. O comando 'reindexar_busca' refaz tudo.
+#
+# Cada palavra casa pelo começo ("jo" acha "João") e números com pontuação
+# viram só dígitos ("123.456" acha o CPF). No modo aproximado, cada palavra
+# aceita também os termos do índice com a mesma inicial a uma ou duas letras
+# de distância ("silvia" acha "Sílvia" e "Silva").
+# Os resultados vêm da reserva mais recente para a mais antiga.
+# ==============================================================================
+
+TABLE = 'core_search'
+BATCH_SIZE = 1000
+FUZZY_MIN_LENGTH = 3  # palavras menores (e números) só casam pelo começo
+FUZZY_MAX_TERMS = 12  # termos parecidos usados por palavra
+
+_WORDS = re.compile(r'\d[\d.\-/]*\d|\w+')
+
+
+def fold(text):
+    """ Minúsculas e sem acentos (o mesmo que o índice guarda). """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def _phone_terms(value):
+    """ Telefone com e sem DDD: '(11) 98765-4321' casa com '11987...' e com '98765...'. """
+    digits = _digits(value)
+    return ' '.join(dict.fromkeys([digits, digits[-9:], digits[-8:]])) if len(digits) > 9 else digits
+
+
+def query_words(text):
+    """ 'João 123.456-78' -> ['joao', '12345678'] """
+    words = []
+    for match in _WORDS.finditer(fold(text)):
+        word = match.group()
+        words.append(_digits(word) if word[0].isdigit() else word)
+    return [word for word in words if word]
+
+
+def _distance(a, b, limit):
+    """
+    Distância de edição entre a e b (troca de duas letras vizinhas conta 1),
+    ou limit + 1 se passar do limite.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if before is not None and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def _tolerance(word):
+    return 1 if len(word) <= 5 else 2
+
+
+# ==============================================================================
+# DOCUMENTOS
+# ==============================================================================
+
+def _documents(reservations):
+    """ (id, nome, cpf, telefone, empresa, quartos, histórico) de cada reserva. """
+    reservations = reservations.select_related('guest__company', 'bed__room').prefetch_related(
+        Prefetch('stays', queryset=StaySegment.objects.select_related('bed__room'))
+    )
+    for res in reservations:
+        rooms = {res.bed.room.number} | {stay.bed.room.number for stay in res.stays.all()}
+        history = ' '.join(
+            f"{entry.get('acao', '')} {entry.get('detalhes') or ''}" for entry in res.history or ()
+        )
+        yield (
+            res.pk, res.guest.name, _digits(res.guest.cpf), _phone_terms(res.guest.phone),
+            res.guest.company.name, ' '.join(sorted(rooms)), history,
+        )
+
+
+# ==============================================================================
+# ÍNDICES (SQLite FTS5 / PostgreSQL pg_trgm)
+# ==============================================================================
+
+class _Fts5Index:
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "name, cpf, phone, company, rooms, history, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        # Vocabulário do índice (modo aproximado)
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE}_terms USING fts5vocab({TABLE}, 'row')")
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}_terms')
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def delete(self, cursor, ids):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({", ".join(["%s"] * len(ids))})', ids)
+
+    def insert(self, cursor, documents):
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, cpf, phone, company, rooms, history) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)', list(documents)
+        )
+
+    def optimize(self, cursor):
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+    def _similar(self, cursor, word):
+        limit = _tolerance(word)
+        cursor.execute(
+            f'SELECT term, doc FROM {TABLE}_terms WHERE term >= %s AND term < %s '
+            'AND length(term) BETWEEN %s AND %s',
+            [word[0], chr(ord(word[0]) + 1), len(word) - limit, len(word) + limit]
+        )
+        scored = sorted(
+            (distance, -docs, term) for term, docs in cursor.fetchall()
+            if (distance := _distance(word, term, limit)) <= limit
+        )
+        return [term for _, _, term in scored[:FUZZY_MAX_TERMS]]
+
+    def match(self, cursor, words, fuzzy, limit):
+        groups = []
+        for word in words:
+            options = [f'"{word}"*']
+            if fuzzy and len(word) >= FUZZY_MIN_LENGTH and not word.isdigit():
+                options += [f'"{term}"' for term in self._similar(cursor, word) if term != word]
+            groups.append(f'({" OR ".join(options)})')
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s',
+            [' AND '.join(groups), limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class _TrigramIndex:
+    def create(self, cursor):
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {TABLE} (reservation_id integer PRIMARY KEY, body text NOT NULL)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_trgm ON {TABLE} USING gin (body gin_trgm_ops)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def delete(self, cursor, ids):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE reservation_id = ANY(%s)', [list(ids)])
+
+    def insert(self, cursor, documents):
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (reservation_id, body) VALUES (%s, %s)',
+            # ' palavra palavra ...': LIKE '% pal%' casa pelo começo de cada palavra
+            [(pk, ' ' + ' '.join(re.findall(r'\w+', fold(' '.join(fields))))) for pk, *fields in documents]
+        )
+
+    def optimize(self, cursor):
+        cursor.execute(f'ANALYZE {TABLE}')
+
+    def match(self, cursor, words, fuzzy, limit):
+        conditions, params = [], []
+        for word in words:
+            if fuzzy and len(word) >= FUZZY_MIN_LENGTH and not word.isdigit():
+                # word_similarity: a palavra parecida com algum trecho do texto
+                conditions.append('(body LIKE %s OR %s <%% body)')
+                params += [f'% {word}%', word]
+            else:
+                conditions.append('body LIKE %s')
+                params.append(f'% {word}%')
+        cursor.execute(
+            f'SELECT reservation_id FROM {TABLE} WHERE {" AND ".join(conditions)} '
+            'ORDER BY reservation_id DESC LIMIT %s', params + [limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+COMPLETE_TABLE = f'{TABLE}_completo'  # existe = índice com todas as reservas (criada ao fim do preenchimento)
+
+_index = {'backend': None, 'ready': False, 'complete': False}
+
+
+def _new_backend():
+    backend = {'sqlite': _Fts5Index, 'postgresql': _TrigramIndex}.get(connection.vendor)
+    return backend() if backend is not None else None
+
+
+def _unsupported(error):
+    """ SQLite compilado sem FTS5 ('no such module: fts5') ou PostgreSQL sem pg_trgm. """
+    message = str(error).lower()
+    return 'fts5' in message or 'pg_trgm' in message
+
+
+def _remember(**state):
+    if connection.in_atomic_block:
+        # A tabela pode ter sido criada dentro de uma transação que ainda pode ser
+        # desfeita (e a tabela com ela): só vale depois do commit
+        transaction.on_commit(lambda: _index.update(**state))
+    else:
+        _index.update(**state)
+
+
+def _fill(backend, cursor, batch_size):
+    total, last_pk = 0, 0
+    while True:
+        chunk = list(
+            Reservation.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not chunk:
+            break
+        backend.insert(cursor, _documents(Reservation.objects.filter(pk__in=chunk)))
+        total += len(chunk)
+        last_pk = chunk[-1]
+    backend.optimize(cursor)
+    return total
+
+
+def _backend():
+    """
+    Índice do banco atual ou None se o banco não tiver suporte. Só cria a
+    tabela: é chamado pelos sinais, dentro da transação da recepção, e não
+    pode segurar a gravação preenchendo o índice (ver ensure_complete).
+    """
+    if _index['ready']:
+        return _index['backend']
+
+    backend = _new_backend()
+    if backend is not None:
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                backend.create(cursor)
+        except DatabaseError as e:
+            if not _unsupported(e):
+                raise
+            logger.warning('Busca geral sem índice (%s): usando LIKE nos cadastros', e)
+            backend = None
+    _remember(backend=backend, ready=True)
+    return backend
+
+
+def ensure_complete():
+    """
+    Indexa todas as reservas se o índice ainda não foi preenchido por inteiro
+    (banco atualizado de uma versão sem busca). Chamado no início do servidor
+    (startup.py) e pela busca, nunca pelas gravações. Retorna quantas reservas
+    foram indexadas agora (0: já estava completo; None: sem suporte).
+    """
+    if _index['complete']:
+        return 0
+    backend = _backend()
+    if backend is None:
+        return None
+    with connection.cursor() as cursor:
+        if COMPLETE_TABLE in connection.introspection.table_names(cursor):
+            _remember(complete=True)
+            return 0
+
+    started = time.monotonic()
+    total = rebuild()
+    logger.info('Índice da busca preenchido: %s reservas em %.1fs', total, time.monotonic() - started)
+    return total
+
+
+# ==============================================================================
+# ATUALIZAÇÃO
+# ==============================================================================
+
+def index_reservations(ids):
+    """ (Re)indexa as reservas informadas; as que não existem mais saem do índice. """
+    backend = _backend()
+    ids = list(ids)
+    if backend is None or not ids:
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[start:start + BATCH_SIZE]
+            backend.delete(cursor, chunk)
+            backend.insert(cursor, _documents(Reservation.objects.filter(pk__in=chunk)))
+
+
+def unindex_reservations(ids):
+    backend = _backend()
+    ids = list(ids)
+    if backend is not None and ids:
+        with connection.cursor() as cursor:
+            backend.delete(cursor, ids)
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """ Recria o índice com todas as reservas. Retorna quantas foram indexadas (None sem suporte). """
+    backend = _new_backend()
+    if backend is None:
+        return None
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {COMPLETE_TABLE}')
+            backend.drop(cursor)
+            backend.create(cursor)
+            total = _fill(backend, cursor, batch_size)
+            cursor.execute(f'CREATE TABLE {COMPLETE_TABLE} (id integer)')
+    except DatabaseError as e:
+        if not _unsupported(e):
+            raise
+        return None
+    _remember(backend=backend, ready=True, complete=True)
+    return total
+
+
+# ==============================================================================
+# CONSULTA
+# ==============================================================================
+
+def search(text, fuzzy=False, limit=50):
+    """ Ids das reservas que casam com todas as palavras, da mais recente para a mais antiga. """
+    words = query_words(text)
+    if not words:
+        return []
+    ensure_complete()
+    backend = _backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            return backend.match(cursor, words, fuzzy, limit)
+
+    # Sem índice: LIKE nos campos do hóspede (lento, mas funciona em qualquer banco)
+    query = Q()
+    for word in words:
+        query &= (
+            Q(guest__name__icontains=word) | Q(guest__cpf__icontains=word) | Q(guest__phone__icontains=word)
+            | Q(guest__company__name__icontains=word) | Q(bed__room__number=word)
+        )
+    return list(Reservation.objects.filter(query).order_by('-pk').values_list('pk', flat=True)[:limit])
+
+
+def search_reservations(text, fuzzy=False, limit=50):
+    """ Reservas encontradas (com hóspede, empresa e cama), na ordem da busca. """
+    ids = search(text, fuzzy, limit)
+    found = Reservation.objects.select_related('guest__company', 'bed__room').in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
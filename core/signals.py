@@ -0,0 +1,244 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .auth import forget_user
+from .billing import invalidate_closing
+from .caching import invalidate
+from .kitchen import invalidate_board, record_meal
+from .models import Company, CompanyRate, Room, Bed, Guest, Reservation, Meal
+from .occupancy import refresh_rooms, refresh_rooms_of_beds
+from .search import index_reservations, unindex_reservations
+from .stays import sync_stay
+from .tickets import forget, remember
+
+
+# ==============================================================================
+# INVALIDAÇÃO DO CACHE DE REFERÊNCIA
+# Disparado tanto pelas views quanto pelo Admin.
+# A troca de versão espera o COMMIT: assim nenhum outro processo recarrega
+# (e guarda) os dados antigos sob a versão nova.
+# Operações em lote (bulk_create/update) não geram sinais: quem as usa
+# deve chamar invalidate() diretamente (ver inventory.apply_plan).
+# ==============================================================================
+
+@receiver([post_save, post_delete], sender=Company)
+def company_changed(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate('companies'))
+
+
+@receiver([post_save, post_delete], sender=Room)
+@receiver([post_save, post_delete], sender=Bed)
+def room_layout_changed(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate('rooms', 'occupancy'))
+
+
+@receiver([post_save, post_delete], sender=Reservation)
+@receiver([post_save, post_delete], sender=Guest)  # empresa do hóspede define a do quarto
+def occupancy_changed(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate('occupancy'))
+
+
+# ==============================================================================
+# QUADRO DA COZINHA (kitchen.py)
+# Ticket novo soma no contador em memória; alteração ou exclusão reconta o dia.
+# ==============================================================================
+
+@receiver(post_save, sender=Meal)
+def meal_board_changed(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: record_meal(instance))
+    else:
+        transaction.on_commit(invalidate_board)
+
+
+@receiver(post_delete, sender=Meal)
+def meal_board_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_board)
+
+
+# ==============================================================================
+# JANELA DE TICKETS DE HOJE (tickets.py)
+# ==============================================================================
+
+@receiver(post_save, sender=Meal)
+def meal_window_changed(sender, instance, created, **kwargs):
+    def update():
+        if not created:
+            forget(instance.pk)
+        remember(instance)
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Meal)
+def meal_window_deleted(sender, instance, **kwargs):
+    pk = instance.pk  # o delete() zera o pk antes do COMMIT
+    transaction.on_commit(lambda: forget(pk))
+
+
+# ==============================================================================
+# OCUPAÇÃO DOS QUARTOS (occupancy.py)
+# Recalculada na mesma transação da gravação (views e Admin). Marcar mala ou
+# editar o histórico não muda a ocupação nem faz consulta.
+# ==============================================================================
+
+@receiver(post_save, sender=Reservation)
+def reservation_room_changed(sender, instance, created, **kwargs):
+    if created or instance.changed_fields('bed_id', 'status', 'guest_id'):
+        loaded = getattr(instance, '_loaded_values', {})
+        refresh_rooms_of_beds({instance.bed_id, loaded.get('bed_id')})
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_room_deleted(sender, instance, **kwargs):
+    refresh_rooms_of_beds({instance.bed_id})
+
+
+@receiver(post_save, sender=Guest)
+def guest_room_changed(sender, instance, created, **kwargs):
+    if not created and instance.changed_fields('company_id'):
+        refresh_rooms_of_beds(
+            Reservation.objects.filter(guest=instance, status__in=['ACTIVE', 'PRE']).values_list('bed_id', flat=True)
+        )
+
+
+@receiver(post_delete, sender=Bed)
+def bed_room_changed(sender, instance, **kwargs):
+    refresh_rooms(Room.objects.filter(pk=instance.room_id))
+
+
+# ==============================================================================
+# TRECHOS DE ESTADIA (stays.py)
+# Gravados no mesmo save da reserva: check-in, troca de cama e checkout,
+# pelas views ou pelo Admin. Marcar mala não muda trecho nem faz consulta.
+# ==============================================================================
+
+@receiver(post_save, sender=Reservation)
+def reservation_stay_changed(sender, instance, created, **kwargs):
+    if created or instance.changed_fields('bed_id', 'status', 'end_date'):
+        sync_stay(instance, created)
+
+
+# ==============================================================================
+# INVALIDAÇÃO DOS FECHAMENTOS GERADOS (billing.py)
+# Só apaga fechamentos de períodos encerrados atingidos pela alteração.
+# Gravações do dia a dia (check-in, malas, tickets de hoje) não tocam em
+# nenhum período fechado e não fazem consulta extra.
+# ==============================================================================
+
+def _local_date(value):
+    return timezone.localtime(value).date() if value else None
+
+
+@receiver(post_save, sender=Reservation)
+def reservation_billing_changed(sender, instance, created, **kwargs):
+    changed = instance.changed_fields('guest_id', 'start_date', 'end_date')
+    if not changed:
+        return
+
+    loaded = getattr(instance, '_loaded_values', {})
+    starts = [instance.start_date, loaded.get('start_date')]
+    if changed == {'end_date'}:
+        # Só a saída mudou (checkout): os dias antes das duas saídas não mudam
+        starts = [instance.end_date, loaded['end_date']]
+    ends = [instance.end_date] + ([loaded['end_date']] if 'end_date' in loaded else [])
+    first_day = min(_local_date(value) for value in starts if value)
+    if first_day >= timezone.localdate():
+        return  # Reserva de hoje: nenhum período fechado foi atingido
+    last_day = None if None in ends else max(_local_date(value) for value in ends)
+
+    guest_ids = {instance.guest_id, loaded.get('guest_id', instance.guest_id)}
+    company_ids = list(Guest.objects.filter(pk__in=guest_ids).values_list('company_id', flat=True))
+    transaction.on_commit(lambda: invalidate_closing(first_day, last_day, company_ids))
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_billing_deleted(sender, instance, **kwargs):
+    # Em cascata o hóspede pode já ter sido apagado: invalida todas as empresas
+    first_day, last_day = _local_date(instance.start_date), _local_date(instance.end_date)
+    transaction.on_commit(lambda: invalidate_closing(first_day, last_day))
+
+
+@receiver(post_save, sender=Guest)
+def guest_billing_changed(sender, instance, created, **kwargs):
+    if created or not instance.changed_fields('name', 'cpf', 'company_id'):
+        return
+
+    period = Reservation.objects.filter(guest=instance).aggregate(
+        first=Min('start_date'), last=Max('end_date'), open=Max('pk', filter=Q(end_date__isnull=True))
+    )
+    if period['first'] is None:
+        return
+    first_day = _local_date(period['first'])
+    last_day = None if period['open'] else _local_date(period['last'])
+    loaded = getattr(instance, '_loaded_values', {})
+    company_ids = [instance.company_id, loaded.get('company_id', instance.company_id)]
+    transaction.on_commit(lambda: invalidate_closing(first_day, last_day, company_ids))
+
+
+@receiver([post_save, post_delete], sender=Meal)
+def meal_billing_changed(sender, instance, **kwargs):
+    # A refeição entra na fatura pelo CPF (não pela empresa do ticket)
+    day = _local_date(instance.created_at)
+    transaction.on_commit(lambda: invalidate_closing(day, day))
+
+
+@receiver(post_save, sender=Company)
+def company_billing_changed(sender, instance, created, **kwargs):
+    if not created and instance.changed_fields('name'):
+        transaction.on_commit(lambda: invalidate_closing(date.min, None, [instance.pk]))
+
+
+@receiver([post_save, post_delete], sender=CompanyRate)
+def company_rate_changed(sender, instance, **kwargs):
+    # Vigência antiga e nova: os dois períodos mudam de valor
+    loaded = getattr(instance, '_loaded_values', {})
+    starts = [instance.valid_from, loaded.get('valid_from', instance.valid_from)]
+    ends = [instance.valid_to, loaded.get('valid_to', instance.valid_to)]
+    last_day = None if None in ends else max(ends)
+    transaction.on_commit(lambda: invalidate_closing(min(starts), last_day, [instance.company_id]))
+
+
+# ==============================================================================
+# BUSCA GERAL (search.py)
+# Reindexada na mesma transação: a reserva (hóspede, quartos e histórico) a
+# cada gravação; as reservas do hóspede/empresa quando muda o que é buscado.
+# Renumerar quartos pede 'reindexar_busca'.
+# ==============================================================================
+
+@receiver(post_save, sender=Reservation)
+def reservation_search_changed(sender, instance, **kwargs):
+    index_reservations([instance.pk])
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_search_deleted(sender, instance, **kwargs):
+    unindex_reservations([instance.pk])
+
+
+@receiver(post_save, sender=Guest)
+def guest_search_changed(sender, instance, created, **kwargs):
+    if not created and instance.changed_fields('name', 'cpf', 'phone', 'company_id'):
+        index_reservations(Reservation.objects.filter(guest=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Company)
+def company_search_changed(sender, instance, created, **kwargs):
+    if not created and instance.changed_fields('name'):
+        index_reservations(Reservation.objects.filter(guest__company=instance).values_list('pk', flat=True))
+
+
+# ==============================================================================
+# USUÁRIO EM CACHE (auth.py)
+# Senha, desativação ou último login: a próxima requisição relê o usuário.
+# ==============================================================================
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def cached_user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: forget_user(user_id))
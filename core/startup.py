@@ -0,0 +1,48 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+
+from . import search
+
+
+# ==============================================================================
+# PREPARO DO SERVIDOR (run_waitress.py / run_uvicorn.py)
+# ==============================================================================
+
+SOURCES_FILE = '.tybis-origem'  # impressão dos arquivos de origem do último collectstatic
+IGNORE_PATTERNS = ['CVS', '.*', '*~']  # os mesmos que o collectstatic ignora
+
+
+def _static_sources():
+    """ Impressão (nome, tamanho, data) de todos os arquivos que o collectstatic copiaria. """
+    entries = []
+    for finder in finders.get_finders():
+        for path, storage in finder.list(IGNORE_PATTERNS):
+            stat = os.stat(storage.path(path))
+            entries.append(f'{path}\0{stat.st_size}\0{stat.st_mtime_ns}')
+    return hashlib.sha256('\n'.join(sorted(entries)).encode()).hexdigest()
+
+
+def preparar_arquivos_estaticos(logger):
+    """
+    Roda o collectstatic quando falta o manifesto ou algum arquivo estático
+    mudou (atualização do sistema): com DEBUG desligado, um nome fora do
+    manifesto derruba as páginas. Sem mudanças, não refaz a compressão.
+    """
+    root = settings.STATIC_ROOT
+    current = _static_sources()
+    stamp = root / SOURCES_FILE
+    if (root / 'staticfiles.json').exists() and stamp.exists() and stamp.read_text() == current:
+        return
+    logger.info("📦 Gerando arquivos estáticos (collectstatic)...")
+    call_command('collectstatic', interactive=False, verbosity=0)
+    stamp.write_text(current)
+
+
+def preparar_busca(logger):
+    """ Índice da busca completo antes de abrir: o preenchimento não cai na primeira gravação da recepção. """
+    if search.ensure_complete() is None:
+        logger.warning("Busca geral sem índice (banco sem FTS5/pg_trgm): usando LIKE nos cadastros")
@@ -0,0 +1,239 @@
+import re
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Bed, Reservation, StaySegment
+from .utils import local_range
+
+
+# ==============================================================================
+# ESTADIAS (Trechos de ocupação por cama)
+#
+# Cada reserva hospedada tem um ou mais trechos (cama, início, fim). O check-in
+# abre o primeiro trecho, a troca de quarto fecha o atual e abre outro, o
+# checkout fecha o último. A gravação acontece no post_save da reserva
+# (signals.py), dentro da mesma transação das views e do Admin.
+# Consultas por quarto/período viram buscas por intervalo nos índices
+# (cama, início) em vez de ler o histórico em JSON de cada reserva.
+# ==============================================================================
+
+def sync_stay(res, created=False, when=None):
+    """
+    Ajusta os trechos à reserva gravada: hospedada = trecho aberto na cama
+    atual; finalizada = trecho fechado na saída. Pré-reserva não ocupa cama.
+    """
+    if res.status == 'PRE':
+        return
+    when = when or timezone.now()
+
+    if created:
+        StaySegment.objects.create(
+            reservation=res, bed_id=res.bed_id, start=res.start_date,
+            end=res.end_date if res.status == 'FINISHED' else None
+        )
+        return
+
+    current = res.stays.filter(end__isnull=True).first()
+    if res.status == 'ACTIVE':
+        if current is None:
+            # Check-in (ou reserva reaberta): novo trecho a partir de agora
+            start = when if res.stays.exists() else res.start_date
+            StaySegment.objects.create(reservation=res, bed_id=res.bed_id, start=start)
+        elif current.bed_id != res.bed_id:
+            if when <= current.start:
+                # Trocou de cama no mesmo instante do check-in: corrige o trecho
+                StaySegment.objects.filter(pk=current.pk).update(bed_id=res.bed_id)
+            else:
+                StaySegment.objects.filter(pk=current.pk).update(end=when)
+                StaySegment.objects.create(reservation=res, bed_id=res.bed_id, start=when)
+
+    elif res.status == 'FINISHED':
+        end = res.end_date or when
+        if current is not None:
+            StaySegment.objects.filter(pk=current.pk).update(end=max(end, current.start))
+        elif not res.stays.exists():
+            StaySegment.objects.create(reservation=res, bed_id=res.bed_id, start=res.start_date, end=end)
+
+
+def new_stays(reservations):
+    """ Trechos iniciais de reservas criadas em lote (bulk_create não dispara sinais). """
+    return [
+        StaySegment(reservation=res, bed_id=res.bed_id, start=res.start_date)
+        for res in reservations if res.status == 'ACTIVE'
+    ]
+
+
+# ==============================================================================
+# CONSULTAS POR PERÍODO
+# ==============================================================================
+
+def stays_in_period(filter_start, filter_end):
+    """ Trechos que tocam o período (datas locais, inclusivo). """
+    start, end = local_range(filter_start, filter_end)
+    return StaySegment.objects.filter(start__lt=end).filter(Q(end__gt=start) | Q(end__isnull=True))
+
+
+def climate_timelines(reservations, filter_start, filter_end):
+    """
+    Climatização de cada reserva ao longo do período:
+    {reservation_id: [(primeiro dia local, climatização), ...]}.
+    Reservas sem trechos (pré-reservas) ficam de fora.
+    """
+    tz = timezone.get_current_timezone()
+    timelines = defaultdict(list)
+    for reservation_id, start, climate in stays_in_period(filter_start, filter_end).filter(
+        reservation__in=reservations.order_by().values('pk')
+    ).order_by('reservation_id', 'start').values_list('reservation_id', 'start', 'bed__room__climate'):
+        timeline = timelines[reservation_id]
+        if not timeline or timeline[-1][1] != climate:
+            timeline.append((start.astimezone(tz).date(), climate))
+    return timelines
+
+
+def _nights(start, end, range_start, range_end, tz):
+    """ Noites (datas locais) do trecho dentro do intervalo [range_start, range_end). """
+    first = max(start, range_start).astimezone(tz).date()
+    last = min(end or timezone.now(), range_end).astimezone(tz).date()
+    return max((last - first).days, 0)
+
+
+def room_history(room, filter_start, filter_end):
+    """ Trechos de um quarto no período, do mais antigo ao mais recente, com as noites no período. """
+    range_start, range_end = local_range(filter_start, filter_end)
+    tz = timezone.get_current_timezone()
+    segments = list(
+        stays_in_period(filter_start, filter_end).filter(bed__room=room)
+        .select_related('bed', 'reservation__guest__company').order_by('start')
+    )
+    for segment in segments:
+        segment.nights = _nights(segment.start, segment.end, range_start, range_end, tz)
+    return segments
+
+
+def nights_by_room(filter_start, filter_end):
+    """ {room_id: {'nights', 'stays', 'guests'}} dos trechos que tocam o período. """
+    range_start, range_end = local_range(filter_start, filter_end)
+    tz = timezone.get_current_timezone()
+    totals = defaultdict(lambda: {'nights': 0, 'stays': 0, 'guests': set()})
+    for room_id, reservation_id, start, end in stays_in_period(filter_start, filter_end).values_list(
+        'bed__room_id', 'reservation_id', 'start', 'end'
+    ):
+        item = totals[room_id]
+        item['nights'] += _nights(start, end, range_start, range_end, tz)
+        item['stays'] += 1
+        item['guests'].add(reservation_id)
+    return {room_id: {**item, 'guests': len(item['guests'])} for room_id, item in totals.items()}
+
+
+# ==============================================================================
+# RECONSTRUÇÃO A PARTIR DO HISTÓRICO (comando gerar_estadias)
+# Reservas anteriores aos trechos só têm o histórico em texto:
+#   'Reserva Criada'      "Quarto 101" ou "Quarto 101 - Cama A" (importação)
+#   'Mudança de Quarto'   "De 101 - A para 102 - B" (antigo: "Para 102 - B")
+# ==============================================================================
+
+_CREATED = re.compile(r'^Quarto (?P<room>\S+)(?: - Cama (?P<bed>.+))?$')
+_ROOM_CHANGE = re.compile(r'^(?:De (?P<origin>.+?) )?[Pp]ara (?P<target>.+)$')
+
+
+class BedLookup:
+    """ Camas por (número do quarto, nome da cama) e a primeira cama de cada quarto. """
+
+    def __init__(self):
+        self.by_label = {}
+        self.first_in_room = {}
+        for bed_id, bed_name, room_number in Bed.objects.order_by('room__number', 'name').values_list(
+            'id', 'name', 'room__number'
+        ):
+            self.by_label[(room_number, bed_name.upper())] = bed_id
+            self.first_in_room.setdefault(room_number, bed_id)
+
+    def label(self, text):
+        """ '101 - A' -> bed_id (None se não existir). """
+        room_number, _, bed_name = (text or '').partition(' - ')
+        return self.by_label.get((room_number.strip(), bed_name.strip().upper()))
+
+    def created(self, details):
+        match = _CREATED.match(details or '')
+        if not match:
+            return None
+        if match['bed']:
+            return self.by_label.get((match['room'], match['bed'].strip().upper()))
+        return self.first_in_room.get(match['room'])  # Só o quarto foi registrado
+
+
+def _log_time(entry):
+    try:
+        return timezone.make_aware(datetime.strptime(entry['data'], '%d/%m/%Y %H:%M'))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def segments_from_history(res, beds):
+    """
+    Trechos de uma reserva hospedada/finalizada reconstruídos do histórico.
+    Sem a cama de origem registrada, o primeiro trecho usa o primeiro destino;
+    o último trecho é sempre a cama atual da reserva.
+    """
+    origin, moves = None, []
+    for entry in res.history or ():
+        action, details = entry.get('acao', ''), entry.get('detalhes') or ''
+        if action.startswith('Reserva Criada'):
+            origin = beds.created(details) or origin
+        elif action == 'Mudança de Quarto' and (match := _ROOM_CHANGE.match(details)):
+            moved_at, target = _log_time(entry), beds.label(match['target'])
+            if moved_at is None or target is None:
+                continue
+            if origin is None and match['origin']:
+                origin = beds.label(match['origin'])
+            moves.append((moved_at, target))
+
+    moves.sort()
+    bed_id = origin or (moves[0][1] if moves else res.bed_id)
+    segments, start = [], res.start_date
+    for moved_at, target in moves:
+        if moved_at <= start:
+            bed_id = target  # Troca antes do check-in
+        elif target != bed_id:
+            segments.append(StaySegment(reservation=res, bed_id=bed_id, start=start, end=moved_at))
+            bed_id, start = target, moved_at
+
+    end = res.end_date if res.status == 'FINISHED' else None
+    if end is not None and end < start:
+        end = start
+    segments.append(StaySegment(reservation=res, bed_id=res.bed_id, start=start, end=end))
+    return segments
+
+
+def backfill(rebuild=False, batch_size=500):
+    """
+    Gera os trechos das reservas hospedadas/finalizadas que ainda não os têm
+    (rebuild=True: apaga e refaz todos a partir do histórico). Retorna (reservas, trechos).
+    """
+    reservations = Reservation.objects.exclude(status='PRE').order_by('pk')
+    if not rebuild:
+        return _create_segments(reservations.filter(stays__isnull=True), batch_size)
+
+    # Apagar e refazer juntos: uma falha no meio não deixa o fechamento sem trechos
+    with transaction.atomic():
+        StaySegment.objects.all().delete()
+        return _create_segments(reservations, batch_size)
+
+
+def _create_segments(reservations, batch_size):
+    beds = BedLookup()
+    total_reservations = total_segments = 0
+    last_pk = 0
+    while True:
+        chunk = list(reservations.filter(pk__gt=last_pk)[:batch_size])
+        if not chunk:
+            return total_reservations, total_segments
+        segments = [segment for res in chunk for segment in segments_from_history(res, beds)]
+        StaySegment.objects.bulk_create(segments)
+        total_reservations += len(chunk)
+        total_segments += len(segments)
+        last_pk = chunk[-1].pk
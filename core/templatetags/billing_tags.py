@@ -0,0 +1,13 @@
+from django import template
+
+from core.utils import format_money
+
+register = template.Library()
+
+
+@register.filter
+def reais(cents):
+    """ Valor em centavos no formato 'R$ 1.234,56' ('' se vazio). """
+    if cents in (None, ''):
+        return ''
+    return f"R$ {format_money(cents)}"
@@ -0,0 +1,32 @@
+from django import template
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from core.reporting import describe_lag, lag, snapshot_time
+
+register = template.Library()
+
+
+@register.inclusion_tag('core/reports/partials/freshness.html')
+def report_freshness():
+    """ De quando são os dados do relatório (só quando ele lê a cópia, TYBIS_REPORTING_LAG). """
+    interval = lag()
+    taken = snapshot_time() if interval else None
+    return {
+        'taken': taken,
+        'interval': describe_lag(interval) if interval else '',
+        # Cópia bem mais velha que o intervalo: a atualização parou (servidor sem o run_waitress?)
+        'stale': bool(taken) and (timezone.now() - taken).total_seconds() > 3 * interval,
+    }
+
+
+@register.simple_tag
+def meal_cells(cells):
+    """
+    Células dos dias no quadro de refeições ('almoços/jantas'; vazia sem refeição).
+    Montadas aqui e não com {% for %}: um ano de 100 empresas são ~37 mil células.
+    """
+    # Só números (contagens do banco): não há o que escapar
+    return mark_safe(''.join(
+        f'<td>{lunch}/{dinner}</td>' if lunch or dinner else '<td></td>' for lunch, dinner in cells
+    ))
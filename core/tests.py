@@ -1,3 +1,66 @@
+import io
+
 from django.test import TestCase
 
-# Create your tests here.
+from .importing import RosterError, import_roster, read_roster
+from .models import Bed, Company, Guest, Reservation, Room
+
+
+class ImportRosterCpfTests(TestCase):
+    """ Importação de hóspedes: o CPF identifica a pessoa em qualquer empresa. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.acme = Company.objects.create(name='ACME')
+        cls.other = Company.objects.create(name='Outra')
+        for number in ('1', '2'):
+            room = Room.objects.create(number=number)
+            for name in ('A', 'B'):
+                Bed.objects.create(room=room, name=name)
+
+    def _import(self, company, cpf='111.222.333-44'):
+        return import_roster([(2, {'name': 'Joao Silva', 'cpf': cpf, 'company': company.name})])
+
+    def test_same_company_reuses_guest(self):
+        guest = Guest.objects.create(name='Joao Silva', company=self.acme, cpf='111.222.333-44')
+        result = self._import(self.acme, cpf='11122233344')
+        self.assertEqual(len(result.created), 1)
+        self.assertEqual(Guest.objects.count(), 1)
+        self.assertEqual(Reservation.objects.get().guest, guest)
+
+    def test_other_company_fails_row(self):
+        Guest.objects.create(name='Joao Silva', company=self.acme, cpf='111.222.333-44')
+        result = self._import(self.other)
+        self.assertEqual(result.created, [])
+        self.assertIn('ACME', result.errors[0]['error'])
+        self.assertEqual(Guest.objects.count(), 1)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_hosted_under_other_company_is_rejected(self):
+        # Cadastros antigos com o mesmo CPF em duas empresas; hospedado pela ACME
+        hosted = Guest.objects.create(name='Joao Silva', company=self.acme, cpf='111.222.333-44')
+        Guest.objects.create(name='Joao Silva', company=self.other, cpf='11122233344')
+        Reservation.objects.create(guest=hosted, bed=Bed.objects.first(), status='PRE')
+        result = self._import(self.other)
+        self.assertEqual(result.created, [])
+        self.assertEqual(result.errors[0]['error'], "Hóspede já possui reserva ativa ou pré-reserva.")
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+class ReadRosterEncodingTests(TestCase):
+    """ CSV salvo pelo Excel em português vem em Windows-1252, não em UTF-8. """
+
+    def _rows(self, data):
+        return list(read_roster(io.BytesIO(data), 'lista.csv'))
+
+    def test_cp1252_csv(self):
+        rows = self._rows('Nome;CPF\nJoão Conceição;111.222.333-44\n'.encode('cp1252'))
+        self.assertEqual(rows, [(2, {'name': 'João Conceição', 'cpf': '111.222.333-44'})])
+
+    def test_utf8_csv_with_bom(self):
+        rows = self._rows('Nome;CPF\nJoão Conceição;111.222.333-44\n'.encode('utf-8-sig'))
+        self.assertEqual(rows[0][1]['name'], 'João Conceição')
+
+    def test_unknown_encoding_is_roster_error(self):
+        with self.assertRaises(RosterError):
+            self._rows(b'Nome;CPF\nJo\x81o;111.222.333-44\n')
@@ -0,0 +1,106 @@
+import logging
+import threading
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Meal, MealReprint
+from .printing import imprimir_ticket_refeicao
+from .utils import normalize_cpf
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# EMISSÃO DE TICKETS (Um por CPF, refeição e dia)
+#
+# A garantia é a restrição única do banco (Meal.meal_one_per_service): dois
+# balcões emitindo ao mesmo tempo não geram dois tickets, nem entre processos.
+# Na frente dela fica uma janela em memória com os tickets de hoje deste
+# processo: a repetição no mesmo balcão (o caso comum no pico do almoço) é
+# barrada sem consulta e sem disputar a trava de escrita do SQLite.
+# A janela é alimentada após o COMMIT (signals.py) e zera na virada do dia.
+# Reimprimir é uma ação explícita (2ª via) e fica registrada em MealReprint.
+# ==============================================================================
+
+class DuplicateTicket(Exception):
+    """ O CPF já recebeu esta refeição hoje; 'meal' é o ticket existente. """
+
+    def __init__(self, meal):
+        super().__init__(f"{meal.name} já recebeu o ticket de {meal.get_meal_type_display()} hoje.")
+        self.meal = meal
+
+
+_lock = threading.Lock()
+_window = {'day': None, 'tickets': {}}
+
+
+def _today_tickets(day):
+    """ Tickets da janela para o dia (zera na virada). Chamar com _lock. """
+    if _window['day'] != day:
+        _window.update(day=day, tickets={})
+    return _window['tickets']
+
+
+def remember(meal):
+    """ Inclui o ticket gravado na janela, se for de hoje e tiver CPF. """
+    if not meal.cpf_key or meal.service_date != timezone.localdate():
+        return
+    with _lock:
+        _today_tickets(meal.service_date)[(meal.cpf_key, meal.meal_type)] = meal.pk
+
+
+def forget(meal_pk):
+    """ Tira o ticket da janela (alterado ou apagado). """
+    with _lock:
+        tickets = _window['tickets']
+        for key in [key for key, pk in tickets.items() if pk == meal_pk]:
+            del tickets[key]
+
+
+def find_issued(cpf, meal_type, day=None):
+    """ Ticket já emitido para o CPF nesta refeição (janela primeiro, depois o banco). """
+    cpf_key = normalize_cpf(cpf)
+    if not cpf_key:
+        return None
+    day = day or timezone.localdate()
+    with _lock:
+        pk = _today_tickets(day).get((cpf_key, meal_type)) if day == timezone.localdate() else None
+    meals = Meal.objects.select_related('company')
+    if pk is not None:
+        return meals.filter(pk=pk).first()
+    return meals.filter(cpf_key=cpf_key, meal_type=meal_type, service_date=day).first()
+
+
+def issue_ticket(meal):
+    """
+    Grava o ticket novo. Lança DuplicateTicket (com o ticket existente) se o
+    CPF já recebeu esta refeição hoje; nesse caso nada é gravado.
+    """
+    cpf_key = normalize_cpf(meal.cpf)
+    if cpf_key:
+        with _lock:
+            pk = _today_tickets(timezone.localdate()).get((cpf_key, meal.meal_type))
+        if pk is not None:
+            existing = Meal.objects.select_related('company').filter(pk=pk).first()
+            if existing is not None:
+                raise DuplicateTicket(existing)
+
+    try:
+        with transaction.atomic():
+            meal.save()
+    except IntegrityError:
+        # Emitido por outro balcão/processo que esta janela ainda não viu
+        existing = find_issued(meal.cpf, meal.meal_type, meal.service_date)
+        if existing is None:
+            raise
+        remember(existing)
+        raise DuplicateTicket(existing)
+    return meal
+
+
+def reprint_ticket(meal, user):
+    """ Imprime a 2ª via do ticket e registra quem pediu. Retorna se a impressão deu certo. """
+    MealReprint.objects.create(meal=meal, user=user)
+    logger.info("2ª via do ticket %s (%s) por %s", meal.pk, meal, user)
+    return imprimir_ticket_refeicao(meal, segunda_via=True)
@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
 
+# Modo ASGI (run_uvicorn.py): fragmentos HTMX de leitura nas versões async
+if settings.TYBIS_ASGI:
+    from . import async_views as htmx_views
+else:
+    htmx_views = views
+
 urlpatterns = [
     # ==========================================================================
     # AUTENTICAÇÃO
@@ -12,7 +19,7 @@ urlpatterns = [
     # ==========================================================================
     # DASHBOARD & NAVEGAÇÃO PRINCIPAL
     # ==========================================================================
-    path('', views.dashboard, name='dashboard'),
+    path('', htmx_views.dashboard, name='dashboard'),
 
     # ==========================================================================
     # GESTÃO DE EMPRESAS
@@ -25,12 +32,16 @@ urlpatterns = [
     # OPERACIONAL - REFEIÇÕES
     # ==========================================================================
     path('refeicoes/', views.meal_control, name='meal_control'),
+    path('refeicoes/<int:pk>/reimprimir/', views.meal_reprint, name='meal_reprint'),
+    path('cozinha/', views.kitchen_board, name='kitchen_board'),
+    path('cozinha/painel/', htmx_views.kitchen_board_panel, name='kitchen_board_panel'),
 
     # ==========================================================================
     # OPERACIONAL - RESERVAS (CRIAÇÃO)
     # ==========================================================================
     path('reserva/nova/', views.new_reservation_modal, name='new_reservation_modal'),
     path('reserva/criar/', views.create_reservation, name='create_reservation'),
+    path('reserva/importar/', views.reservation_import, name='reservation_import'),
 
     # ==========================================================================
     # RELATÓRIOS
@@ -38,7 +49,12 @@ urlpatterns = [
     path('relatorios/ocupacao/', views.occupancy_report, name='occupancy_report'),
     path('relatorios/camas-livres/', views.free_beds_report, name='free_beds_report'),
     path('relatorios/refeicoes/', views.meal_report, name='meal_report'),
+    path('relatorios/quartos/', views.room_history_report, name='room_history_report'),
     path('relatorios/fechamento/', views.closing_report, name='closing_report'),
+    path('relatorios/fechamento/faturas/', views.closing_invoices, name='closing_invoices'),
+    path('relatorios/arquivos/', views.job_list, name='job_list'),
+    path('relatorios/arquivos/<int:pk>/', htmx_views.job_detail, name='job_detail'),
+    path('relatorios/arquivos/<int:pk>/baixar/', views.job_download, name='job_download'),
 
     # ==========================================================================
     # ENDPOINTS HTMX (AÇÕES DINÂMICAS)
@@ -46,7 +62,8 @@ urlpatterns = [
     # ==========================================================================
 
     # Filtros e Buscas
-    path('htmx/camas-disponiveis/', views.get_available_beds_htmx, name='htmx_available_beds'),
+    path('htmx/camas-disponiveis/', htmx_views.get_available_beds_htmx, name='htmx_available_beds'),
+    path('api/v1/camas-livres/', views.available_beds_api, name='api_available_beds'),
 
     # Ações na Reserva/Cama
     path('reserva/<int:pk>/mala/', views.toggle_luggage, name='toggle_luggage'),
@@ -66,4 +83,20 @@ urlpatterns = [
 
     # Manutenção de Quarto
     path('quarto/<int:pk>/manutencao/', views.toggle_maintenance, name='toggle_maintenance'),
-]
\ No newline at end of file
+
+    # ==========================================================================
+    # BUSCA GERAL
+    # ==========================================================================
+    path('busca/', views.guest_search, name='guest_search'),
+
+    # ==========================================================================
+    # SISTEMA
+    # ==========================================================================
+    path('sistema/cache/', views.cache_stats, name='cache_stats'),
+]
+
+if settings.TYBIS_ASGI:
+    # Quadro da cozinha ao vivo: só existe no servidor ASGI (conexões abertas sem thread)
+    urlpatterns.append(
+        path('cozinha/eventos/', htmx_views.kitchen_board_events, name='kitchen_board_events')
+    )
@@ -0,0 +1,63 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+# ==============================================================================
+# DATAS NO FUSO LOCAL
+# As datas são gravadas em UTC. Filtrar com '__date' aplica uma função sobre a
+# coluna e impede o uso de índices; por isso convertemos o dia local em um
+# intervalo [início, fim) de datetimes "aware" e filtramos com __gte/__lt.
+# ==============================================================================
+
+def local_day_start(day):
+    """
+    Retorna o datetime (aware) da meia-noite local do dia informado.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def local_range(start_day, end_day):
+    """
+    Converte um período inclusivo de datas locais em um intervalo [início, fim).
+    Uso: Meal.objects.filter(created_at__gte=inicio, created_at__lt=fim)
+    """
+    return local_day_start(start_day), local_day_start(end_day + timedelta(days=1))
+
+
+# ==============================================================================
+# CPF
+# O CPF é digitado de formas variadas ("111.222.333-44", "11122233344").
+# Para comparar registros usamos sempre só os dígitos.
+# ==============================================================================
+
+def normalize_cpf(value):
+    """
+    Retorna apenas os dígitos do CPF ('' se vazio).
+    """
+    return ''.join(ch for ch in str(value or '') if ch.isdigit())
+
+
+def format_cpf(digits):
+    """
+    Formata 11 dígitos no padrão 000.000.000-00 (outros valores voltam como vieram).
+    """
+    if len(digits) != 11:
+        return digits
+    return f"{digits[:3]}.{digits[3:6]}.{digits[6:9]}-{digits[9:]}"
+
+
+# ==============================================================================
+# VALORES (R$)
+# Os valores do fechamento são somados em centavos (inteiros), sem erro de
+# arredondamento; só viram texto na tela e no CSV.
+# ==============================================================================
+
+def format_money(cents, grouping=True):
+    """
+    Centavos -> '1.234,56' (grouping=False: '1234,56', para o Excel).
+    """
+    sign = '-' if cents < 0 else ''
+    reais, centavos = divmod(abs(int(cents)), 100)
+    reais = f"{reais:,}".replace(',', '.') if grouping else str(reais)
+    return f"{sign}{reais},{centavos:02d}"
@@ -1,37 +1,133 @@
 # core/views.py
 import json
-import csv
+import hashlib
+import time
 from datetime import datetime, date, timedelta
 
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.utils import timezone
+from django.db import transaction
+from django.db.models import Count, IntegerField, Q
 from django.db.models.functions import Cast
-from django.db.models import IntegerField, Count, Q
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, condition
 
 # Imports locais
-from .models import Room, Bed, Reservation, Guest, Company, Meal
-from .forms import GuestForm, CompanyForm, MealForm
+from .models import Room, Bed, Reservation, Guest, Company, Meal, BackgroundJob
+from .forms import GuestForm, CompanyForm, MealForm, RosterImportForm
+from .billing import closing_totals, find_snapshot, get_closing_report, write_closing_csv
+from .caching import (
+    get_companies, get_room_layout, get_bed_inventory, bed_inventory_etag, stats as cache_stats_data
+)
+from .companies import SORTS as COMPANY_SORTS, company_page
+from .consumption import MAX_DAYS, meal_pivot, write_meal_pivot_csv
+from .importing import RosterError, read_roster, import_roster, write_report
+from .jobs import JobLimitError, submit as submit_job
+from .kitchen import get_board, version as board_version
+from .occupancy import status_counts
 from .printing import imprimir_ticket_refeicao
+from .reporting import reporting_view
+from .search import search_reservations
+from .stays import nights_by_room, room_history
+from .tickets import DuplicateTicket, issue_ticket, reprint_ticket
 
 
 # ==============================================================================
 # 1. HELPERS & UTILITÁRIOS
 # ==============================================================================
 
-def _get_room_item(room):
+def _active_reservations(**filters):
+    """ Reservas ACTIVE/PRE com hóspede e empresa (queryset, também usado pelas views async). """
+    return Reservation.objects.filter(
+        status__in=['ACTIVE', 'PRE'], **filters
+    ).select_related('guest__company').order_by('id')
+
+
+def _index_by_bed(reservations):
+    by_bed = {}
+    for res in reservations:
+        by_bed.setdefault(res.bed_id, res)
+    return by_bed
+
+
+def _active_reservations_by_bed(**filters):
+    """
+    Reservas ACTIVE/PRE indexadas pelo id da cama (uma única consulta).
+    """
+    return _index_by_bed(_active_reservations(**filters))
+
+
+# URLs dos cards do Dashboard: cada card de cama tem até 6 links. Em vez de
+# rodar {% url %} (reverse) ~1000 vezes por renderização, cada rota é
+# resolvida uma vez com um id marcador e depois só tem o id substituído.
+_URL_PLACEHOLDER = '987654321'
+_url_templates = {}
+
+
+def _url_for(name, pk=None):
+    if pk is None:
+        if name not in _url_templates:
+            _url_templates[name] = reverse(name)
+        return _url_templates[name]
+
+    template = _url_templates.get(name)
+    if template is None:
+        template = _url_templates[name] = reverse(name, args=[int(_URL_PLACEHOLDER)])
+    return template.replace(_URL_PLACEHOLDER, str(pk))
+
+
+def _bed_urls(res):
+    """
+    Links usados em bed_card.html (pré-calculados).
+    """
+    if not res:
+        return {'new_reservation': _url_for('new_reservation_modal')}
+    return {
+        'guest_edit': _url_for('guest_edit_modal', res.guest_id),
+        'edit_checkin': _url_for('edit_checkin_modal', res.id),
+        'change_room': _url_for('change_room_modal', res.id),
+        'cancel': _url_for('cancel_reservation', res.id),
+        'toggle_luggage': _url_for('toggle_luggage', res.id),
+        'checkout': _url_for('checkout', res.id),
+    }
+
+
+def _room_version(room, status_code, beds_data):
+    """
+    Carimbo do conteúdo do card: muda sempre que algo exibido no card muda.
+    Usado como chave do cache de fragmento (dashboard_grid.html).
+    """
+    parts = [room.id, room.number, room.climate, room.is_maintenance, status_code]
+    for info in beds_data:
+        bed, res = info['bed'], info['res']
+        parts.append((bed.id, bed.name))
+        if res:
+            parts.append((res.id, res.status, res.has_luggage, res.guest_id,
+                          res.guest.name, res.guest.company_id, res.guest.company.name))
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _get_room_item(room, beds=None, reservations_by_bed=None):
     """
     Constrói o dicionário de dados de um quarto para exibição no Dashboard.
+    No Dashboard, camas e reservas já chegam carregadas; nas ações isoladas
+    (checkout, cancelamento) são buscadas aqui.
     """
+    if beds is None:
+        beds = room.beds.order_by('name', 'id')
+    if reservations_by_bed is None:
+        reservations_by_bed = _active_reservations_by_bed(bed__room=room)
+
     beds_data = []
     has_active = False
     has_pre = False
 
-    for bed in room.beds.all():
-        res = bed.reservations.filter(status__in=['ACTIVE', 'PRE']).first()
-        beds_data.append({'bed': bed, 'res': res})
+    for bed in beds:
+        res = reservations_by_bed.get(bed.id)
+        beds_data.append({'bed': bed, 'res': res, 'urls': _bed_urls(res)})
         if res:
             if res.status == 'ACTIVE':
                 has_active = True
@@ -60,40 +156,27 @@ def _get_room_item(room):
         'beds': beds_data,
         'status_class': status_class,
         'status_icon': status_icon,
-        'status_code': status_code
+        'status_code': status_code,
+        'maintenance_url': _url_for('toggle_maintenance', room.id),
+        'version': _room_version(room, status_code, beds_data),
     }
 
 
 def get_available_beds_query(company_id=None):
     """
     Retorna camas disponíveis, respeitando a regra de empresas diferentes.
+    Quartos com hóspede (ACTIVE/PRE) de outra empresa ficam de fora pela
+    empresa gravada no quarto (Room.occupying_company).
     """
     available_beds = Bed.objects.filter(room__is_maintenance=False).exclude(
         reservations__status__in=['ACTIVE', 'PRE']
-    )
+    ).select_related('room')
 
     if not company_id:
         return available_beds
 
-    valid_bed_ids = []
-    target_company_id = int(company_id)
-
-    for bed in available_beds:
-        roommates = Reservation.objects.filter(
-            bed__room=bed.room,
-            status__in=['ACTIVE', 'PRE']
-        )
-
-        can_enter = True
-        for roommate in roommates:
-            if roommate.guest.company.id != target_company_id:
-                can_enter = False
-                break
-
-        if can_enter:
-            valid_bed_ids.append(bed.id)
-
-    return available_beds.filter(id__in=valid_bed_ids)
+    # Quarto vazio ou só com a mesma empresa (colunas mantidas, ver occupancy.py)
+    return available_beds.filter(Q(room__status='FREE') | Q(room__occupying_company_id=int(company_id)))
 
 
 # ==============================================================================
@@ -102,38 +185,19 @@ def get_available_beds_query(company_id=None):
 
 @login_required
 def dashboard(request):
-    rooms = Room.objects.annotate(
-        numero_ordenado=Cast('number', IntegerField())
-    ).order_by('numero_ordenado')
-
-    full_data = [_get_room_item(room) for room in rooms]
-
-    # Contagem para os botões de filtro
-    counts = {
-        'total': len(full_data),
-        'free': 0,
-        'occupied': 0,
-        'pre': 0,
-        'maintenance': 0
-    }
-
-    for item in full_data:
-        code = item['status_code']
-        if code == 'FREE':
-            counts['free'] += 1
-        elif code == 'OCCUPIED':
-            counts['occupied'] += 1
-        elif code == 'PRE':
-            counts['pre'] += 1
-        elif code == 'MAINTENANCE':
-            counts['maintenance'] += 1
-
-    # Filtro
+    # Layout (quartos/camas) vem do cache; só as reservas são lidas do banco
     filter_type = request.GET.get('filter')
     if filter_type and filter_type != 'ALL':
-        dashboard_data = [item for item in full_data if item['status_code'] == filter_type]
+        # Filtro pela situação gravada no quarto (índice): só os quartos exibidos
+        # e as reservas deles são lidos
+        room_ids = set(Room.objects.filter(status=filter_type).values_list('pk', flat=True))
+        rooms = [room for room in get_room_layout() if room.pk in room_ids]
+        reservations_by_bed = _active_reservations_by_bed(bed__room_id__in=room_ids)
     else:
-        dashboard_data = full_data
+        rooms = get_room_layout()
+        reservations_by_bed = _active_reservations_by_bed()
+
+    dashboard_data = [_get_room_item(room, room.layout_beds, reservations_by_bed) for room in rooms]
 
     if request.htmx:
         return render(request, 'core/partials/dashboard_grid.html', {'dashboard_data': dashboard_data})
@@ -141,7 +205,7 @@ def dashboard(request):
     return render(request, 'core/dashboard.html', {
         'dashboard_data': dashboard_data,
         'current_filter': filter_type,
-        'counts': counts
+        'counts': status_counts()  # botões de filtro
     })
 
 
@@ -151,9 +215,11 @@ def dashboard(request):
 
 @login_required
 def new_reservation_modal(request):
+    # As camas são carregadas pelo próprio modal via API (available_beds_api)
     form = GuestForm()
-    beds = get_available_beds_query(None)
-    return render(request, 'core/modals/new_reservation.html', {'form': form, 'beds': beds})
+    return render(request, 'core/modals/new_reservation.html', {
+        'form': form, 'companies': get_companies()
+    })
 
 
 @login_required
@@ -164,6 +230,20 @@ def get_available_beds_htmx(request):
 
 
 @login_required
+@condition(etag_func=lambda request: bed_inventory_etag())
+def available_beds_api(request):
+    """
+    API v1: inventário completo de camas livres em um único JSON compacto.
+    O filtro por empresa é feito no navegador. Com o ETag, reaberturas do
+    modal sem mudança de ocupação recebem 304 sem consultar o banco.
+    """
+    response = JsonResponse(get_bed_inventory())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+@transaction.atomic  # reserva e trechos de estadia (stays.py) juntos
 def create_reservation(request):
     if request.method == 'POST':
         form = GuestForm(request.POST)
@@ -183,24 +263,54 @@ def create_reservation(request):
                 guest = form.save()
                 bed = get_object_or_404(Bed, pk=bed_id)
                 status = 'PRE' if is_pre else 'ACTIVE'
-                res = Reservation.objects.create(guest=guest, bed=bed, status=status)
+                res = Reservation(guest=guest, bed=bed, status=status)
                 res.add_log(request.user, "Reserva Criada", f"Quarto {bed.room.number}")
+                res.save()
 
                 response = HttpResponse(status=204)
                 response['HX-Refresh'] = "true"
                 return response
 
-        company_id = request.POST.get('company')
-        beds = get_available_beds_query(company_id) if company_id else []
         return render(request, 'core/modals/new_reservation.html', {
             'form': form,
-            'beds': beds,
+            'companies': get_companies(),
             'selected_bed_id': int(bed_id) if bed_id else None
         })
 
     return HttpResponse("Método não permitido", status=405)
 
 
+@login_required
+def reservation_import(request):
+    """ Importação em lote da lista de hóspedes enviada pela empresa. """
+    result = None
+    if request.method == 'POST':
+        form = RosterImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                rows = read_roster(upload.file, upload.name)
+                result = import_roster(
+                    rows, user=request.user,
+                    default_company=form.cleaned_data['company'],
+                    status=form.cleaned_data['status'],
+                    dry_run=form.cleaned_data['dry_run']
+                )
+            except RosterError as e:
+                form.add_error('file', str(e))
+
+            if result and form.cleaned_data['download_report']:
+                response = HttpResponse(content_type='text/csv; charset=utf-8')
+                response['Content-Disposition'] = 'attachment; filename="importacao.csv"'
+                response.write('\ufeff')
+                write_report(result, response)
+                return response
+    else:
+        form = RosterImportForm()
+
+    return render(request, 'core/reservation_import.html', {'form': form, 'result': result})
+
+
 @login_required
 def edit_checkin_modal(request, pk):
     res = get_object_or_404(Reservation, pk=pk)
@@ -210,6 +320,7 @@ def edit_checkin_modal(request, pk):
 
 @login_required
 @require_http_methods(["POST"])
+@transaction.atomic
 def confirm_checkin(request, pk):
     res = get_object_or_404(Reservation, pk=pk)
     form = GuestForm(request.POST, instance=res.guest)
@@ -229,6 +340,7 @@ def confirm_checkin(request, pk):
 
 
 @login_required
+@transaction.atomic
 def checkout(request, pk):
     res = get_object_or_404(Reservation, pk=pk)
     res.status = 'FINISHED'
@@ -257,7 +369,7 @@ def toggle_luggage(request, pk):
     res.has_luggage = not res.has_luggage
     res.add_log(request.user, "Mala: " + str(res.has_luggage))
     res.save()
-    return render(request, 'core/partials/bed_card.html', {'bed': res.bed, 'res': res})
+    return render(request, 'core/partials/bed_card.html', {'bed': res.bed, 'res': res, 'urls': _bed_urls(res)})
 
 
 @login_required
@@ -268,12 +380,13 @@ def change_room_modal(request, pk):
 
 
 @login_required
+@transaction.atomic
 def change_room(request, pk):
     res = get_object_or_404(Reservation, pk=pk)
     new_bed_id = request.POST.get('new_bed_id')
     if new_bed_id:
         new_bed = get_object_or_404(Bed, pk=new_bed_id)
-        res.add_log(request.user, "Mudança de Quarto", f"Para {new_bed}")
+        res.add_log(request.user, "Mudança de Quarto", f"De {res.bed} para {new_bed}")
         res.bed = new_bed
         res.save()
         response = HttpResponse(status=204)
@@ -283,10 +396,11 @@ def change_room(request, pk):
 
 
 @login_required
+@transaction.atomic
 def toggle_maintenance(request, pk):
     room = get_object_or_404(Room, pk=pk)
     if not room.is_maintenance:
-        if Reservation.objects.filter(bed__room=room, status__in=['ACTIVE', 'PRE']).exists():
+        if room.occupied_beds or room.pre_beds:
             response = HttpResponse(status=204)
             response['HX-Trigger'] = json.dumps({"showAlert": "Quarto Ocupado!"})
             return response
@@ -316,10 +430,34 @@ def guest_edit_modal(request, pk):
 # 4. GESTÃO DE EMPRESAS
 # ==============================================================================
 
+COMPANY_COLUMNS = [
+    # (ordenação, título, primeiro clique decrescente)
+    ('name', 'Nome', False),
+    ('in_house', 'No Hotel', True),
+    ('rooms', 'Quartos', True),
+    ('meals', 'Refeições no Mês', True),
+    ('nights', 'Diárias no Mês', True),
+]
+
+
 @login_required
 def company_list(request):
-    companies = Company.objects.all()
-    return render(request, 'core/company_list.html', {'companies': companies})
+    """ Empresas com hóspedes, quartos, refeições e diárias do mês (uma consulta, companies.py). """
+    sort = request.GET.get('sort', 'name')
+    if sort.lstrip('-') not in COMPANY_SORTS:
+        sort = 'name'
+    page = company_page(sort, request.GET.get('page'))
+
+    columns = []
+    for key, title, descending in COMPANY_COLUMNS:
+        current = sort.lstrip('-') == key
+        if current:
+            next_sort = key if sort.startswith('-') else f'-{key}'  # clicar de novo inverte
+        else:
+            next_sort = f'-{key}' if descending else key
+        columns.append({'title': title, 'sort': next_sort, 'active': current, 'descending': sort.startswith('-')})
+
+    return render(request, 'core/company_list.html', {'page': page, 'companies': page.object_list, 'columns': columns})
 
 
 @login_required
@@ -356,7 +494,11 @@ def meal_control(request):
     if request.method == 'POST':
         form = MealForm(request.POST)
         if form.is_valid():
-            meal = form.save()
+            try:
+                meal = issue_ticket(form.save(commit=False))
+            except DuplicateTicket as e:
+                # Nada foi gravado: o operador decide se imprime a 2ª via
+                return render(request, 'core/partials/meal_form_content.html', {'form': form, 'duplicate': e.meal})
             imprimiu = imprimir_ticket_refeicao(meal)
             msg = f"Refeição de {meal.name} salva!" + (" (Impressão OK)" if imprimiu else " (Erro Impressão)")
             return render(request, 'core/partials/meal_form_content.html', {'form': MealForm(), 'success_message': msg})
@@ -365,11 +507,50 @@ def meal_control(request):
     return render(request, 'core/meal_control.html', {'form': form})
 
 
+@login_required
+@require_http_methods(["POST"])
+def meal_reprint(request, pk):
+    """ 2ª via de um ticket já emitido (registrada com o usuário). """
+    meal = get_object_or_404(Meal.objects.select_related('company'), pk=pk)
+    imprimiu = reprint_ticket(meal, request.user)
+    msg = f"2ª via do ticket de {meal.name} registrada!" + (" (Impressão OK)" if imprimiu else " (Erro Impressão)")
+    return render(request, 'core/partials/meal_form_content.html', {'form': MealForm(), 'success_message': msg})
+
+
+@login_required
+def kitchen_board(request):
+    """ Quadro da cozinha: tickets de hoje por empresa e quanto ainda deve sair. """
+    return render(request, 'core/kitchen_board.html', {
+        'version': board_version(), 'live_updates': settings.TYBIS_ASGI, **get_board()
+    })
+
+
+def kitchen_board_panel(request):
+    """
+    Atualização do quadro (HTMX, a cada poucos segundos). Enquanto o carimbo
+    enviado pela tela é o atual, responde 204 sem abrir a sessão nem consultar
+    o banco: dezenas de telas abertas custam só a leitura do carimbo no cache.
+    """
+    if request.GET.get('v') == board_version():
+        return HttpResponse(status=204)
+    return _kitchen_board_panel(request)
+
+
+@login_required
+def _kitchen_board_panel(request):
+    # Carimbo lido antes dos dados: um ticket no meio do caminho gera nova atualização
+    version = board_version()
+    return render(request, 'core/partials/kitchen_board_panel.html', {
+        'version': version, 'live_updates': settings.TYBIS_ASGI, **get_board()
+    })
+
+
 # ==============================================================================
 # 6. RELATÓRIOS
 # ==============================================================================
 
 @login_required
+@reporting_view
 def occupancy_report(request):
     """ Relatório 1: Ocupação por Empresa """
     reservations = Reservation.objects.filter(status='ACTIVE')
@@ -395,37 +576,42 @@ def occupancy_report(request):
 @login_required
 def free_beds_report(request):
     """ Relatório 2: Vagas em Quartos Ocupados (Otimização) """
-    companies = Company.objects.all()
-    report_data = []
-
-    for company in companies:
-        occupied_rooms = Room.objects.filter(
-            beds__reservations__guest__company=company,
-            beds__reservations__status='ACTIVE'
-        ).distinct().prefetch_related('beds')
-
-        available_slots = []
-        for room in occupied_rooms:
-            empty_beds = room.beds.exclude(reservations__status__in=['ACTIVE', 'PRE'])
-            if empty_beds.exists():
-                available_slots.append({'room': room, 'beds': list(empty_beds)})
+    # Camas livres em quartos com check-in de uma única empresa (uma consulta)
+    free_beds = Bed.objects.filter(
+        room__status='OCCUPIED', room__occupying_company__isnull=False
+    ).exclude(reservations__status__in=['ACTIVE', 'PRE']).annotate(
+        numero_ordenado=Cast('room__number', IntegerField())
+    ).select_related('room').order_by('numero_ordenado', 'room__number', 'name')
+
+    slots_by_company = {}
+    for bed in free_beds:
+        slots = slots_by_company.setdefault(bed.room.occupying_company_id, [])
+        if not slots or slots[-1]['room'].pk != bed.room_id:
+            slots.append({'room': bed.room, 'beds': []})
+        slots[-1]['beds'].append(bed)
 
+    report_data = []
+    for company in get_companies():
+        available_slots = slots_by_company.get(company.pk)
         if available_slots:
-            total_free = sum(len(item['beds']) for item in available_slots)
             report_data.append({
                 'company': company,
                 'slots': available_slots,
-                'total_free': total_free
+                'total_free': sum(len(item['beds']) for item in available_slots)
             })
 
     return render(request, 'core/reports/free_beds.html', {'report_data': report_data})
 
 
 @login_required
+@reporting_view
 def meal_report(request):
     """ Relatório 3: Histórico de Refeições com CSV """
+    companies = get_companies()
+    if request.GET.get('view') == 'pivot':
+        return _meal_pivot_report(request, companies)
+
     meals = Meal.objects.all().select_related('company').order_by('-created_at')
-    companies = Company.objects.all()
 
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
@@ -436,21 +622,12 @@ def meal_report(request):
     if company_id: meals = meals.filter(company_id=company_id)
 
     if request.GET.get('export') == 'csv':
-        response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-        response['Content-Disposition'] = f'attachment; filename="refeicoes.csv"'
-        writer = csv.writer(response, delimiter=';')
-        writer.writerow(['Data', 'Hora', 'Tipo', 'Nome', 'Empresa', 'CPF'])
-        for meal in meals:
-            local_dt = timezone.localtime(meal.created_at)
-            writer.writerow([
-                local_dt.strftime('%d/%m/%Y'),
-                local_dt.strftime('%H:%M'),
-                meal.get_meal_type_display(),
-                meal.name.upper(),
-                meal.company.name.upper(),
-                meal.cpf or ''
-            ])
-        return response
+        # Exportação roda em segundo plano (jobs.py): a tela acompanha e baixa o arquivo
+        period = ' a '.join(_format_day(day) for day in (start_date, end_date) if day)
+        return _submit_job(request, 'meal_csv', {
+            'start_date': start_date or None, 'end_date': end_date or None,
+            'company_id': int(company_id) if company_id else None,
+        }, f"Refeições (CSV) {period}".strip())
 
     return render(request, 'core/reports/meal_report.html', {
         'meals': meals, 'companies': companies,
@@ -460,93 +637,225 @@ def meal_report(request):
     })
 
 
+def _meal_pivot_report(request, companies):
+    """ Relatório 3 em quadro: almoços/jantas por empresa e dia (consumption.py), com CSV. """
+    today = timezone.localdate()
+    start_str = request.GET.get('start_date') or today.replace(day=1).isoformat()
+    end_str = request.GET.get('end_date') or today.isoformat()
+    company_str = request.GET.get('company') or ''
+    company_id = int(company_str) if company_str.isdigit() else None
+    pivot = error = None
+
+    try:
+        filter_start = datetime.strptime(start_str, '%Y-%m-%d').date()
+        filter_end = datetime.strptime(end_str, '%Y-%m-%d').date()
+    except ValueError:
+        error = 'Data inválida.'
+    else:
+        if company_str and company_id is None:
+            error = 'Empresa inválida.'
+        else:
+            try:
+                pivot = meal_pivot(filter_start, filter_end, company_id)
+            except ValueError as e:
+                error = str(e)
+
+    # Uma consulta agregada (no máximo uma linha por empresa): o CSV sai na hora, sem tarefa
+    if pivot and request.GET.get('export') == 'csv':
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="refeicoes_por_dia.csv"'
+        response.write('\ufeff')  # BOM uma única vez ('utf-8-sig' repetiria a cada write)
+        write_meal_pivot_csv(pivot, response)
+        return response
+
+    return render(request, 'core/reports/meal_pivot.html', {
+        'pivot': pivot, 'error': error, 'companies': companies, 'max_days': MAX_DAYS,
+        'start_date': start_str, 'end_date': end_str,
+        'selected_company': company_id,
+    })
+
+
+@login_required
+@reporting_view
+def room_history_report(request):
+    """ Relatório: Histórico dos Quartos (trechos de estadia no período) """
+    today = timezone.localdate()
+    start_str = request.GET.get('start_date') or (today - timedelta(days=30)).isoformat()
+    end_str = request.GET.get('end_date') or today.isoformat()
+    filter_start = datetime.strptime(start_str, '%Y-%m-%d').date()
+    filter_end = datetime.strptime(end_str, '%Y-%m-%d').date()
+    rooms = get_room_layout()
+    room_number = request.GET.get('room', '').strip()
+    room = next((item for item in rooms if item.number == room_number), None)
+
+    summary = []
+    segments = []
+    if room:
+        segments = room_history(room, filter_start, filter_end)
+    else:
+        # Ocupação por quarto: noites ocupadas / (camas x noites do período)
+        period_nights = (filter_end - filter_start).days + 1
+        totals = nights_by_room(filter_start, filter_end)
+        for item in rooms:
+            if item.id in totals:
+                capacity = len(item.layout_beds) * period_nights
+                summary.append({
+                    'room': item, **totals[item.id],
+                    'rate': round(100 * totals[item.id]['nights'] / capacity) if capacity else 0,
+                })
+
+    return render(request, 'core/reports/room_history.html', {
+        'rooms': rooms, 'room': room, 'segments': segments, 'summary': summary,
+        'start_date': start_str, 'end_date': end_str,
+    })
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff)  # <--- SEGURANÇA: Só Admin
+@reporting_view
 def closing_report(request):
     """ Relatório 4: Fechamento (Fatura) - Financeiro """
-    companies = Company.objects.all()
+    companies = get_companies()
     start_str = request.GET.get('start_date')
     end_str = request.GET.get('end_date')
     company_id = request.GET.get('company')
     is_export = request.GET.get('export') == 'csv'
     report_data = []
+    report = None
 
     if start_str and end_str:
         filter_start = datetime.strptime(start_str, '%Y-%m-%d').date()
         filter_end = datetime.strptime(end_str, '%Y-%m-%d').date()
 
-        reservations = Reservation.objects.filter(
-            start_date__date__lte=filter_end
-        ).filter(
-            Q(end_date__date__gte=filter_start) | Q(end_date__isnull=True)
-        ).select_related('guest', 'guest__company')
-
-        if company_id:
-            reservations = reservations.filter(guest__company_id=company_id)
-
-        for res in reservations:
-            # Fuso Horário e Datas Efetivas
-            local_start_dt = timezone.localtime(res.start_date)
-            res_start = local_start_dt.date()
-            res_end = timezone.localtime(res.end_date).date() if res.end_date else filter_end
-
-            if res_start > filter_end or res_end < filter_start:
-                continue
-
-            effective_start = max(res_start, filter_start)
-            effective_end = min(res_end, filter_end)
-
-            days = (effective_end - effective_start).days + 1
-            if days < 0: days = 0
-
-            # Refeições
-            lunch_count = 0
-            dinner_count = 0
-            if res.guest.cpf:
-                all_meals = Meal.objects.filter(cpf=res.guest.cpf)
-                for meal in all_meals:
-                    meal_date = timezone.localtime(meal.created_at).date()
-                    if effective_start <= meal_date <= effective_end:
-                        if meal.meal_type == 'ALMOCO':
-                            lunch_count += 1
-                        elif meal.meal_type == 'JANTA':
-                            dinner_count += 1
-
-            if days > 0 or lunch_count > 0 or dinner_count > 0:
-                report_data.append({
-                    'cpf': res.guest.cpf,
-                    'name': res.guest.name.upper(),
-                    'company': res.guest.company.name.upper(),
-                    'days': days,
-                    'lunch': lunch_count,
-                    'dinner': dinner_count,
-                    'entry': effective_start,
-                    'exit': effective_end,
-                    'is_active': res.end_date is None
-                })
+        # Exportação sem fechamento gerado: calcula em segundo plano (jobs.py)
+        if is_export and not find_snapshot(filter_start, filter_end, int(company_id) if company_id else None):
+            return _submit_job(request, 'closing_csv', {
+                'start_date': start_str, 'end_date': end_str,
+                'company_id': int(company_id) if company_id else None,
+            }, f"Fechamento (CSV) {_format_day(start_str)} a {_format_day(end_str)}")
+
+        # Período fechado: linhas gravadas (billing.py); em aberto: calculado agora
+        report = get_closing_report(filter_start, filter_end, int(company_id) if company_id else None)
+        report_data = report.rows
 
     if is_export and report_data:
-        response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
         response['Content-Disposition'] = f'attachment; filename="fatura.csv"'
-        writer = csv.writer(response, delimiter=';')
-        writer.writerow(['CPF', 'NOME', 'EMPRESA', 'DIARIAS', 'ALMOCO', 'JANTAR', 'ENTRADA', 'SAIDA'])
-        for item in report_data:
-            writer.writerow([
-                item['cpf'] or '',
-                item['name'],
-                item['company'],
-                item['days'],
-                item['lunch'],
-                item['dinner'],
-                item['entry'].strftime('%d/%m/%Y'),
-                item['exit'].strftime('%d/%m/%Y')
-            ])
+        response.write('\ufeff')  # BOM uma única vez ('utf-8-sig' repetiria a cada write)
+        write_closing_csv(report_data, response)
         return response
 
     return render(request, 'core/reports/closing_report.html', {
         'companies': companies,
         'report_data': report_data,
+        'report': report,
+        'totals': closing_totals(report_data) if report_data else None,
         'start_date': start_str,
         'end_date': end_str,
         'selected_company': int(company_id) if company_id else None
-    })
\ No newline at end of file
+    })
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def closing_invoices(request):
+    """ Faturas de todas as empresas do período em um ZIP (gerado em segundo plano). """
+    start_str = request.GET.get('start_date')
+    end_str = request.GET.get('end_date')
+    if not (start_str and end_str):
+        return redirect('closing_report')
+    return _submit_job(request, 'invoices_zip', {'start_date': start_str, 'end_date': end_str},
+                       f"Faturas de todas as empresas {_format_day(start_str)} a {_format_day(end_str)}")
+
+
+# ==============================================================================
+# 7. ARQUIVOS (Relatórios gerados em segundo plano)
+# ==============================================================================
+
+def _format_day(value):
+    """ 'AAAA-MM-DD' (filtro GET) -> 'DD/MM/AAAA' """
+    return datetime.strptime(value, '%Y-%m-%d').strftime('%d/%m/%Y') if value else ''
+
+
+def _submit_job(request, kind, params, label):
+    try:
+        job = submit_job(kind, params, request.user, label)
+    except JobLimitError as e:
+        return render(request, 'core/jobs/job_list.html', {'jobs': _user_jobs(request), 'error': str(e)})
+    return redirect('job_detail', pk=job.pk)
+
+
+def _user_jobs(request):
+    return request.user.background_jobs.all()[:30]
+
+
+def _get_user_job(request, pk):
+    job = get_object_or_404(BackgroundJob, pk=pk)
+    if job.user_id != request.user.id and not request.user.is_staff:
+        raise Http404
+    return job
+
+
+@login_required
+def job_list(request):
+    """ Relatórios do usuário (em andamento e prontos para baixar). """
+    return render(request, 'core/jobs/job_list.html', {'jobs': _user_jobs(request)})
+
+
+@login_required
+def job_detail(request, pk):
+    """ Andamento da tarefa. Chamadas HTMX recebem só o cartão (polling). """
+    job = _get_user_job(request, pk)
+    if request.headers.get('HX-Request'):
+        return render(request, 'core/jobs/partials/job_status.html', {'job': job})
+    return render(request, 'core/jobs/job_detail.html', {'job': job})
+
+
+@login_required
+def job_download(request, pk):
+    job = _get_user_job(request, pk)
+    if job.status != 'DONE' or not job.file_path:
+        raise Http404
+    try:
+        return FileResponse(open(job.file_path, 'rb'), as_attachment=True, filename=job.file_name)
+    except FileNotFoundError:
+        raise Http404
+
+
+# ==============================================================================
+# 8. BUSCA GERAL
+# ==============================================================================
+
+@login_required
+def guest_search(request):
+    """
+    Busca de hóspedes e reservas (nome, CPF, telefone, empresa, quarto e
+    histórico) pelo índice de texto (search.py). Sem nenhum resultado exato,
+    tenta a busca aproximada. Chamadas HTMX recebem só a tabela.
+    """
+    query = request.GET.get('q', '').strip()
+    fuzzy = request.GET.get('aproximada') == '1'
+    inicio = time.perf_counter()
+    results = search_reservations(query, fuzzy=fuzzy) if query else []
+    approximate = fuzzy
+    if query and not results and not fuzzy:
+        results, approximate = search_reservations(query, fuzzy=True), True
+
+    context = {
+        'query': query, 'fuzzy': fuzzy, 'approximate': approximate, 'results': results,
+        'elapsed_ms': (time.perf_counter() - inicio) * 1000,
+    }
+    if request.htmx:
+        return render(request, 'core/partials/search_results.html', context)
+    return render(request, 'core/search.html', context)
+
+
+# ==============================================================================
+# 9. SISTEMA
+# ==============================================================================
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def cache_stats(request):
+    """ Contadores de acerto/falta do cache de referência (deste processo). """
+    return JsonResponse(cache_stats_data())
@@ -0,0 +1,45 @@
+# run_uvicorn.py
+import logging
+import os
+import sys
+
+# Produção em Linux pelo servidor ASGI (Uvicorn com h11, só Python).
+# TYBIS_ASGI=1 liga as views async dos fragmentos HTMX e o quadro ao vivo.
+os.environ.setdefault('TYBIS_DEBUG', '0')
+os.environ['TYBIS_ASGI'] = '1'
+
+try:
+    import uvicorn
+except ImportError:
+    sys.exit("Uvicorn não instalado. Rode: pip install uvicorn  (ou use o run_waitress.py)")
+
+from django.core.management import call_command
+from setup.asgi import application
+from core import jobs, reporting
+from core.startup import preparar_arquivos_estaticos, preparar_busca
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+
+
+if __name__ == "__main__":
+    logger = logging.getLogger("uvicorn")
+    preparar_arquivos_estaticos(logger)
+    preparar_busca(logger)  # banco atualizado: indexa as reservas antigas antes de abrir
+    jobs.cleanup()
+    call_command('limpar_sessoes')  # sessões expiradas (agende também uma vez por dia)
+    jobs.start()  # relatórios em segundo plano (fila no banco)
+    reporting.start()  # cópia dos relatórios (só com TYBIS_REPORTING_LAG)
+    logger.info("🚀 Servidor ASGI (Uvicorn) iniciando em http://0.0.0.0:8000")
+
+    try:
+        # Um processo, um laço de eventos: as views síncronas (gravações,
+        # impressão) rodam no pool de threads do Django; as async e os fluxos
+        # ao vivo ficam no laço, sem thread por conexão.
+        uvicorn.run(application, host="0.0.0.0", port=8000, http="h11", loop="asyncio",
+                    lifespan="off", log_level="info")
+    except Exception as e:
+        logger.error(f"Erro fatal no servidor: {e}")
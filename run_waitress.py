@@ -1,8 +1,16 @@
 # run_waitress.py
 import logging
+import os
 import sys
+
+# Produção: DEBUG desligado -> arquivos estáticos com hash e cache de longa duração
+os.environ.setdefault('TYBIS_DEBUG', '0')
+
 from waitress import serve
+from django.core.management import call_command
 from setup.wsgi import application
+from core import jobs, reporting
+from core.startup import preparar_arquivos_estaticos, preparar_busca
 
 # Configura o Logging para escrever no Terminal (Console)
 logging.basicConfig(
@@ -11,12 +19,19 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)]
 )
 
+
 if __name__ == "__main__":
     logger = logging.getLogger("waitress")
+    preparar_arquivos_estaticos(logger)
+    preparar_busca(logger)  # banco atualizado: indexa as reservas antigas antes de abrir
+    jobs.cleanup()
+    call_command('limpar_sessoes')  # sessões expiradas (agende também uma vez por dia)
+    jobs.start()  # relatórios em segundo plano (fila no banco)
+    reporting.start()  # cópia dos relatórios (só com TYBIS_REPORTING_LAG)
     logger.info("🚀 Servidor Waitress iniciando em http://0.0.0.0:8000")
 
     try:
         # threads=4 evita travar se a impressora demorar
         serve(application, host="0.0.0.0", port=8000, threads=4)
     except Exception as e:
-        logger.error(f"Erro fatal no servidor: {e}")
\ No newline at end of file
+        logger.error(f"Erro fatal no servidor: {e}")
@@ -1,5 +1,8 @@
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -7,9 +10,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-$tt0chhd9bu2hph1kosfj6hh1uj2fsm9hcd6r%umvf4d^dqi4^'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# O run_waitress.py define TYBIS_DEBUG=0 (arquivos estáticos com hash e cache longo).
+DEBUG = os.environ.get('TYBIS_DEBUG', '1') == '1'
 ALLOWED_HOSTS = ["*"]
 
+# O run_uvicorn.py define TYBIS_ASGI=1: fragmentos HTMX de leitura em views async
+# (core/async_views.py) e o quadro da cozinha ao vivo (Server-Sent Events).
+TYBIS_ASGI = os.environ.get('TYBIS_ASGI', '0') == '1'
+
 
 # Application definition
 
@@ -26,12 +34,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.StaticFilesMiddleware',  # WhiteNoise (síncrono e async)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django_htmx.middleware.HtmxMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',  # usuário em cache (core/auth.py)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -42,13 +50,19 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Templates compilados ficam em memória (o runserver recarrega ao editar)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -63,9 +77,76 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transações das telas (check-in, troca de quarto) pegam a trava de
+            # escrita logo no início e esperam as tarefas em segundo plano,
+            # em vez de falhar com 'database is locked' no meio da gravação.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            # WAL: leitores (telas, relatórios, backup) não seguram as gravações.
+            # Fica gravado no arquivo; o banco precisa estar em disco local.
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
+# Relatórios e exportações leem pelo alias 'reporting', só leitura (core/reporting.py).
+# TYBIS_REPORTING_LAG=0: o próprio banco, dados na hora. N > 0: uma cópia refeita a cada
+# N segundos pelo servidor (as consultas longas não seguram o WAL de quem grava); as telas
+# de relatório mostram de quando são os dados.
+TYBIS_REPORTING_LAG = int(os.environ.get('TYBIS_REPORTING_LAG', '0'))
+DATABASES['reporting'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'relatorios.sqlite3' if TYBIS_REPORTING_LAG else DATABASES['default']['NAME'],
+    'OPTIONS': {'timeout': 20, 'init_command': 'PRAGMA query_only=ON;'},
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['core.reporting.ReportingRouter']
+
+
+# Cache
+# Compartilhado entre as threads do Waitress e entre processos.
+# Padrão: arquivos locais. Para usar Redis: defina TYBIS_REDIS_URL=redis://127.0.0.1:6379/1
+
+if os.environ.get('TYBIS_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['TYBIS_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Sessões (TYBIS_SESSIONS): 'cached_db' (padrão: lidas do cache, gravadas também no
+# banco), 'cookies' (assinadas no próprio cookie, sem banco) ou 'db' (só banco).
+# As expiradas são apagadas pelo comando 'limpar_sessoes'.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+TYBIS_SESSIONS = os.environ.get('TYBIS_SESSIONS', 'cached_db')
+if TYBIS_SESSIONS not in SESSION_ENGINES:
+    raise ImproperlyConfigured(
+        f"TYBIS_SESSIONS={TYBIS_SESSIONS!r} inválido: use {', '.join(map(repr, SESSION_ENGINES))}."
+    )
+SESSION_ENGINE = SESSION_ENGINES[TYBIS_SESSIONS]
+
+# O alias 'fragments' guarda HTML já renderizado (cards do Dashboard). As chaves
+# são derivadas do conteúdo, então um cache em memória por processo basta.
+CACHES['fragments'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'tybis-fragments',
+    'OPTIONS': {'MAX_ENTRIES': 2000},
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -98,9 +179,39 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+
+# Nomes com hash + gzip/brotli gerados no collectstatic. Arquivos com hash são
+# servidos pelo WhiteNoise com Cache-Control de 10 anos (immutable).
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
 
 # Configurações de Login
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
-LOGOUT_REDIRECT_URL = 'login'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'login'
+
+# Impressora térmica ESC/POS (core/escpos.py). Vazio: GDI no Windows / simulação no Linux.
+# Rede: TYBIS_PRINTER=tcp://192.168.0.50:9100  |  USB: TYBIS_PRINTER=/dev/usb/lp0
+TYBIS_PRINTER = os.environ.get('TYBIS_PRINTER', '')
+TYBIS_PRINTER_COLUMNS = int(os.environ.get('TYBIS_PRINTER_COLUMNS', '48'))  # 48 = bobina 80mm, 32 = 58mm
+
+# Relatórios em segundo plano (core/jobs.py)
+# TYBIS_JOB_WORKERS: tarefas simultâneas no processo do Waitress (0 = só enfileira;
+# quem executa é o comando 'processar_tarefas' rodando em outro processo).
+TYBIS_JOB_WORKERS = int(os.environ.get('TYBIS_JOB_WORKERS', '1'))
+TYBIS_JOB_MAX_PER_USER = 2
+TYBIS_JOB_KEEP_DAYS = 7
+TYBIS_JOBS_DIR = BASE_DIR / 'jobs'
+
+# Backup do banco (core/backup.py): cópias em TYBIS_BACKUP_DIR, ficam as TYBIS_BACKUP_KEEP
+# completas mais recentes. TYBIS_BACKUP_BUDGET_MS: atraso aceitável nas telas durante o
+# backup; passos da cópia mais lentos que isso fazem o backup descansar mais entre eles.
+TYBIS_BACKUP_DIR = Path(os.environ.get('TYBIS_BACKUP_DIR', BASE_DIR / 'backups'))
+TYBIS_BACKUP_KEEP = int(os.environ.get('TYBIS_BACKUP_KEEP', '14'))
+TYBIS_BACKUP_BUDGET_MS = int(os.environ.get('TYBIS_BACKUP_BUDGET_MS', '50'))